@@ -0,0 +1,30 @@
+"""add client-generated alert_uid to alerts
+
+Revision ID: 5b7e2d91a4c3
+Revises: c45cf3521e8d
+Create Date: 2026-10-17 04:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2d91a4c3'
+down_revision: Union[str, Sequence[str], None] = 'c45cf3521e8d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('alerts', sa.Column('alert_uid', sa.String(length=36), nullable=True))
+    op.create_index(op.f('ix_alerts_alert_uid'), 'alerts', ['alert_uid'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_alerts_alert_uid'), table_name='alerts')
+    op.drop_column('alerts', 'alert_uid')
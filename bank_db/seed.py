@@ -1,10 +1,17 @@
+import argparse
+import multiprocessing
 import os
+import random
+import re
+import tempfile
+import time
 from decimal import Decimal
 from datetime import datetime, timedelta
 from faker import Faker
+from sqlalchemy import create_engine, func, select
 from sqlalchemy.exc import IntegrityError
 
-from app.db import SessionLocal, engine
+from app.db import DATABASE_URL, SessionLocal, engine
 from app.models import Base, Party
 
 fake = Faker()
@@ -80,6 +87,274 @@ def create_parties():
     print(f"Created {created} parties.")
 
 
-if __name__ == "__main__":
+# Bulk seeding (--bulk N)
+#
+# Country -> (bank / branch code, account number, trailing national check) BBAN
+# formats from the SWIFT IBAN registry: n digits, a upper-case letters, c
+# alphanumerics. The account part holds a serial number, so generated IBANs
+# are unique without asking the database.
+IBAN_FORMATS = {
+    "DE": ("8n", "10n", ""),
+    "GB": ("4a6n", "8n", ""),
+    "FR": ("5n5n", "11c", "2n"),
+    "ES": ("4n4n2n", "10n", ""),
+    "AT": ("5n", "11n", ""),
+    "BE": ("3n", "7n", "2n"),
+    "NL": ("4a", "10n", ""),
+    "FI": ("3n", "11n", ""),
+    "IT": ("1a5n5n", "12c", ""),
+    "CH": ("5n", "12c", ""),
+    "SE": ("3n", "17n", ""),
+    "DK": ("4n", "10n", ""),
+    "NO": ("4n", "6n", "1n"),
+    "PL": ("8n", "16n", ""),
+    "CZ": ("4n", "16n", ""),
+    "HU": ("3n4n1n", "15n", "1n"),
+    "GR": ("3n4n", "16c", ""),
+    "PT": ("4n4n", "11n", "2n"),
+    "IE": ("4a6n", "8n", ""),
+    "LU": ("3n", "13c", ""),
+}
+COUNTRIES = list(IBAN_FORMATS)
+# Faker locale per country for names, addresses and phone numbers
+FAKER_LOCALES = {
+    "DE": "de_DE", "GB": "en_GB", "FR": "fr_FR", "ES": "es_ES", "AT": "de_AT", "BE": "nl_BE",
+    "NL": "nl_NL", "FI": "fi_FI", "IT": "it_IT", "CH": "de_CH", "SE": "sv_SE", "DK": "da_DK",
+    "NO": "no_NO", "PL": "pl_PL", "CZ": "cs_CZ", "HU": "hu_HU", "GR": "el_GR", "PT": "pt_PT",
+    "IE": "en_IE", "LU": "fr_FR",
+}
+FORMAT_PART = re.compile(r"(\d+)([nac])")
+ALPHABETS = {
+    "n": "0123456789",
+    "a": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "c": "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+}
+ACCOUNT_SCRAMBLE = 3 ** 19
+# A -> "10", ..., Z -> "35" for the mod-97 check
+LETTER_DIGITS = str.maketrans({letter: str(10 + i) for i, letter in enumerate(ALPHABETS["a"])})
+BULK_COLUMNS = (
+    "name", "iban", "mean_sum", "country", "currency", "account_status", "risk_score",
+    "annual_turnover", "num_transactions", "last_tx_date", "contact_email", "contact_phone",
+    "address", "notes", "is_corporate",
+)
+
+
+def iban_check_digits(country, bban):
+    """ISO 13616 check digits: 98 - (BBAN + country + "00" as digits) mod 97"""
+    return f"{98 - int((bban + country + '00').translate(LETTER_DIGITS)) % 97:02d}"
+
+
+def is_valid_iban(iban):
+    return int((iban[4:] + iban[:4]).translate(LETTER_DIGITS)) % 97 == 1
+
+
+def _segments(fmt):
+    return [(ALPHABETS[kind], int(length)) for length, kind in FORMAT_PART.findall(fmt)]
+
+
+# Country -> (bank code segments, account number length, check segments)
+IBAN_LAYOUTS = {
+    country: (_segments(bank), int(FORMAT_PART.match(account).group(1)), _segments(check))
+    for country, (bank, account, check) in IBAN_FORMATS.items()
+}
+
+
+def _random_chars(segments, rng):
+    return "".join("".join(rng.choices(alphabet, k=length)) for alphabet, length in segments)
+
+
+def generate_iban(country, serial, rng):
+    """IBAN for country whose account number is serial (zero-padded), with random bank code"""
+    bank, account_length, check = IBAN_LAYOUTS[country]
+    if serial >= 10 ** account_length:
+        raise ValueError(f"{country} account numbers hold at most {account_length} digits")
+    # Multiplying by a number coprime to 10 permutes 0..10**length-1, so account
+    # numbers stay unique without looking sequential
+    account = serial * ACCOUNT_SCRAMBLE % 10 ** account_length
+    bban = _random_chars(bank, rng) + str(account).zfill(account_length) + _random_chars(check, rng)
+    return country + iban_check_digits(country, bban) + bban
+
+
+class FakerPools:
+    """
+    Per-country pools of Faker values
+
+    Calling Faker for every field of 10M rows would dominate the run, so each
+    worker draws pool_size values per field and country once and rows sample
+    from them.
+    """
+
+    def __init__(self, pool_size, seed):
+        self.pools = {}
+        for index, country in enumerate(COUNTRIES):
+            faker = Faker(FAKER_LOCALES[country])
+            faker.seed_instance(seed + index)
+            self.pools[country] = {
+                # Commas would break the generator's "name,iban" parties.txt
+                "company": [faker.company().replace(",", "") for _ in range(pool_size)],
+                "person": [faker.name().replace(",", "") for _ in range(pool_size)],
+                "email": [faker.email() for _ in range(pool_size)],
+                "company_email": [faker.company_email() for _ in range(pool_size)],
+                "phone": [faker.phone_number() for _ in range(pool_size)],
+                "address": [faker.address().replace("\n", ", ") for _ in range(pool_size)],
+                "notes": [faker.sentence(nb_words=12) for _ in range(pool_size)],
+            }
+
+
+def party_rows(start, end, rng, pools, now):
+    """Party rows for the global indices start..end-1; the index picks the country and account serial"""
+    rows = []
+    for index in range(start, end):
+        country = COUNTRIES[index % len(COUNTRIES)]
+        pool = pools.pools[country]
+        is_corporate = rng.random() < 0.6
+        mean_sum = round(rng.lognormvariate(7.0, 1.2), 2)
+        num_transactions = rng.randint(1, 20000)
+        rows.append({
+            "name": rng.choice(pool["company"] if is_corporate else pool["person"]),
+            "iban": generate_iban(country, index // len(COUNTRIES), rng),
+            "mean_sum": Decimal(f"{mean_sum:.2f}"),
+            "country": country,
+            "currency": currency_from_country(country),
+            "account_status": rng.choices(("active", "suspended", "closed"), weights=(93, 5, 2))[0],
+            "risk_score": round(rng.betavariate(2, 8) * 100, 2),
+            "annual_turnover": Decimal(f"{mean_sum * num_transactions / rng.uniform(1, 5):.2f}"),
+            "num_transactions": num_transactions,
+            "last_tx_date": now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399)),
+            "contact_email": rng.choice(pool["company_email"] if is_corporate else pool["email"]),
+            "contact_phone": rng.choice(pool["phone"]),
+            "address": rng.choice(pool["address"]),
+            "notes": rng.choice(pool["notes"]),
+            "is_corporate": is_corporate,
+        })
+    return rows
+
+
+def _tsv_value(value):
+    """A value in LOAD DATA's default format (tab-separated, backslash escapes, \\N for NULL)"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def insert_executemany(conn, rows):
+    """One multi-row INSERT per chunk (mysqlclient batches executemany into VALUES lists)"""
+    conn.execute(Party.__table__.insert(), rows)
+
+
+def insert_load_data(conn, rows):
+    """Write the chunk to a temporary TSV file and LOAD DATA LOCAL INFILE it (MySQL only)"""
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".tsv", newline="\n", delete=False) as f:
+        for row in rows:
+            f.write("\t".join(_tsv_value(row[column]) for column in BULK_COLUMNS) + "\n")
+    try:
+        conn.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {Party.__tablename__} CHARACTER SET utf8mb4 "
+            f"({', '.join(BULK_COLUMNS)})",
+            (f.name,),
+        )
+    finally:
+        os.unlink(f.name)
+
+
+INSERT_METHODS = {
+    "executemany": insert_executemany,
+    "load-data": insert_load_data,
+}
+
+# Per worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(database_url, method, pool_size, seed):
+    connect_args = {"local_infile": 1} if method == "load-data" else {}
+    _worker["engine"] = create_engine(database_url, future=True, connect_args=connect_args)
+    _worker["insert"] = INSERT_METHODS[method]
+    _worker["pools"] = FakerPools(pool_size, seed)
+    _worker["seed"] = seed
+
+
+def _seed_chunk(bounds):
+    """Generate and insert rows start..end-1 in one transaction; returns their parties.txt lines"""
+    start, end = bounds
+    # Seeded per chunk, so the output doesn't depend on the number of workers
+    rng = random.Random(f"{_worker['seed']}:{start}")
+    rows = party_rows(start, end, rng, _worker["pools"], datetime.utcnow())
+    with _worker["engine"].begin() as conn:
+        _worker["insert"](conn, rows)
+    return [f"{row['name']},{row['iban']}\n" for row in rows]
+
+
+def bulk_seed(total, workers=None, chunk_size=50_000, method="executemany", parties_file="parties.txt",
+              pool_size=1000, seed=12345, truncate=False, database_url=DATABASE_URL):
+    """
+    Insert total generated parties with a pool of worker processes
+
+    Each chunk of chunk_size rows is generated and inserted (executemany or
+    LOAD DATA LOCAL INFILE) in its own transaction by one worker. The
+    parties.txt for the transaction generator is written in index order as
+    chunks complete.
+
+    Without truncate the table must be empty: generated IBANs would collide
+    with those of an earlier run, and the chunks committed before the
+    IntegrityError would stay behind.
+    """
+    workers = workers or os.cpu_count() or 1
+    with engine.begin() as conn:
+        if truncate:
+            conn.execute(Party.__table__.delete())
+        else:
+            existing = conn.execute(select(func.count()).select_from(Party.__table__)).scalar()
+            if existing:
+                raise ValueError(f"The parties table already holds {existing} rows; "
+                                 f"pass --truncate to replace them")
+
+    chunks = [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+    started = time.perf_counter()
+    done = 0
+    with open(parties_file, "w", encoding="utf-8") as out, multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(database_url, method, pool_size, seed)) as pool:
+        for lines in pool.imap(_seed_chunk, chunks):
+            out.writelines(lines)
+            done += len(lines)
+            elapsed = time.perf_counter() - started
+            print(f"Seeded {done}/{total} parties ({done / elapsed:,.0f} rows/s)")
+    print(f"Created {done} parties in {time.perf_counter() - started:.1f}s "
+          f"with {workers} workers ({method}); wrote {parties_file}")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the parties table")
+    parser.add_argument("--bulk", type=int, metavar="N",
+                        help="generate N parties with valid IBANs instead of the built-in list")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows per INSERT / LOAD DATA")
+    parser.add_argument("--method", choices=sorted(INSERT_METHODS), default="executemany",
+                        help="load-data needs local_infile=ON on the MySQL server")
+    parser.add_argument("--parties-file", default="parties.txt",
+                        help="name,iban file for the transaction generator (PARTIES_FILE)")
+    parser.add_argument("--pool-size", type=int, default=1000, help="Faker values per field and country")
+    parser.add_argument("--seed", type=int, default=12345)
+    parser.add_argument("--truncate", action="store_true", help="delete existing parties first")
+    args = parser.parse_args()
+
     Base.metadata.create_all(bind=engine)
-    create_parties()
\ No newline at end of file
+    if args.bulk is None:
+        create_parties()
+    else:
+        try:
+            bulk_seed(args.bulk, workers=args.workers, chunk_size=args.chunk_size, method=args.method,
+                      parties_file=args.parties_file, pool_size=args.pool_size, seed=args.seed,
+                      truncate=args.truncate)
+        except ValueError as e:
+            parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
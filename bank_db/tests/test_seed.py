@@ -0,0 +1,65 @@
+import os
+import random
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+# app.db builds its engine on import; the tests never reach MySQL
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import seed  # noqa: E402
+from app.models import Base, Party  # noqa: E402
+from seed import (COUNTRIES, PARTIES_RAW, _tsv_value, bulk_seed, generate_iban,  # noqa: E402
+                  is_valid_iban)
+
+# IBAN lengths from the SWIFT registry
+IBAN_LENGTHS = {
+    "DE": 22, "GB": 22, "FR": 27, "ES": 24, "AT": 20, "BE": 16, "NL": 18, "FI": 18, "IT": 27, "CH": 21,
+    "SE": 24, "DK": 18, "NO": 15, "PL": 28, "CZ": 24, "HU": 28, "GR": 27, "PT": 25, "IE": 22, "LU": 20,
+}
+
+
+def test_sample_ibans_are_valid():
+    assert all(is_valid_iban(iban) for _, iban in PARTIES_RAW)
+    assert not is_valid_iban("DE88370400440532013000")
+
+
+def test_generated_ibans_have_valid_check_digits_and_are_unique():
+    rng = random.Random(0)
+    ibans = [generate_iban(country, serial, rng) for country in COUNTRIES for serial in range(500)]
+
+    assert all(is_valid_iban(iban) for iban in ibans)
+    assert all(len(iban) == IBAN_LENGTHS[iban[:2]] for iban in ibans)
+    # Random bank codes aside, the account serial alone keeps them apart
+    assert len(set(ibans)) == len(ibans)
+    assert len({iban[-10:] for iban in ibans if iban.startswith("DE")}) == 500
+
+
+def test_serial_beyond_account_length_is_rejected():
+    generate_iban("NO", 999_999, random.Random(0))
+    with pytest.raises(ValueError):
+        generate_iban("NO", 1_000_000, random.Random(0))
+
+
+def test_tsv_value_escaping():
+    assert _tsv_value(None) == "\\N"
+    assert _tsv_value(True) == "1" and _tsv_value(False) == "0"
+    assert _tsv_value(datetime(2025, 1, 2, 3, 4, 5, 678)) == "2025-01-02 03:04:05"
+    assert _tsv_value(Decimal("12.30")) == "12.30"
+    assert _tsv_value("a\tb\nc\rd\\N") == "a\\tb\\nc\\rd\\\\N"
+
+
+def test_bulk_seed_refuses_a_table_with_parties(monkeypatch, tmp_path):
+    engine = create_engine("sqlite://", future=True, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Party.__table__.insert(), [{"name": "ACME Corp", "iban": PARTIES_RAW[0][1]}])
+    monkeypatch.setattr(seed, "engine", engine)
+    parties_file = tmp_path / "parties.txt"
+
+    with pytest.raises(ValueError, match="--truncate"):
+        bulk_seed(10, workers=1, parties_file=str(parties_file))
+    assert not parties_file.exists()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Agent Benchmark - ReACTAgent.run over generated transactions against a fake Ollama
+
+The LLM is replaced by fake_ollama.py (scripted transcripts, simulated latency
+and token rate) and MySQL by a scratch SQLite file seeded with the generator's
+parties, so the run needs no network and no database server. Wall time is split
+into the simulated model time and the agent's own orchestration overhead.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SCRATCH_DIR = tempfile.mkdtemp(prefix="bench_agent_")
+# Must be set before the agent's db module creates its engine
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH_DIR}/bankdb.sqlite"
+sys.path.insert(0, str(REPO_DIR / "react_agent"))
+sys.path.insert(0, str(REPO_DIR / "transaction_generator"))
+
+from agent import ReACTAgent  # noqa: E402
+from agent_functions.get_client_by_iban import party_cache  # noqa: E402
+from agent_functions.tool_cache import ToolCache  # noqa: E402
+from db.db import SessionLocal, engine  # noqa: E402
+from db.models import Base, Party  # noqa: E402
+from generator import TransactionGenerator  # noqa: E402
+from bench_pipeline import git_commit, peak_rss_mb  # noqa: E402
+from fake_ollama import FakeOllama, FakeOllamaServer, load_transcripts  # noqa: E402
+
+
+class TimedAgent(ReACTAgent):
+    """ReACTAgent that accumulates the time spent in LLM calls and in tools"""
+
+    llm_seconds = 0.0
+    tool_seconds = 0.0
+
+    def _call_ollama(self, messages):
+        start = time.perf_counter()
+        try:
+            return super()._call_ollama(messages)
+        finally:
+            self.llm_seconds += time.perf_counter() - start
+
+    def _execute_action(self, tool_name, params, store=None, stats=None):
+        start = time.perf_counter()
+        try:
+            return super()._execute_action(tool_name, params, store, stats)
+        finally:
+            self.tool_seconds += time.perf_counter() - start
+
+
+def load_config():
+    """Read benchmark configuration from environment variables"""
+    return {
+        'transactions': int(os.environ.get('BENCH_TRANSACTIONS', '300')),
+        'latency': float(os.environ.get('BENCH_LATENCY', '0.05')),
+        'tokens_per_second': float(os.environ.get('BENCH_TOKENS_PER_S', '2000')),
+        'stream': os.environ.get('BENCH_STREAM', '1') == '1',
+        'tool_cache': os.environ.get('BENCH_TOOL_CACHE', '1') == '1',
+        'transcript': os.environ.get('BENCH_TRANSCRIPT'),
+        'seed': int(os.environ.get('BENCH_SEED', '20022')),
+    }
+
+
+def seed_parties(generator):
+    """Create the schema in the scratch database and insert the generator's parties"""
+    Base.metadata.create_all(engine)
+    rng = random.Random(0)
+    with SessionLocal() as session:
+        session.add_all(
+            Party(name=p['name'], iban=p['iban'], country=p['country'], currency=p['currency'],
+                  mean_sum=rng.choice([500, 1000, 5000, 20000]), risk_score=rng.uniform(0, 60),
+                  account_status=rng.choice(["active"] * 9 + ["suspended"]))
+            for p in generator.parties
+        )
+        session.commit()
+    return len(generator.parties)
+
+
+def bench_agent(config, url, messages):
+    """Analyze every message with ReACTAgent.run, one conversation at a time"""
+    agent = TimedAgent(ollama_url=url, verbose=False, api_key="", stream=config['stream'],
+                       tool_cache=ToolCache() if config['tool_cache'] else None)
+    answers = {}
+    wasted = 0
+    start = time.perf_counter()
+    for xml_string in messages:
+        stats = {}
+        answer = agent.analyze_transaction(xml_string, stats=stats)
+        wasted += stats['wasted']
+        answers[answer] = answers.get(answer, 0) + 1
+    elapsed = time.perf_counter() - start
+    agent.close()
+    return agent, elapsed, answers, wasted
+
+
+def main():
+    config = load_config()
+    random.seed(config['seed'])
+    generator = TransactionGenerator(str(REPO_DIR / "data" / "parties.txt"))
+    parties = seed_parties(generator)
+    messages = [generator.generate_transaction_xml() for _ in range(config['transactions'])]
+
+    print("=" * 60)
+    print("Agent benchmark")
+    print("=" * 60)
+    for key, value in config.items():
+        print(f"{key}: {value}")
+    print(f"parties: {parties}")
+    print("=" * 60)
+
+    transcripts = load_transcripts(config['transcript']) if config['transcript'] else None
+    fake = FakeOllama(transcripts, latency=config['latency'], tokens_per_second=config['tokens_per_second'])
+    with FakeOllamaServer(fake) as server:
+        agent, elapsed, answers, wasted = bench_agent(config, server.url, messages)
+
+    transactions = config['transactions']
+    iterations = agent.iteration_stats['iterations']
+    model = fake.stats()
+    overhead = elapsed - model['model_seconds']
+    http = agent.llm_seconds - model['model_seconds']
+    in_process = elapsed - agent.llm_seconds - agent.tool_seconds
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'config': config,
+        'transactions': transactions,
+        'seconds': elapsed,
+        'tx_per_s': transactions / elapsed,
+        'llm_requests': model['requests'],
+        'iterations': iterations,
+        'wasted_iterations': wasted,
+        'model_seconds': model['model_seconds'],
+        'overhead_seconds': overhead,
+        'overhead_share': overhead / elapsed,
+        'overhead_ms_per_tx': overhead / transactions * 1000,
+        'overhead_ms_per_iteration': overhead / max(1, iterations) * 1000,
+        # Where the overhead goes: HTTP client/server round trips, tool calls,
+        # and the rest of the loop (prompt assembly, parsing, compaction)
+        'http_ms_per_iteration': http / max(1, iterations) * 1000,
+        'tool_ms_per_iteration': agent.tool_seconds / max(1, iterations) * 1000,
+        'loop_ms_per_iteration': in_process / max(1, iterations) * 1000,
+        'prompt_tokens': model['prompt_tokens'],
+        'completion_tokens': model['completion_tokens'],
+        'stream_cuts': agent.stream_cuts,
+        'tool_cache': agent.tool_cache.stats() if agent.tool_cache is not None else None,
+        'party_cache': party_cache.stats(),
+        'distinct_answers': len(answers),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    print("=" * 60)
+    print(f"Agent: {transactions} transactions in {elapsed:.2f}s ({results['tx_per_s']:.1f} tx/s), "
+          f"{iterations} iterations ({wasted} wasted)")
+    print(f"Simulated model time: {model['model_seconds']:.2f}s | "
+          f"orchestration overhead: {overhead:.2f}s ({results['overhead_share']:.1%})")
+    print(f"Overhead per iteration: {results['overhead_ms_per_iteration']:.2f} ms "
+          f"(HTTP {results['http_ms_per_iteration']:.2f} | tools {results['tool_ms_per_iteration']:.2f} | "
+          f"loop {results['loop_ms_per_iteration']:.2f})")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    print("=" * 60)
+
+    output = json.dumps(results, indent=2)
+    output_path = os.environ.get('BENCH_OUTPUT')
+    if output_path:
+        Path(output_path).write_text(output + "\n", encoding="utf-8")
+        print(f"✓ Results written to {output_path}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
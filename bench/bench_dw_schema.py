@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Warehouse Schema Benchmark - query timings on the transactions table before and after the
+data_warehouse_creator migrations, on a synthetic dataset built from generator messages
+
+Needs a running ClickHouse (see docker-compose.yaml). Everything is created in a separate
+database (BENCH_DATABASE, dropped at the start of each run).
+"""
+
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import clickhouse_connect
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR / "transaction_processor"))
+sys.path.insert(0, str(REPO_DIR / "transaction_generator"))
+sys.path.insert(0, str(REPO_DIR / "data_warehouse_creator"))
+
+from processor import TRANSACTION_COLUMNS, ColumnBuffer, TransactionProcessor  # noqa: E402
+from generator import TransactionGenerator  # noqa: E402
+from fakes import RecordingClickHouseClient  # noqa: E402
+from bench_pipeline import git_commit  # noqa: E402
+from migrate import stamp, upgrade  # noqa: E402
+
+# transactions at migration revision BASELINE_REVISION, before the re-keying and
+# LowCardinality revisions that the benchmark measures
+BASELINE_REVISION = '0005'
+BASELINE_DDL = """
+CREATE TABLE {table} (
+    transaction_id String,
+    message_id String,
+    end_to_end_id String,
+    payment_info_id String,
+    created_datetime DateTime64(3),
+    processing_datetime DateTime64(3) DEFAULT now64(3),
+    amount Decimal(18, 2),
+    currency String,
+    debtor_name String,
+    debtor_iban String,
+    debtor_country String,
+    creditor_name String,
+    creditor_iban String,
+    creditor_country String,
+    payment_method String,
+    control_sum Decimal(18, 2),
+    num_transactions UInt32,
+    raw_xml String DEFAULT '' CODEC(ZSTD(3)),
+    processed_status String DEFAULT 'SUCCESS',
+    kafka_topic LowCardinality(String) DEFAULT '',
+    kafka_partition UInt32 DEFAULT 0,
+    kafka_offset UInt64 DEFAULT 0
+) ENGINE = ReplacingMergeTree(processing_datetime)
+ORDER BY (created_datetime, transaction_id)
+PARTITION BY toYYYYMM(created_datetime)
+"""
+
+# Representative queries: dashboard-style buckets on processing_datetime, point lookups
+# by IBAN (as done when investigating a party) and group-bys on the LowCardinality columns
+QUERIES = {
+    'processing_time_buckets': """
+        SELECT toStartOfInterval(processing_datetime, INTERVAL 10 MINUTE) AS period,
+               count(), sum(amount)
+        FROM transactions
+        WHERE processing_datetime >= {end} - INTERVAL 6 HOUR
+        GROUP BY period ORDER BY period""",
+    'debtor_history': """
+        SELECT created_datetime, amount, currency, creditor_iban
+        FROM transactions
+        WHERE debtor_iban = '{debtor_iban}'
+        ORDER BY created_datetime DESC LIMIT 100""",
+    'creditor_history': """
+        SELECT created_datetime, amount, currency, debtor_iban
+        FROM transactions
+        WHERE creditor_iban = '{creditor_iban}'
+        ORDER BY created_datetime DESC LIMIT 100""",
+    'debtor_last_day': """
+        SELECT count(), sum(amount)
+        FROM transactions
+        WHERE debtor_iban = '{debtor_iban}' AND created_datetime >= {end} - INTERVAL 1 DAY""",
+    'top_debtors_last_day': """
+        SELECT debtor_name, sum(amount) AS amount
+        FROM transactions
+        WHERE processing_datetime >= {end} - INTERVAL 1 DAY
+        GROUP BY debtor_name ORDER BY amount DESC LIMIT 10""",
+    'currency_method_breakdown': """
+        SELECT currency, payment_method, debtor_country, count(), sum(amount)
+        FROM transactions
+        GROUP BY currency, payment_method, debtor_country""",
+}
+
+
+def load_config():
+    """Read benchmark configuration from environment variables"""
+    return {
+        'rows': int(os.environ.get('BENCH_ROWS', '100000000')),
+        'seed_messages': int(os.environ.get('BENCH_SEED_MESSAGES', '100000')),
+        'span_days': int(os.environ.get('BENCH_SPAN_DAYS', '365')),
+        'raw_xml': os.environ.get('BENCH_RAW_XML', '0') == '1',
+        'rounds': int(os.environ.get('BENCH_ROUNDS', '5')),
+        'database': os.environ.get('BENCH_DATABASE', 'bench_dw'),
+        'seed': int(os.environ.get('BENCH_SEED', '20022')),
+    }
+
+
+def connect(database=None):
+    return clickhouse_connect.get_client(
+        host=os.environ.get('CLICKHOUSE_HOST', 'localhost'),
+        port=int(os.environ.get('CLICKHOUSE_PORT', '8123')),
+        username=os.environ.get('CLICKHOUSE_USER', 'default'),
+        password=os.environ.get('CLICKHOUSE_PASSWORD', ''),
+        database=database or 'default',
+    )
+
+
+def load_seed(client, config):
+    """Parse generator messages with the processor and insert them into seed_transactions"""
+    random.seed(config['seed'])
+    generator = TransactionGenerator(str(REPO_DIR / "data" / "parties.txt"))
+    processor = TransactionProcessor(None, None, None, None, client=RecordingClickHouseClient())
+
+    buffer = ColumnBuffer(TRANSACTION_COLUMNS + ['seed_row'])
+    for _ in range(config['seed_messages']):
+        for row in processor.parse_transactions(generator.generate_transaction_xml()):
+            if not config['raw_xml']:
+                row['raw_xml'] = ''
+            row['seed_row'] = len(buffer)
+            buffer.append(row)
+
+    client.command(BASELINE_DDL.format(table='seed_transactions')
+                   .replace("    kafka_offset UInt64 DEFAULT 0\n",
+                            "    kafka_offset UInt64 DEFAULT 0,\n    seed_row UInt32\n"))
+    client.insert('seed_transactions', buffer.columns, column_names=buffer.column_names,
+                  column_oriented=True)
+    return len(buffer)
+
+
+def amplify(client, config, seed_rows):
+    """
+    Fill transactions with config['rows'] copies of the seed rows
+
+    Every copy gets a distinct transaction_id and the rows are spread evenly over
+    span_days ending now, with processing_datetime a few seconds after
+    created_datetime, as produced by the live pipeline.
+    """
+    copies = -(-config['rows'] // seed_rows)
+    span_ms = config['span_days'] * 86_400_000
+    step = 50
+    for first in range(0, copies, step):
+        count = min(step, copies - first)
+        client.command(f"""
+            INSERT INTO transactions
+            SELECT
+                concat(transaction_id, '-', toString(copy)) AS transaction_id,
+                message_id, end_to_end_id, payment_info_id,
+                created AS created_datetime,
+                created + toIntervalMillisecond(cityHash64(transaction_id, copy) % 5000) AS processing_datetime,
+                amount, currency, debtor_name, debtor_iban, debtor_country,
+                creditor_name, creditor_iban, creditor_country, payment_method,
+                control_sum, num_transactions, raw_xml, processed_status,
+                'unprocessed', copy % 4, copy * {seed_rows} + seed_row
+            FROM (
+                SELECT *, number + {first} AS copy,
+                       now64(3) - toIntervalMillisecond({span_ms})
+                       + toIntervalMillisecond(intDiv((copy * {seed_rows} + seed_row) * {span_ms},
+                                                      {copies * seed_rows})) AS created
+                FROM seed_transactions CROSS JOIN numbers({count})
+            )
+            WHERE copy * {seed_rows} + seed_row < {config['rows']}
+            SETTINGS max_partitions_per_insert_block = 0""")
+    client.command("OPTIMIZE TABLE transactions FINAL")
+
+
+def table_stats(client):
+    """Rows, on-disk size and per-column compressed size of transactions"""
+    rows, bytes_on_disk = client.query(
+        "SELECT sum(rows), sum(bytes_on_disk) FROM system.parts "
+        "WHERE database = currentDatabase() AND table = 'transactions' AND active").result_rows[0]
+    columns = client.query(
+        "SELECT name, data_compressed_bytes FROM system.columns "
+        "WHERE database = currentDatabase() AND table = 'transactions'").result_rows
+    return {
+        'rows': int(rows),
+        'bytes_on_disk': int(bytes_on_disk),
+        'column_compressed_bytes': {name: int(size) for name, size in columns},
+    }
+
+
+def time_queries(client, params, rounds):
+    """Median wall time and rows/bytes read per query"""
+    results = {}
+    for name, template in QUERIES.items():
+        sql = template.format(**params)
+        timings = []
+        summary = {}
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = client.query(sql, settings={'use_query_cache': 0})
+            timings.append(time.perf_counter() - start)
+            summary = result.summary or {}
+        results[name] = {
+            'median_ms': statistics.median(timings) * 1000,
+            'min_ms': min(timings) * 1000,
+            'read_rows': int(summary.get('read_rows', 0)),
+            'read_bytes': int(summary.get('read_bytes', 0)),
+        }
+        print(f"  {name:28s} {results[name]['median_ms']:9.1f} ms  "
+              f"{results[name]['read_rows']:>12,} rows read")
+    return results
+
+
+def main():
+    config = load_config()
+
+    print("=" * 60)
+    print("Warehouse schema benchmark")
+    print("=" * 60)
+    for key, value in config.items():
+        print(f"{key}: {value}")
+    print("=" * 60)
+
+    admin = connect()
+    admin.command(f"DROP DATABASE IF EXISTS {config['database']}")
+    admin.command(f"CREATE DATABASE {config['database']}")
+    client = connect(config['database'])
+
+    start = time.perf_counter()
+    seed_rows = load_seed(client, config)
+    client.command(BASELINE_DDL.format(table='transactions'))
+    amplify(client, config, seed_rows)
+    load_seconds = time.perf_counter() - start
+    print(f"✓ Loaded {config['rows']:,} rows from {seed_rows:,} generated transactions "
+          f"in {load_seconds:.0f}s")
+
+    debtor_iban, creditor_iban = client.query(
+        "SELECT any(debtor_iban), any(creditor_iban) FROM seed_transactions").result_rows[0]
+    end = client.query("SELECT max(processing_datetime) FROM transactions").result_rows[0][0]
+    params = {'debtor_iban': debtor_iban, 'creditor_iban': creditor_iban,
+              'end': f"toDateTime64('{end:%Y-%m-%d %H:%M:%S}', 3)"}
+
+    before_stats = table_stats(client)
+    print("Before migrations:")
+    before = time_queries(client, params, config['rounds'])
+
+    stamp(client, BASELINE_REVISION)
+    migrations = {}
+    started = time.perf_counter()
+    for revision in upgrade(lambda: connect(config['database'])):
+        migrations[revision] = time.perf_counter() - started
+        started = time.perf_counter()
+    for table in client.query("SELECT name FROM system.tables WHERE database = currentDatabase() "
+                              "AND name LIKE 'transactions_before_%'").result_rows:
+        client.command(f"DROP TABLE {table[0]}")
+    client.command("OPTIMIZE TABLE transactions FINAL")
+
+    after_stats = table_stats(client)
+    print("After migrations:")
+    after = time_queries(client, params, config['rounds'])
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'config': config,
+        'load_seconds': load_seconds,
+        'migration_seconds': migrations,
+        'before': {'table': before_stats, 'queries': before},
+        'after': {'table': after_stats, 'queries': after},
+        'speedup': {name: before[name]['median_ms'] / max(after[name]['median_ms'], 1e-6)
+                    for name in QUERIES},
+    }
+
+    print("=" * 60)
+    for name, speedup in results['speedup'].items():
+        print(f"{name:28s} {speedup:6.1f}x")
+    print(f"On disk: {before_stats['bytes_on_disk'] / 2**30:.2f} GiB -> "
+          f"{after_stats['bytes_on_disk'] / 2**30:.2f} GiB")
+    print("=" * 60)
+
+    output = json.dumps(results, indent=2, default=str)
+    output_path = os.environ.get('BENCH_OUTPUT')
+    if output_path:
+        Path(output_path).write_text(output + "\n", encoding="utf-8")
+        print(f"✓ Results written to {output_path}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Parser Microbenchmark - Messages/s per core for the processor's pain.001 parsers
+"""
+
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR / "transaction_processor"))
+sys.path.insert(0, str(REPO_DIR / "transaction_generator"))
+
+from processor import TransactionProcessor  # noqa: E402
+from generator import TransactionGenerator  # noqa: E402
+from fakes import RecordingClickHouseClient  # noqa: E402
+
+
+def make_processor(parser):
+    """Build a processor without connecting to ClickHouse"""
+    return TransactionProcessor(None, None, None, None, parser=parser, client=RecordingClickHouseClient())
+
+
+def bench(parse, messages, rounds):
+    """Return the best messages/s over several rounds"""
+    best = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for xml_string in messages:
+            parse(xml_string)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(messages) / elapsed)
+    return best
+
+
+def main():
+    num_messages = int(os.environ.get('BENCH_MESSAGES', '5000'))
+    rounds = int(os.environ.get('BENCH_ROUNDS', '5'))
+    txs_per_message = int(os.environ.get('BENCH_TXS_PER_MESSAGE', '1'))
+
+    random.seed(20022)
+    generator = TransactionGenerator(str(REPO_DIR / "data" / "parties.txt"))
+    messages = [generator.generate_transaction_xml(num_transactions=txs_per_message) for _ in range(num_messages)]
+
+    print("=" * 60)
+    print(f"Parser benchmark: {num_messages} messages of {txs_per_message} transactions, "
+          f"best of {rounds} rounds (1 core)")
+    print("=" * 60)
+
+    results = {}
+    for parser in ('etree', 'fast'):
+        processor = make_processor(parser)
+        results[parser] = bench(processor.parse_transactions, messages, rounds)
+        print(f"{parser:>6}: {results[parser]:>10.0f} msg/s  "
+              f"({1e6 / results[parser]:.1f} µs/msg)")
+
+    print(f"Speedup: {results['fast'] / results['etree']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
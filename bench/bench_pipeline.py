@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark - Generator -> in-memory Kafka -> TransactionProcessor -> recording ClickHouse
+"""
+
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR / "transaction_processor"))
+sys.path.insert(0, str(REPO_DIR / "transaction_generator"))
+
+from processor import BatchRebalanceListener, TransactionProcessor, consume_messages  # noqa: E402
+from generator import TransactionGenerator, run_bulk  # noqa: E402
+from fakes import InMemoryConsumer, InMemoryProducer, InMemoryTopic, RecordingClickHouseClient  # noqa: E402
+
+
+class TimedProcessor(TransactionProcessor):
+    """TransactionProcessor that accumulates the time spent parsing messages into the batch"""
+
+    parse_seconds = 0.0
+    parse_calls = 0
+
+    def add_message(self, xml_string, source=None):
+        start = time.perf_counter()
+        try:
+            return super().add_message(xml_string, source)
+        finally:
+            self.parse_seconds += time.perf_counter() - start
+            self.parse_calls += 1
+
+
+def git_commit():
+    """Current commit hash, so results can be compared across commits"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is in KiB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_config():
+    """Read benchmark configuration from environment variables"""
+    return {
+        'messages': int(os.environ.get('BENCH_MESSAGES', '20000')),
+        'txs_per_message': int(os.environ.get('BENCH_TXS_PER_MESSAGE', '1')),
+        'partitions': int(os.environ.get('BENCH_PARTITIONS', '4')),
+        'batch_size': int(os.environ.get('BENCH_BATCH_SIZE', '1000')),
+        'parser': os.environ.get('BENCH_PARSER', 'fast'),
+        'seed': int(os.environ.get('BENCH_SEED', '20022')),
+    }
+
+
+def bench_generator(config, topic):
+    """Fill the in-memory topic through the generator's bulk send loop"""
+    random.seed(config['seed'])
+    generator = TransactionGenerator(str(REPO_DIR / "data" / "parties.txt"))
+    producer = InMemoryProducer({topic.name: topic}, value_serializer=lambda v: v.encode('utf-8'))
+
+    start = time.perf_counter()
+    run_bulk(generator, producer, topic.name, 0, config['messages'] * config['txs_per_message'],
+             config['txs_per_message'], report_interval=float('inf'))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'seconds': elapsed,
+        'messages': len(topic),
+        'tx_per_s': config['messages'] * config['txs_per_message'] / elapsed,
+        'msgs_per_s': len(topic) / elapsed,
+        'bytes_per_msg': producer.bytes_sent / max(1, len(topic)),
+    }
+
+
+def bench_processor(config, topic):
+    """Drain the in-memory topic through the processor's consume loop"""
+    client = RecordingClickHouseClient()
+    processor = TimedProcessor(None, None, None, None, batch_size=config['batch_size'],
+                               batch_max_linger_ms=60_000, parser=config['parser'], client=client)
+    stop_event = threading.Event()
+    consumer = InMemoryConsumer(topic, value_deserializer=lambda m: m.decode('utf-8'),
+                                max_poll_records=config['batch_size'], stop_event=stop_event)
+    consumer.subscribe([topic.name], listener=BatchRebalanceListener(consumer, processor))
+
+    start = time.perf_counter()
+    processed, failed = consume_messages(consumer, processor, poll_timeout_ms=0,
+                                         stop_event=stop_event, verbose=False)
+    elapsed = time.perf_counter() - start
+
+    messages = len(topic)
+    return {
+        'seconds': elapsed,
+        'messages': messages,
+        'rows': processed,
+        'failed_messages': failed,
+        'parse_us_per_msg': processor.parse_seconds / max(1, processor.parse_calls) * 1e6,
+        'msgs_per_s': messages / elapsed,
+        'rows_per_s': processed / elapsed,
+        'insert_calls': client.insert_calls,
+        'insert_calls_per_1k_msgs': client.insert_calls / max(1, messages) * 1000,
+        'rows_inserted': client.rows,
+        'offset_commits': consumer.commit_calls,
+    }
+
+
+def main():
+    config = load_config()
+    topic = InMemoryTopic('unprocessed', partitions=config['partitions'])
+
+    print("=" * 60)
+    print("Pipeline benchmark")
+    print("=" * 60)
+    for key, value in config.items():
+        print(f"{key}: {value}")
+    print("=" * 60)
+
+    generator_results = bench_generator(config, topic)
+    processor_results = bench_processor(config, topic)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'config': config,
+        'generator': generator_results,
+        'processor': processor_results,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    print("=" * 60)
+    print(f"Generator: {generator_results['tx_per_s']:,.0f} tx/s "
+          f"({generator_results['bytes_per_msg']:.0f} bytes/msg)")
+    print(f"Processor: {processor_results['parse_us_per_msg']:.1f} µs/msg parse | "
+          f"{processor_results['rows_per_s']:,.0f} rows/s | "
+          f"{processor_results['insert_calls_per_1k_msgs']:.2f} inserts/1k msgs")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    print("=" * 60)
+
+    output = json.dumps(results, indent=2)
+    output_path = os.environ.get('BENCH_OUTPUT')
+    if output_path:
+        Path(output_path).write_text(output + "\n", encoding="utf-8")
+        print(f"✓ Results written to {output_path}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
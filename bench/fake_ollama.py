@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Fake Ollama /api/chat server that replays scripted ReACT transcripts
+
+A transcript is a list of assistant turns. The turn returned is picked by the
+number of assistant messages already in the request, so the server keeps no
+per-conversation state and concurrent conversations don't interfere. Each
+conversation gets a transcript chosen by a CRC of its task, so replies are
+deterministic. Turns may contain {field} placeholders filled from the
+top-level fields of the JSON observations earlier in the conversation (e.g.
+{debtor_iban} from parse_transaction, {classification} from score_transaction).
+
+Model time is simulated: latency seconds before the first token, then
+tokens_per_second (about 4 characters per token). Streaming requests get NDJSON
+chunks paced at that rate and end with Ollama's usage counts.
+
+Run it standalone and point the agent at it:
+
+    python bench/fake_ollama.py --port 11434 --latency 0.3 --tokens-per-second 40
+    OLLAMA_URL=http://127.0.0.1:11434 python react_agent/run_agent.py
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# The agent's default flow (handles on): xml#1 is the transaction, then tx#1,
+# client#1 (debtor), client#2 (creditor), score#1
+DEFAULT_TRANSCRIPT = [
+    'Thought: I need to parse the transaction first.\n'
+    'Action: parse_transaction(xml_string="xml#1")',
+    'Thought: Now I look up the debtor.\n'
+    'Action: get_client_by_iban(iban="{debtor_iban}")',
+    'Thought: Now I look up the creditor.\n'
+    'Action: get_client_by_iban(iban="{creditor_iban}")',
+    'Thought: I have the transaction and the debtor, so I can score it.\n'
+    'Action: score_transaction(tx_json="tx#1", client_json="client#1")',
+    'Thought: I have the score.\n'
+    'Final Answer: Transaction {msg_id} scored {score} ({classification}).',
+]
+
+CHARS_PER_TOKEN = 4
+OBSERVATION_PREFIX = "Observation: "
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+def load_transcripts(path: str) -> List[List[str]]:
+    """A JSON file holding one transcript (list of turns) or a list of transcripts"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [data] if data and isinstance(data[0], str) else data
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def observation_fields(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Top-level scalar fields of every JSON observation, later ones winning"""
+    fields = {}
+    for message in messages:
+        content = message.get("content") or ""
+        if message.get("role") != "user" or not content.startswith(OBSERVATION_PREFIX):
+            continue
+        try:
+            data = json.loads(content[len(OBSERVATION_PREFIX):])
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            fields.update((k, v) for k, v in data.items() if not isinstance(v, (dict, list)))
+    return fields
+
+
+class FakeOllama:
+    """
+    The fake server's replies and accounting
+
+    stats() reports requests, simulated model seconds and token counts. A
+    streamed reply the client stops reading is only charged for the tokens
+    actually sent.
+    """
+
+    def __init__(self, transcripts: Optional[List[List[str]]] = None, latency: float = 0.0,
+                 tokens_per_second: float = 0.0):
+        self.transcripts = transcripts or [DEFAULT_TRANSCRIPT]
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        self.model_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def reply(self, messages: List[Dict[str, Any]]) -> str:
+        """The scripted assistant turn for this conversation state"""
+        task = next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+        transcript = self.transcripts[zlib.crc32(task.encode("utf-8")) % len(self.transcripts)]
+        turn = transcript[min(sum(1 for m in messages if m.get("role") == "assistant"), len(transcript) - 1)]
+        fields = observation_fields(messages)
+        return PLACEHOLDER.sub(lambda m: str(fields.get(m.group(1), m.group(0))), turn)
+
+    def _token_seconds(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _charge(self, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self._lock:
+            self.model_seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def _usage(self, messages, content) -> Dict[str, Any]:
+        return {"done": True, "prompt_eval_count": count_tokens("".join(m.get("content") or "" for m in messages)),
+                "eval_count": count_tokens(content)}
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        messages = body.get("messages", [])
+        content = self.reply(messages)
+        usage = self._usage(messages, content)
+        with self._lock:
+            self.requests += 1
+        message = {"role": "assistant", "content": content}
+
+        if not body.get("stream", True):
+            seconds = self.latency + self._token_seconds(usage["eval_count"])
+            await asyncio.sleep(seconds)
+            self._charge(seconds, usage["prompt_eval_count"], usage["eval_count"])
+            return web.json_response({"model": body.get("model"), "message": message, **usage})
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        loop = asyncio.get_running_loop()
+        # Chunks are paced against absolute deadlines so sleep overshoot
+        # doesn't accumulate into time that isn't charged as model time
+        deadline = loop.time() + self.latency
+        await asyncio.sleep(self.latency)
+        self._charge(self.latency, usage["prompt_eval_count"])
+        try:
+            for start in range(0, len(content), CHARS_PER_TOKEN):
+                deadline += self._token_seconds(1)
+                await asyncio.sleep(max(0.0, deadline - loop.time()))
+                piece = content[start:start + CHARS_PER_TOKEN]
+                chunk = {"message": {"role": "assistant", "content": piece}, "done": False}
+                await response.write(json.dumps(chunk).encode("utf-8") + b"\n")
+                self._charge(self._token_seconds(1), completion_tokens=1)
+            final = {"message": {"role": "assistant", "content": ""}, **usage}
+            await response.write(json.dumps(final).encode("utf-8") + b"\n")
+            await response.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            # The agent stopped reading at a complete Action
+            pass
+        return response
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/chat", self.chat)
+        return app
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "model_seconds": self.model_seconds,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class FakeOllamaServer:
+    """FakeOllama served from a background thread, for synchronous callers"""
+
+    def __init__(self, fake: FakeOllama, host: str = "127.0.0.1", port: int = 0):
+        self.fake = fake
+        self.host = host
+        self.port = port
+        self.url = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def start(self) -> str:
+        """Start serving and return the base URL"""
+        ready = threading.Event()
+
+        async def serve():
+            self._runner = web.AppRunner(self.fake.app())
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+            self.url = f"http://{self.host}:{self.port}"
+            ready.set()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(serve(), self._loop).result()
+        ready.wait()
+        return self.url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama /api/chat replaying scripted ReACT transcripts")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help="generation speed (0: instant)")
+    parser.add_argument('--transcript', help="JSON file with a transcript or a list of transcripts")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcript) if args.transcript else None
+    fake = FakeOllama(transcripts, latency=args.latency, tokens_per_second=args.tokens_per_second)
+    web.run_app(fake.app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
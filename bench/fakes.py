@@ -0,0 +1,167 @@
+"""
+In-process stand-ins for Kafka and ClickHouse used by the offline benchmarks
+"""
+
+from collections import namedtuple
+
+from kafka.structs import TopicPartition
+
+# The subset of kafka ConsumerRecord the processor reads
+Record = namedtuple('Record', ['topic', 'partition', 'offset', 'value'])
+
+
+class InMemoryTopic:
+    """Append-only partitioned log that stands in for a Kafka topic"""
+
+    def __init__(self, name='unprocessed', partitions=1):
+        self.name = name
+        self.partitions = [[] for _ in range(partitions)]
+        self._next_partition = 0
+
+    def append(self, value, partition=None):
+        """Append a serialized value round-robin (or to partition) and return its offset"""
+        if partition is None:
+            partition = self._next_partition
+            self._next_partition = (self._next_partition + 1) % len(self.partitions)
+        log = self.partitions[partition]
+        log.append(value)
+        return partition, len(log) - 1
+
+    def __len__(self):
+        return sum(len(log) for log in self.partitions)
+
+
+class _SendFuture:
+    """Already-completed send result supporting the callback chaining of FutureRecordMetadata"""
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    def add_callback(self, fn, *args, **kwargs):
+        fn(*args, self.metadata, **kwargs)
+        return self
+
+    def add_errback(self, fn, *args, **kwargs):
+        return self
+
+    def get(self, timeout=None):
+        return self.metadata
+
+
+RecordMetadata = namedtuple('RecordMetadata', ['topic', 'partition', 'offset'])
+
+
+class InMemoryProducer:
+    """KafkaProducer stand-in that appends serialized values to InMemoryTopics"""
+
+    def __init__(self, topics, value_serializer=None):
+        self.topics = topics
+        self.value_serializer = value_serializer
+        self.bytes_sent = 0
+
+    def send(self, topic, value=None):
+        if self.value_serializer is not None:
+            value = self.value_serializer(value)
+        self.bytes_sent += len(value)
+        partition, offset = self.topics[topic].append(value)
+        return _SendFuture(RecordMetadata(topic, partition, offset))
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+
+class InMemoryConsumer:
+    """
+    KafkaConsumer stand-in reading from an InMemoryTopic
+
+    Supports subscribe / poll / commit / committed / seek / close as used by
+    the processor. The consumer owns every partition of the topic and starts
+    from the offsets committed in group, a TopicPartition -> OffsetAndMetadata
+    dict that several consumers can share to model a restart. A subscribed
+    listener is told about the assignment on the first poll. When stop_event
+    is given it is set by the first poll that finds the topic drained, which
+    ends the processor's consume loop.
+    """
+
+    def __init__(self, topic, value_deserializer=None, max_poll_records=500, stop_event=None,
+                 group=None):
+        self.topic = topic
+        self.value_deserializer = value_deserializer
+        self.max_poll_records = max_poll_records
+        self.stop_event = stop_event
+        self.group = {} if group is None else group
+        self.positions = {}
+        for p in range(len(topic.partitions)):
+            tp = TopicPartition(topic.name, p)
+            self.positions[tp] = self.group[tp].offset if tp in self.group else 0
+        self.listener = None
+        self._assigned = False
+        self.commit_calls = 0
+
+    def subscribe(self, topics=(), pattern=None, listener=None):
+        self.listener = listener
+
+    def poll(self, timeout_ms=0, max_records=None):
+        if not self._assigned:
+            self._assigned = True
+            if self.listener is not None:
+                self.listener.on_partitions_assigned(list(self.positions))
+        budget = max_records or self.max_poll_records
+        records = {}
+        for tp, position in self.positions.items():
+            if budget <= 0:
+                break
+            log = self.topic.partitions[tp.partition]
+            end = min(len(log), position + budget)
+            if end > position:
+                records[tp] = [
+                    Record(tp.topic, tp.partition, offset,
+                           self.value_deserializer(log[offset]) if self.value_deserializer else log[offset])
+                    for offset in range(position, end)
+                ]
+                self.positions[tp] = end
+                budget -= end - position
+
+        if not records and self.stop_event is not None:
+            self.stop_event.set()
+        return records
+
+    def commit(self, offsets=None):
+        self.commit_calls += 1
+        self.group.update(offsets or {})
+
+    def committed(self, partition, metadata=False):
+        offset_and_metadata = self.group.get(partition)
+        if metadata or offset_and_metadata is None:
+            return offset_and_metadata
+        return offset_and_metadata.offset
+
+    def seek(self, partition, offset):
+        self.positions[partition] = offset
+
+    def close(self):
+        pass
+
+
+class RecordingClickHouseClient:
+    """clickhouse_connect client stand-in that counts inserted rows per table"""
+
+    def __init__(self):
+        self.insert_calls = 0
+        self.rows = {}
+        self.calls = []
+
+    def insert(self, table, data, column_names=None, column_oriented=False, **kwargs):
+        num_rows = len(data[0]) if column_oriented and data else len(data)
+        self.insert_calls += 1
+        self.rows[table] = self.rows.get(table, 0) + num_rows
+        self.calls.append((table, num_rows))
+
+    def command(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
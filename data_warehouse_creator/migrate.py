@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+ClickHouse Migration Runner - Versioned, incremental schema changes for the bank_dw warehouse
+
+Plays the role Alembic plays for bank_db: every file in migrations/versions defines a
+revision, the down_revision it follows and an upgrade(op) function. Applied revisions
+are recorded in the schema_migrations table, so `upgrade` only runs what is missing.
+Migrations are forward-only; shadow-table rebuilds keep the previous table for rollback.
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import clickhouse_connect
+
+VERSIONS_DIR = Path(__file__).resolve().parent / "migrations" / "versions"
+VERSION_TABLE = "schema_migrations"
+BACKFILL_TABLE = "schema_migration_backfills"
+
+REVISION_TEMPLATE = '''"""{message}
+
+Revision ID: {revision}
+Revises: {down_revision}
+Create Date: {create_date}
+
+"""
+
+# revision identifiers, used by the migration runner.
+revision = {revision!r}
+down_revision = {down_revision!r}
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    pass
+'''
+
+
+class MigrationError(Exception):
+    """Inconsistent migration history or a failed migration step"""
+
+
+class Migration:
+    """One revision file from migrations/versions"""
+
+    def __init__(self, path):
+        spec = importlib.util.spec_from_file_location(f"dw_migration_{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        self.path = path
+        self.revision = module.revision
+        self.down_revision = module.down_revision
+        doc = (module.__doc__ or "").strip()
+        self.description = doc.splitlines()[0] if doc else path.stem
+        self.upgrade = module.upgrade
+
+
+def load_migrations(versions_dir=VERSIONS_DIR):
+    """
+    Load all revisions and return them in application order
+
+    The revisions must form a single chain starting at down_revision None,
+    like a linear Alembic history.
+    """
+    migrations = [Migration(path) for path in sorted(Path(versions_dir).glob("*.py"))
+                  if not path.name.startswith("_")]
+    by_down_revision = {}
+    for migration in migrations:
+        if migration.down_revision in by_down_revision:
+            raise MigrationError(f"Revisions {by_down_revision[migration.down_revision].revision} and "
+                                 f"{migration.revision} both follow {migration.down_revision}")
+        by_down_revision[migration.down_revision] = migration
+
+    ordered = []
+    current = None
+    while current in by_down_revision:
+        migration = by_down_revision.pop(current)
+        ordered.append(migration)
+        current = migration.revision
+    if by_down_revision:
+        orphans = ", ".join(m.revision for m in by_down_revision.values())
+        raise MigrationError(f"Revisions not connected to the history: {orphans}")
+    return ordered
+
+
+class Operations:
+    """
+    Schema operations available to upgrade(op)
+
+    Statements run unqualified against the runner's database. Long-running
+    ALTERs are submitted as mutations and, unless wait=False, block until
+    they are done on every part.
+    """
+
+    def __init__(self, client_factory, revision=None, log=print):
+        self.client_factory = client_factory
+        self.client = client_factory()
+        self.revision = revision
+        self.log = log
+
+    def execute(self, sql, settings=None):
+        """Run a single SQL statement"""
+        return self.client.command(sql, settings=settings)
+
+    def add_projection(self, table, name, query):
+        """ALTER TABLE ... ADD PROJECTION; only parts written afterwards contain it"""
+        self.execute(f"ALTER TABLE {table} ADD PROJECTION IF NOT EXISTS {name} ({query})")
+
+    def materialize_projection(self, table, name, wait=True):
+        """Build a projection for the existing parts, one partition at a time"""
+        self._materialize(table, f"PROJECTION {name}", wait)
+
+    def add_index(self, table, name, expression, index_type, granularity=1):
+        """ALTER TABLE ... ADD INDEX for a data skipping index"""
+        self.execute(f"ALTER TABLE {table} ADD INDEX IF NOT EXISTS {name} {expression} "
+                     f"TYPE {index_type} GRANULARITY {granularity}")
+
+    def materialize_index(self, table, name, wait=True):
+        """Build a skip index for the existing parts, one partition at a time"""
+        self._materialize(table, f"INDEX {name}", wait)
+
+    def _materialize(self, table, target, wait):
+        # Per-partition mutations keep each step short and let the table serve queries
+        settings = {'mutations_sync': 2} if wait else None
+        for partition_id in self.partitions(table):
+            self.execute(f"ALTER TABLE {table} MATERIALIZE {target} IN PARTITION ID '{partition_id}'",
+                         settings=settings)
+            self.log(f"  materialized {target} in {table} partition {partition_id}")
+
+    def partitions(self, table):
+        """Partition ids of the active parts of a table"""
+        result = self.client.query(
+            "SELECT DISTINCT partition_id FROM system.parts "
+            "WHERE database = currentDatabase() AND table = {table:String} AND active "
+            "ORDER BY partition_id", parameters={'table': table})
+        return [row[0] for row in result.result_rows]
+
+    def rebuild_table(self, table, create_sql, columns=None, workers=4):
+        """
+        Rebuild a table through a shadow copy and swap it in
+
+        create_sql is the new table definition with a {table} placeholder for
+        its name; it must keep the source table's PARTITION BY. columns are
+        the columns copied by name (default: every column the two tables have
+        in common, so columns added by the new definition get their DEFAULT).
+        Partitions are copied in parallel (one INSERT ... SELECT each, workers
+        at a time) and recorded in schema_migration_backfills, so a rerun
+        after a failure only copies the partitions that did not finish. The
+        tables are then exchanged with swap_table().
+
+        A partition is only recorded once the shadow holds as many rows as
+        the source partition; otherwise MigrationError is raised. Merges of
+        the shadow are stopped during the copy so a ReplacingMergeTree does
+        not collapse rows before they are counted.
+        """
+        shadow = f"{table}_shadow"
+        previous = f"{table}_before_{self.revision}"
+        if self.table_exists(previous):
+            self.log(f"  {table} was already swapped in, {previous} exists")
+            return
+        self.execute(create_sql.format(table=shadow).replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1))
+        if columns is None:
+            source = set(self.columns(table))
+            columns = [column for column in self.columns(shadow) if column in source]
+        column_list = ", ".join(columns)
+
+        done = self._finished_partitions(table)
+        pending = [p for p in self.partitions(table) if p not in done]
+        self.log(f"  copying {len(pending)} partitions of {table} ({len(done)} already copied)")
+
+        def count(client, source, partition_id):
+            return client.query(f"SELECT count() FROM {source} "
+                                f"WHERE _partition_id = '{partition_id}'").result_rows[0][0]
+
+        def copy(partition_id):
+            client = self.client_factory()
+            try:
+                # Drop whatever an interrupted copy of this partition left behind
+                client.command(f"ALTER TABLE {shadow} DROP PARTITION ID '{partition_id}'")
+                start = time.perf_counter()
+                # The shadow's deduplication window still holds the block hashes of
+                # an interrupted copy, which would silently drop the same blocks now
+                client.command(f"INSERT INTO {shadow} ({column_list}) SELECT {column_list} FROM {table} "
+                               f"WHERE _partition_id = '{partition_id}'", settings={'insert_deduplicate': 0})
+                rows, expected = count(client, shadow, partition_id), count(client, table, partition_id)
+                if rows != expected:
+                    raise MigrationError(f"Copied {rows} of {expected} rows of {table} partition {partition_id}")
+                client.insert(BACKFILL_TABLE, [[self.revision or '', table, partition_id, rows]],
+                              column_names=['version', 'table_name', 'partition_id', 'rows'])
+                self.log(f"  copied {table} partition {partition_id}: {rows} rows "
+                         f"in {time.perf_counter() - start:.1f}s")
+            finally:
+                client.close()
+
+        if pending:
+            self.execute(f"SYSTEM STOP MERGES {shadow}")
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    # list() re-raises the first failed copy
+                    list(pool.map(copy, pending))
+            finally:
+                self.execute(f"SYSTEM START MERGES {shadow}")
+
+        self.swap_table(table, shadow)
+
+    def swap_table(self, table, shadow):
+        """
+        Put shadow in place of table, keeping the old table as <table>_before_<revision>
+
+        Materialized views follow their source table through a RENAME, so
+        the views reading from table are detached around the swap and
+        attached again afterwards, which binds them to the new table by
+        name. Raises MigrationError if a view does not end up reading from
+        the new table.
+        """
+        previous = f"{table}_before_{self.revision}"
+        views = self.dependent_views(table)
+        for view in views:
+            self.execute(f"DETACH TABLE {view}")
+        try:
+            self.execute(f"RENAME TABLE {table} TO {previous}, {shadow} TO {table}")
+        finally:
+            for view in views:
+                self.execute(f"ATTACH TABLE {view}")
+
+        missing = sorted(set(views) - set(self.dependent_views(table)))
+        if missing:
+            raise MigrationError(f"Views {', '.join(missing)} do not read from the rebuilt {table}")
+        self.log(f"  swapped in rebuilt {table}; previous table kept as {previous}"
+                 + (f", re-attached {', '.join(views)}" if views else ""))
+
+    def modify_settings(self, table, settings):
+        """ALTER TABLE ... MODIFY SETTING; for a materialized view, on its inner table"""
+        target = self.view_storage(table) or table
+        assignments = ", ".join(f"{name} = {value}" for name, value in settings.items())
+        self.execute(f"ALTER TABLE `{target}` MODIFY SETTING {assignments}")
+
+    def view_storage(self, view):
+        """Name of the inner table of a materialized view without TO, or None"""
+        result = self.client.query(
+            "SELECT name FROM system.tables WHERE database = currentDatabase() AND name IN ("
+            "concat('.inner_id.', toString((SELECT any(uuid) FROM system.tables "
+            "WHERE database = currentDatabase() AND name = {view:String}))), "
+            "concat('.inner.', {view:String}))", parameters={'view': view})
+        return result.result_rows[0][0] if result.result_rows else None
+
+    def dependent_views(self, table):
+        """Materialized views in this database that read from table"""
+        result = self.client.query(
+            "SELECT arrayJoin(arrayFilter((view, db) -> db = currentDatabase(), "
+            "dependencies_table, dependencies_database)) FROM system.tables "
+            "WHERE database = currentDatabase() AND name = {table:String}",
+            parameters={'table': table})
+        return [row[0] for row in result.result_rows]
+
+    def columns(self, table):
+        """Names of the stored (not ALIAS / MATERIALIZED) columns of a table, in order"""
+        result = self.client.query(
+            "SELECT name FROM system.columns WHERE database = currentDatabase() AND table = {table:String} "
+            "AND default_kind NOT IN ('ALIAS', 'MATERIALIZED') ORDER BY position",
+            parameters={'table': table})
+        return [row[0] for row in result.result_rows]
+
+    def table_exists(self, table):
+        return bool(self.client.query(
+            "SELECT count() FROM system.tables WHERE database = currentDatabase() AND name = {table:String}",
+            parameters={'table': table}).result_rows[0][0])
+
+    def _finished_partitions(self, table):
+        result = self.client.query(
+            f"SELECT partition_id FROM {BACKFILL_TABLE} "
+            "WHERE version = {version:String} AND table_name = {table:String}",
+            parameters={'version': self.revision or '', 'table': table})
+        return {row[0] for row in result.result_rows}
+
+
+def connect(database=None):
+    """Connect to ClickHouse using the CLICKHOUSE_* environment variables"""
+    return clickhouse_connect.get_client(
+        host=os.environ.get('CLICKHOUSE_HOST', 'localhost'),
+        port=int(os.environ.get('CLICKHOUSE_PORT', '8123')),
+        username=os.environ.get('CLICKHOUSE_USER', 'default'),
+        password=os.environ.get('CLICKHOUSE_PASSWORD', ''),
+        database=database or os.environ.get('CLICKHOUSE_DATABASE', 'bank_dw'),
+    )
+
+
+def ensure_version_tables(client):
+    """Create the bookkeeping tables if this database has never been migrated"""
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version String,
+            description String,
+            applied_at DateTime64(3) DEFAULT now64(3)
+        ) ENGINE = MergeTree()
+        ORDER BY version""")
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {BACKFILL_TABLE} (
+            version String,
+            table_name String,
+            partition_id String,
+            rows UInt64,
+            finished_at DateTime64(3) DEFAULT now64(3)
+        ) ENGINE = MergeTree()
+        ORDER BY (version, table_name, partition_id)""")
+
+
+def applied_versions(client):
+    """Revisions recorded in schema_migrations"""
+    return {row[0] for row in client.query(f"SELECT version FROM {VERSION_TABLE}").result_rows}
+
+
+def record_version(client, migration):
+    client.insert(VERSION_TABLE, [[migration.revision, migration.description]],
+                  column_names=['version', 'description'])
+
+
+def upgrade(client_factory, target=None, migrations=None, log=print):
+    """
+    Apply every revision not yet recorded, in order, up to and including target
+
+    Returns the list of applied revisions.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    if target is not None and target not in {m.revision for m in migrations}:
+        raise MigrationError(f"Unknown revision: {target}")
+
+    client = client_factory()
+    ensure_version_tables(client)
+    done = applied_versions(client)
+
+    applied = []
+    for migration in migrations:
+        if migration.revision not in done:
+            log(f"→ Applying {migration.revision}: {migration.description}")
+            start = time.perf_counter()
+            migration.upgrade(Operations(client_factory, migration.revision, log))
+            record_version(client, migration)
+            applied.append(migration.revision)
+            log(f"✓ Applied {migration.revision} in {time.perf_counter() - start:.1f}s")
+        if migration.revision == target:
+            break
+    return applied
+
+
+def stamp(client, revision, migrations=None):
+    """Record revision and everything before it as applied without running them"""
+    migrations = load_migrations() if migrations is None else migrations
+    if revision not in {m.revision for m in migrations}:
+        raise MigrationError(f"Unknown revision: {revision}")
+
+    ensure_version_tables(client)
+    done = applied_versions(client)
+    for migration in migrations:
+        if migration.revision not in done:
+            record_version(client, migration)
+        if migration.revision == revision:
+            break
+
+
+def new_revision(message, versions_dir=VERSIONS_DIR):
+    """Write an empty revision file following the current head and return its path"""
+    migrations = load_migrations(versions_dir)
+    down_revision = migrations[-1].revision if migrations else None
+    revision = f"{int(down_revision or 0) + 1:04d}"
+    slug = re.sub(r"[^a-z0-9]+", "_", message.lower()).strip("_")
+    path = Path(versions_dir) / f"{revision}_{slug}.py"
+    path.write_text(REVISION_TEMPLATE.format(message=message, revision=revision,
+                                             down_revision=down_revision,
+                                             create_date=datetime.now().isoformat(sep=' ')),
+                    encoding='utf-8')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned schema migrations for the ClickHouse warehouse")
+    commands = parser.add_subparsers(dest='command', required=True)
+    upgrade_parser = commands.add_parser('upgrade', help="apply pending revisions")
+    upgrade_parser.add_argument('target', nargs='?', default='head', help="revision to stop at (default: head)")
+    commands.add_parser('current', help="show applied revisions")
+    commands.add_parser('history', help="list all revisions")
+    stamp_parser = commands.add_parser('stamp', help="mark revisions as applied without running them")
+    stamp_parser.add_argument('revision', help="revision, or head")
+    revision_parser = commands.add_parser('revision', help="create a new revision file")
+    revision_parser.add_argument('-m', '--message', required=True)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'revision':
+            print(f"✓ Created {new_revision(args.message)}")
+            return
+        migrations = load_migrations()
+        if args.command == 'history':
+            for migration in migrations:
+                print(f"{migration.down_revision} -> {migration.revision}: {migration.description}")
+            return
+
+        head = migrations[-1].revision if migrations else None
+        client = connect()
+        if args.command == 'upgrade':
+            target = head if args.target == 'head' else args.target
+            applied = upgrade(connect, target, migrations)
+            if not applied:
+                print("✓ Already up to date")
+        elif args.command == 'stamp':
+            stamp(client, head if args.revision == 'head' else args.revision, migrations)
+            print(f"✓ Stamped {args.revision}")
+        elif args.command == 'current':
+            ensure_version_tables(client)
+            done = applied_versions(client)
+            for migration in migrations:
+                mark = "applied" if migration.revision in done else "pending"
+                print(f"{migration.revision} ({mark}): {migration.description}")
+    except MigrationError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
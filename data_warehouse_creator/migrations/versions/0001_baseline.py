@@ -0,0 +1,96 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises: None
+Create Date: 2026-10-17 11:02:18.640215
+
+The warehouse as created by init-db.sql before versioned migrations existed:
+transactions and dim_parties on plain (Replacing)MergeTree engines and the
+daily_transaction_summary / high_value_transactions views. Every statement is
+IF NOT EXISTS, so upgrading a warehouse that predates schema_migrations only
+records this revision and continues with 0002.
+"""
+
+# revision identifiers, used by the migration runner.
+revision = '0001'
+down_revision = None
+
+TRANSACTIONS = """
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id String,
+    message_id String,
+    end_to_end_id String,
+    payment_info_id String,
+    created_datetime DateTime64(3),
+    processing_datetime DateTime64(3) DEFAULT now64(3),
+    amount Decimal(18, 2),
+    currency String,
+    debtor_name String,
+    debtor_iban String,
+    debtor_country String,
+    creditor_name String,
+    creditor_iban String,
+    creditor_country String,
+    payment_method String,
+    control_sum Decimal(18, 2),
+    num_transactions UInt32,
+    raw_xml String,
+    processed_status String DEFAULT 'SUCCESS'
+) ENGINE = MergeTree()
+ORDER BY (created_datetime, transaction_id)
+PARTITION BY toYYYYMM(created_datetime)
+"""
+
+DIM_PARTIES = """
+CREATE TABLE IF NOT EXISTS dim_parties (
+    iban String,
+    party_name String,
+    country String,
+    currency String,
+    last_seen DateTime64(3),
+    total_transactions UInt64,
+    total_sent Decimal(18, 2) DEFAULT 0,
+    total_received Decimal(18, 2) DEFAULT 0
+) ENGINE = ReplacingMergeTree(last_seen)
+ORDER BY iban
+"""
+
+DAILY_TRANSACTION_SUMMARY = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS daily_transaction_summary
+ENGINE = SummingMergeTree()
+ORDER BY (transaction_date, currency)
+AS SELECT
+    toDate(created_datetime) AS transaction_date,
+    currency,
+    count() AS transaction_count,
+    sum(amount) AS total_amount,
+    uniq(debtor_iban) AS unique_senders,
+    uniq(creditor_iban) AS unique_receivers
+FROM transactions
+GROUP BY transaction_date, currency
+"""
+
+HIGH_VALUE_TRANSACTIONS = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS high_value_transactions
+ENGINE = MergeTree()
+ORDER BY (created_datetime, amount)
+AS SELECT
+    transaction_id,
+    created_datetime,
+    amount,
+    currency,
+    debtor_name,
+    creditor_name,
+    debtor_iban,
+    creditor_iban
+FROM transactions
+WHERE amount > 10000
+"""
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    op.execute(TRANSACTIONS)
+    op.execute(DIM_PARTIES)
+    op.execute(DAILY_TRANSACTION_SUMMARY)
+    op.execute(HIGH_VALUE_TRANSACTIONS)
@@ -0,0 +1,58 @@
+"""dim_parties as an AggregatingMergeTree of per-party deltas
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 11:04:51.093377
+
+The old ReplacingMergeTree(last_seen) kept a single row per IBAN from the
+one-row-per-transaction inserts, so its counters cannot be carried over. The
+new table is filled from transactions instead: one debtor and one creditor
+aggregate per IBAN, which is what the processor's delta rows sum to. Run with
+the processor stopped; dim_parties_before_0002 is kept.
+"""
+
+# revision identifiers, used by the migration runner.
+revision = '0002'
+down_revision = '0001'
+
+DIM_PARTIES = """
+CREATE TABLE {table} (
+    iban String,
+    party_name SimpleAggregateFunction(anyLast, String),
+    country SimpleAggregateFunction(anyLast, String),
+    currency SimpleAggregateFunction(anyLast, String),
+    last_seen SimpleAggregateFunction(max, DateTime64(3)),
+    total_transactions SimpleAggregateFunction(sum, UInt64),
+    total_sent SimpleAggregateFunction(sum, Decimal(18, 2)) DEFAULT 0,
+    total_received SimpleAggregateFunction(sum, Decimal(18, 2)) DEFAULT 0
+) ENGINE = AggregatingMergeTree()
+ORDER BY iban
+"""
+
+# One aggregate row per IBAN and role; the engine sums the two roles on merge
+BACKFILL = """
+INSERT INTO {table} (iban, party_name, country, currency, last_seen,
+                     total_transactions, total_sent, total_received)
+SELECT
+    {role}_iban,
+    argMax({role}_name, processing_datetime),
+    argMax({role}_country, processing_datetime),
+    argMax(currency, processing_datetime),
+    max(processing_datetime),
+    count(),
+    {sent},
+    {received}
+FROM transactions
+GROUP BY {role}_iban
+"""
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    if op.table_exists('dim_parties_before_0002'):
+        return
+    op.execute("DROP TABLE IF EXISTS dim_parties_shadow")
+    op.execute(DIM_PARTIES.format(table='dim_parties_shadow'))
+    op.execute(BACKFILL.format(table='dim_parties_shadow', role='debtor', sent='sum(amount)', received='0'))
+    op.execute(BACKFILL.format(table='dim_parties_shadow', role='creditor', sent='0', received='sum(amount)'))
+    op.swap_table('dim_parties', 'dim_parties_shadow')
@@ -0,0 +1,34 @@
+"""kafka source columns on transactions and the raw_messages table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:06:37.482910
+
+Existing rows get the column defaults (empty topic, partition and offset 0);
+the ZSTD codec on raw_xml applies to parts written or merged afterwards.
+"""
+
+# revision identifiers, used by the migration runner.
+revision = '0003'
+down_revision = '0002'
+
+RAW_MESSAGES = """
+CREATE TABLE IF NOT EXISTS raw_messages (
+    transaction_id String,
+    message_id String,
+    raw_xml String CODEC(ZSTD(3))
+) ENGINE = MergeTree()
+ORDER BY transaction_id
+"""
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    op.execute("""
+        ALTER TABLE transactions
+            MODIFY COLUMN raw_xml String DEFAULT '' CODEC(ZSTD(3)),
+            ADD COLUMN IF NOT EXISTS kafka_topic LowCardinality(String) DEFAULT '' AFTER processed_status,
+            ADD COLUMN IF NOT EXISTS kafka_partition UInt32 DEFAULT 0 AFTER kafka_topic,
+            ADD COLUMN IF NOT EXISTS kafka_offset UInt64 DEFAULT 0 AFTER kafka_partition
+    """, settings={'mutations_sync': 2})
+    op.execute(RAW_MESSAGES)
@@ -0,0 +1,65 @@
+"""ReplacingMergeTree and deduplication windows for idempotent inserts
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 11:08:12.775034
+
+transactions and raw_messages change engine, which ClickHouse cannot do in
+place, so both are rebuilt through shadow copies (run with the processor
+stopped). dim_parties and the storage of the two materialized views only
+need non_replicated_deduplication_window, which is an online setting change.
+"""
+
+# revision identifiers, used by the migration runner.
+revision = '0004'
+down_revision = '0003'
+
+DEDUPLICATION = {'non_replicated_deduplication_window': 1000}
+
+TRANSACTIONS = """
+CREATE TABLE {table} (
+    transaction_id String,
+    message_id String,
+    end_to_end_id String,
+    payment_info_id String,
+    created_datetime DateTime64(3),
+    processing_datetime DateTime64(3) DEFAULT now64(3),
+    amount Decimal(18, 2),
+    currency String,
+    debtor_name String,
+    debtor_iban String,
+    debtor_country String,
+    creditor_name String,
+    creditor_iban String,
+    creditor_country String,
+    payment_method String,
+    control_sum Decimal(18, 2),
+    num_transactions UInt32,
+    raw_xml String DEFAULT '' CODEC(ZSTD(3)),
+    processed_status String DEFAULT 'SUCCESS',
+    kafka_topic LowCardinality(String) DEFAULT '',
+    kafka_partition UInt32 DEFAULT 0,
+    kafka_offset UInt64 DEFAULT 0
+) ENGINE = ReplacingMergeTree(processing_datetime)
+ORDER BY (created_datetime, transaction_id)
+PARTITION BY toYYYYMM(created_datetime)
+SETTINGS non_replicated_deduplication_window = 1000
+"""
+
+RAW_MESSAGES = """
+CREATE TABLE {table} (
+    transaction_id String,
+    message_id String,
+    raw_xml String CODEC(ZSTD(3))
+) ENGINE = ReplacingMergeTree()
+ORDER BY transaction_id
+SETTINGS non_replicated_deduplication_window = 1000
+"""
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    op.rebuild_table('transactions', TRANSACTIONS)
+    op.rebuild_table('raw_messages', RAW_MESSAGES)
+    for table in ('dim_parties', 'daily_transaction_summary', 'high_value_transactions'):
+        op.modify_settings(table, DEDUPLICATION)
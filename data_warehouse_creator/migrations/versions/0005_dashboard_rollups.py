@@ -0,0 +1,97 @@
+"""rollup tables and materialized views behind the dashboard
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 11:10:44.351862
+
+The rollups are backfilled from transactions before their views are created,
+so run with the processor stopped: a batch inserted in between would be
+missing from (or, with the views already present, counted twice in) the
+rollups. A view that already exists was finished by an earlier run and is
+left alone; otherwise its rows in the target table are deleted and backfilled
+again. The uniq counts are replay-safe; the total_amount sums are not (see
+init-db.sql).
+"""
+
+# revision identifiers, used by the migration runner.
+revision = '0005'
+down_revision = '0004'
+
+TRANSACTIONS_PER_MINUTE = """
+CREATE TABLE IF NOT EXISTS transactions_per_minute (
+    minute DateTime,
+    currency LowCardinality(String),
+    transactions AggregateFunction(uniq, String),
+    high_value_transactions AggregateFunction(uniq, String),
+    total_amount AggregateFunction(sum, Decimal(18, 2)),
+    debtors AggregateFunction(uniq, String),
+    creditors AggregateFunction(uniq, String)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(minute)
+ORDER BY (minute, currency)
+SETTINGS non_replicated_deduplication_window = 1000
+"""
+
+TRANSACTIONS_PER_MINUTE_SELECT = """
+SELECT
+    toStartOfMinute(processing_datetime) AS minute,
+    currency,
+    uniqState(transaction_id) AS transactions,
+    uniqStateIf(transaction_id, amount > 10000) AS high_value_transactions,
+    sumState(amount) AS total_amount,
+    uniqState(debtor_name) AS debtors,
+    uniqState(creditor_name) AS creditors
+FROM transactions{final}
+GROUP BY minute, currency
+"""
+
+PARTY_ACTIVITY_PER_HOUR = """
+CREATE TABLE IF NOT EXISTS party_activity_per_hour (
+    hour DateTime,
+    role Enum8('debtor' = 1, 'creditor' = 2),
+    party_name String,
+    transactions AggregateFunction(uniq, String),
+    high_value_transactions AggregateFunction(uniq, String),
+    total_amount AggregateFunction(sum, Decimal(18, 2))
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (role, hour, party_name)
+SETTINGS non_replicated_deduplication_window = 1000
+"""
+
+PARTY_ACTIVITY_SELECT = """
+SELECT
+    toStartOfHour(processing_datetime) AS hour,
+    '{role}' AS role,
+    {role}_name AS party_name,
+    uniqState(transaction_id) AS transactions,
+    uniqStateIf(transaction_id, amount > 10000) AS high_value_transactions,
+    sumState(amount) AS total_amount
+FROM transactions{final}
+GROUP BY hour, party_name
+"""
+
+# (view, target table, rows of the target it fills, SELECT) in creation order
+VIEWS = [
+    ('transactions_per_minute_mv', 'transactions_per_minute', '1',
+     TRANSACTIONS_PER_MINUTE_SELECT),
+    ('debtor_activity_per_hour_mv', 'party_activity_per_hour', "role = 'debtor'",
+     PARTY_ACTIVITY_SELECT.replace('{role}', 'debtor')),
+    ('creditor_activity_per_hour_mv', 'party_activity_per_hour', "role = 'creditor'",
+     PARTY_ACTIVITY_SELECT.replace('{role}', 'creditor')),
+]
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    op.execute(TRANSACTIONS_PER_MINUTE)
+    op.execute(PARTY_ACTIVITY_PER_HOUR)
+
+    for view, target, rows, select in VIEWS:
+        if op.table_exists(view):
+            continue
+        # Drop whatever an interrupted backfill left behind; FINAL so replayed
+        # rows awaiting the ReplacingMergeTree merge are summed once
+        op.execute(f"ALTER TABLE {target} DELETE WHERE {rows}", settings={'mutations_sync': 2})
+        op.execute(f"INSERT INTO {target} {select.format(final=' FINAL')}")
+        op.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view} TO {target} AS {select.format(final='')}")
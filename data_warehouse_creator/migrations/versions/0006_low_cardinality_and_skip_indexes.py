@@ -0,0 +1,32 @@
+"""low cardinality columns and skip indexes on transactions
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 10:12:41.208913
+
+"""
+
+# revision identifiers, used by the migration runner.
+revision = '0006'
+down_revision = '0005'
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    op.execute("""
+        ALTER TABLE transactions
+            MODIFY COLUMN currency LowCardinality(String),
+            MODIFY COLUMN debtor_country LowCardinality(String),
+            MODIFY COLUMN creditor_country LowCardinality(String),
+            MODIFY COLUMN payment_method LowCardinality(String),
+            MODIFY COLUMN processed_status LowCardinality(String) DEFAULT 'SUCCESS'
+    """, settings={'mutations_sync': 2})
+
+    op.add_index('transactions', 'idx_processing_datetime', 'processing_datetime', 'minmax', 1)
+    op.add_index('transactions', 'idx_debtor_iban', 'debtor_iban', 'bloom_filter(0.01)', 4)
+    op.add_index('transactions', 'idx_creditor_iban', 'creditor_iban', 'bloom_filter(0.01)', 4)
+
+    # New parts get the indexes on insert; build them for the existing parts
+    op.materialize_index('transactions', 'idx_processing_datetime')
+    op.materialize_index('transactions', 'idx_debtor_iban')
+    op.materialize_index('transactions', 'idx_creditor_iban')
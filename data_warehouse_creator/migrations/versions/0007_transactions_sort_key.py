@@ -0,0 +1,63 @@
+"""re-key transactions by hour, debtor_iban and transaction_id
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 10:14:05.517302
+
+ClickHouse cannot change the sorting key of existing columns in place, so the
+table is rebuilt through a shadow copy. Run with the processor stopped: rows
+inserted into the old table during the copy are not carried over. The
+materialized views reading from transactions are re-attached to the rebuilt
+table by the swap; transactions_before_0007 can be dropped afterwards.
+"""
+
+# revision identifiers, used by the migration runner.
+revision = '0007'
+down_revision = '0006'
+
+COLUMNS = [
+    'transaction_id', 'message_id', 'end_to_end_id', 'payment_info_id',
+    'created_datetime', 'processing_datetime', 'amount', 'currency',
+    'debtor_name', 'debtor_iban', 'debtor_country',
+    'creditor_name', 'creditor_iban', 'creditor_country',
+    'payment_method', 'control_sum', 'num_transactions', 'raw_xml', 'processed_status',
+    'kafka_topic', 'kafka_partition', 'kafka_offset',
+]
+
+TRANSACTIONS = """
+CREATE TABLE {table} (
+    transaction_id String,
+    message_id String,
+    end_to_end_id String,
+    payment_info_id String,
+    created_datetime DateTime64(3),
+    processing_datetime DateTime64(3) DEFAULT now64(3),
+    amount Decimal(18, 2),
+    currency LowCardinality(String),
+    debtor_name String,
+    debtor_iban String,
+    debtor_country LowCardinality(String),
+    creditor_name String,
+    creditor_iban String,
+    creditor_country LowCardinality(String),
+    payment_method LowCardinality(String),
+    control_sum Decimal(18, 2),
+    num_transactions UInt32,
+    raw_xml String DEFAULT '' CODEC(ZSTD(3)),
+    processed_status LowCardinality(String) DEFAULT 'SUCCESS',
+    kafka_topic LowCardinality(String) DEFAULT '',
+    kafka_partition UInt32 DEFAULT 0,
+    kafka_offset UInt64 DEFAULT 0,
+    INDEX idx_processing_datetime processing_datetime TYPE minmax GRANULARITY 1,
+    INDEX idx_debtor_iban debtor_iban TYPE bloom_filter(0.01) GRANULARITY 4,
+    INDEX idx_creditor_iban creditor_iban TYPE bloom_filter(0.01) GRANULARITY 4
+) ENGINE = ReplacingMergeTree(processing_datetime)
+ORDER BY (toStartOfHour(created_datetime), debtor_iban, transaction_id)
+PARTITION BY toYYYYMM(created_datetime)
+SETTINGS non_replicated_deduplication_window = 1000
+"""
+
+
+def upgrade(op):
+    """Upgrade schema."""
+    op.rebuild_table('transactions', TRANSACTIONS, columns=COLUMNS)
@@ -0,0 +1,260 @@
+import re
+from pathlib import Path
+
+import pytest
+
+import migrate
+from migrate import MigrationError, Operations, load_migrations, new_revision, stamp, upgrade
+
+INIT_DB = Path(__file__).resolve().parents[1] / "init-db.sql"
+
+
+class Result:
+    def __init__(self, rows):
+        self.result_rows = rows
+
+
+class FakeClickHouse:
+    """
+    Just enough of clickhouse_connect to drive the runner; shared by all clients of a test
+
+    views maps each materialized view to the table named in its SELECT. Like
+    ClickHouse, an attached view follows its source through a RENAME and is
+    bound by name again when it is attached.
+    """
+
+    def __init__(self, partitions=(), tables=(), views=None, columns=None, counts=None):
+        self.commands = []
+        self.settings = {}
+        self.versions = []
+        self.backfills = []
+        self.partitions = list(partitions)
+        self.tables = set(tables)
+        self.views = dict(views or {})
+        self.sources = dict(self.views)
+        self.detached = set()
+        self.columns = dict(columns or {})
+        # table -> rows per partition (default 10)
+        self.counts = dict(counts or {})
+
+    def command(self, sql, settings=None):
+        sql = " ".join(sql.split())
+        self.commands.append(sql)
+        if settings:
+            self.settings[sql] = settings
+        if sql.startswith("DETACH TABLE "):
+            self.detached.add(sql.split()[-1])
+        elif sql.startswith("ATTACH TABLE "):
+            view = sql.split()[-1]
+            self.detached.discard(view)
+            self.sources[view] = self.views[view]
+        elif sql.startswith("RENAME TABLE "):
+            for pair in sql[len("RENAME TABLE "):].split(", "):
+                old, new = pair.split(" TO ")
+                for view, source in self.sources.items():
+                    if source == old and view not in self.detached:
+                        self.sources[view] = new
+
+    def query(self, sql, parameters=None):
+        if "FROM system.parts" in sql:
+            return Result([[p] for p in self.partitions])
+        if "dependencies_table" in sql:
+            return Result([[view] for view, source in self.sources.items()
+                           if source == parameters['table'] and view not in self.detached])
+        if "FROM system.columns" in sql:
+            return Result([[column] for column in self.columns.get(parameters['table'], [])])
+        if "'.inner." in sql:
+            return Result([[f".inner.{parameters['view']}"]] if parameters['view'] in self.views else [])
+        if "FROM system.tables" in sql:
+            return Result([[int(parameters['table'] in self.tables)]])
+        if f"FROM {migrate.VERSION_TABLE}" in sql:
+            return Result([[version] for version, _ in self.versions])
+        if f"FROM {migrate.BACKFILL_TABLE}" in sql:
+            return Result([[partition] for version, table, partition, _ in self.backfills
+                           if version == parameters['version'] and table == parameters['table']])
+        if "SELECT count()" in sql:
+            return Result([[self.counts.get(sql.split()[3], 10)]])
+        raise AssertionError(f"unexpected query: {sql}")
+
+    def insert(self, table, data, column_names=None):
+        {migrate.VERSION_TABLE: self.versions, migrate.BACKFILL_TABLE: self.backfills}[table].extend(
+            tuple(row) for row in data)
+
+    def close(self):
+        pass
+
+
+def write_revision(directory, revision, down_revision, body="pass"):
+    path = directory / f"{revision}_test.py"
+    path.write_text(f'"""revision {revision}"""\n'
+                    f"revision = {revision!r}\n"
+                    f"down_revision = {down_revision!r}\n\n\n"
+                    f"def upgrade(op):\n    {body}\n", encoding="utf-8")
+
+
+def test_migrations_are_ordered_by_down_revision(tmp_path):
+    write_revision(tmp_path, "0002", "0001")
+    write_revision(tmp_path, "0003", "0002")
+    write_revision(tmp_path, "0001", None)
+    assert [m.revision for m in load_migrations(tmp_path)] == ["0001", "0002", "0003"]
+    assert load_migrations(tmp_path)[0].description == "revision 0001"
+
+
+@pytest.mark.parametrize("revisions", [
+    [("0001", None), ("0002", "0001"), ("0003", "0001")],   # branch
+    [("0001", None), ("0003", "0002")],                     # gap
+])
+def test_inconsistent_history_rejected(tmp_path, revisions):
+    for revision, down_revision in revisions:
+        write_revision(tmp_path, revision, down_revision)
+    with pytest.raises(MigrationError):
+        load_migrations(tmp_path)
+
+
+def test_upgrade_applies_only_pending_revisions(tmp_path):
+    for revision, down_revision in [("0001", None), ("0002", "0001"), ("0003", "0002")]:
+        write_revision(tmp_path, revision, down_revision, body=f"op.execute('SELECT {revision}')")
+    migrations = load_migrations(tmp_path)
+    fake = FakeClickHouse()
+    fake.versions.append(("0001", "revision 0001"))
+
+    assert upgrade(lambda: fake, "0002", migrations, log=lambda *_: None) == ["0002"]
+    assert upgrade(lambda: fake, None, migrations, log=lambda *_: None) == ["0003"]
+    assert upgrade(lambda: fake, None, migrations, log=lambda *_: None) == []
+    assert [c for c in fake.commands if c.startswith("SELECT")] == ["SELECT 0002", "SELECT 0003"]
+    assert [version for version, _ in fake.versions] == ["0001", "0002", "0003"]
+
+
+def test_stamp_records_without_running(tmp_path):
+    write_revision(tmp_path, "0001", None, body="raise RuntimeError")
+    write_revision(tmp_path, "0002", "0001", body="raise RuntimeError")
+    fake = FakeClickHouse()
+    stamp(fake, "0002", load_migrations(tmp_path))
+    assert [version for version, _ in fake.versions] == ["0001", "0002"]
+    with pytest.raises(MigrationError):
+        stamp(fake, "0009", load_migrations(tmp_path))
+
+
+def test_materialize_runs_per_partition():
+    fake = FakeClickHouse(partitions=["202509", "202510"])
+    op = Operations(lambda: fake, "0005", log=lambda *_: None)
+    op.add_projection("transactions", "by_debtor", "SELECT * ORDER BY debtor_iban")
+    op.materialize_projection("transactions", "by_debtor")
+    assert fake.commands == [
+        "ALTER TABLE transactions ADD PROJECTION IF NOT EXISTS by_debtor (SELECT * ORDER BY debtor_iban)",
+        "ALTER TABLE transactions MATERIALIZE PROJECTION by_debtor IN PARTITION ID '202509'",
+        "ALTER TABLE transactions MATERIALIZE PROJECTION by_debtor IN PARTITION ID '202510'",
+    ]
+
+
+def test_rebuild_table_copies_unfinished_partitions_and_swaps():
+    fake = FakeClickHouse(partitions=["202508", "202509", "202510"],
+                          columns={"transactions": ["id", "amount", "raw_xml"],
+                                   "transactions_shadow": ["id", "kafka_offset", "amount"]})
+    fake.backfills.append(("0007", "transactions", "202508", 10))
+    op = Operations(lambda: fake, "0007", log=lambda *_: None)
+
+    op.rebuild_table("transactions", "CREATE TABLE {table} (id String) ENGINE = MergeTree() ORDER BY id",
+                     workers=2)
+
+    assert fake.commands[0] == ("CREATE TABLE IF NOT EXISTS transactions_shadow (id String) "
+                                "ENGINE = MergeTree() ORDER BY id")
+    # Only the columns both tables have, by name; kafka_offset takes its DEFAULT
+    copies = sorted(c for c in fake.commands if c.startswith("INSERT"))
+    assert copies == [
+        f"INSERT INTO transactions_shadow (id, amount) SELECT id, amount FROM transactions "
+        f"WHERE _partition_id = '{p}'"
+        for p in ("202509", "202510")
+    ]
+    assert all(fake.settings[c] == {"insert_deduplicate": 0} for c in copies)
+    assert sorted(p for _, _, p, _ in fake.backfills) == ["202508", "202509", "202510"]
+    assert "SYSTEM START MERGES transactions_shadow" in fake.commands
+    assert fake.commands[-1] == ("RENAME TABLE transactions TO transactions_before_0007, "
+                                 "transactions_shadow TO transactions")
+
+
+def test_rebuild_table_fails_on_a_short_copy():
+    fake = FakeClickHouse(partitions=["202510"], counts={"transactions": 12})
+    op = Operations(lambda: fake, "0007", log=lambda *_: None)
+
+    with pytest.raises(MigrationError, match="10 of 12 rows"):
+        op.rebuild_table("transactions", "CREATE TABLE {table}", columns=["id"])
+    assert fake.backfills == []
+    assert fake.commands[-1] == "SYSTEM START MERGES transactions_shadow"
+    assert not any(c.startswith("RENAME") for c in fake.commands)
+
+
+def test_rebuild_table_with_explicit_columns():
+    fake = FakeClickHouse(partitions=["202510"])
+    Operations(lambda: fake, "0007", log=lambda *_: None).rebuild_table(
+        "transactions", "CREATE TABLE {table}", columns=["id", "amount"])
+    assert ("INSERT INTO transactions_shadow (id, amount) SELECT id, amount FROM transactions "
+            "WHERE _partition_id = '202510'") in fake.commands
+
+
+def test_rebuild_table_keeps_materialized_views_on_the_rebuilt_table():
+    views = {"daily_transaction_summary": "transactions", "transactions_per_minute_mv": "transactions",
+             "other_mv": "dim_parties"}
+    fake = FakeClickHouse(partitions=["202510"], views=views, columns={"transactions": ["id"],
+                                                                       "transactions_shadow": ["id"]})
+    op = Operations(lambda: fake, "0007", log=lambda *_: None)
+
+    op.rebuild_table("transactions", "CREATE TABLE {table} (id String)")
+
+    assert fake.sources == views
+    assert not fake.detached
+    assert fake.commands[-5:] == [
+        "DETACH TABLE daily_transaction_summary",
+        "DETACH TABLE transactions_per_minute_mv",
+        "RENAME TABLE transactions TO transactions_before_0007, transactions_shadow TO transactions",
+        "ATTACH TABLE daily_transaction_summary",
+        "ATTACH TABLE transactions_per_minute_mv",
+    ]
+
+
+def test_swap_table_fails_when_a_view_stays_on_the_old_table():
+    class IgnoresDetach(FakeClickHouse):
+        def command(self, sql, settings=None):
+            # The view stays attached and follows the old table through the rename
+            if not sql.startswith(("DETACH", "ATTACH")):
+                super().command(sql, settings)
+
+    fake = IgnoresDetach(views={"high_value_transactions": "transactions"})
+    op = Operations(lambda: fake, "0004", log=lambda *_: None)
+    with pytest.raises(MigrationError, match="high_value_transactions"):
+        op.swap_table("transactions", "transactions_shadow")
+
+
+def test_modify_settings_targets_view_storage():
+    fake = FakeClickHouse(views={"daily_transaction_summary": "transactions"})
+    op = Operations(lambda: fake, "0004", log=lambda *_: None)
+    op.modify_settings("daily_transaction_summary", {"non_replicated_deduplication_window": 1000})
+    op.modify_settings("dim_parties", {"non_replicated_deduplication_window": 1000})
+    assert fake.commands == [
+        "ALTER TABLE `.inner.daily_transaction_summary` MODIFY SETTING non_replicated_deduplication_window = 1000",
+        "ALTER TABLE `dim_parties` MODIFY SETTING non_replicated_deduplication_window = 1000",
+    ]
+
+
+def test_rebuild_table_skips_when_already_swapped():
+    fake = FakeClickHouse(partitions=["202510"], tables={"transactions_before_0007"})
+    Operations(lambda: fake, "0007", log=lambda *_: None).rebuild_table("transactions", "CREATE TABLE {table}")
+    assert fake.commands == []
+
+
+def test_new_revision_follows_head(tmp_path):
+    write_revision(tmp_path, "0001", None)
+    path = new_revision("Add ZSTD codec to raw_messages", tmp_path)
+    assert path.name == "0002_add_zstd_codec_to_raw_messages.py"
+    assert [m.revision for m in load_migrations(tmp_path)] == ["0001", "0002"]
+
+
+def test_history_starts_at_the_baseline():
+    migrations = load_migrations()
+    assert migrations[0].down_revision is None and migrations[0].description == "baseline schema"
+    assert [m.revision for m in migrations] == [f"{i:04d}" for i in range(1, len(migrations) + 1)]
+
+
+def test_init_db_is_stamped_at_head():
+    stamped = re.findall(r"\('(\d{4})',", INIT_DB.read_text(encoding="utf-8"))
+    assert stamped == [m.revision for m in load_migrations()]
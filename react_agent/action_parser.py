@@ -0,0 +1,235 @@
+"""
+Tolerant parser for ReACT "Action:" steps
+
+Reads the first Action in an LLM response with a small scanner instead of a
+regex, so arguments may contain parentheses, newlines and quotes (XML, JSON).
+Accepted forms:
+
+    Action: tool_name(param="value", other='value', third={"json": 1})
+    Action: tool_name("positional value")
+    Action: {"tool": "tool_name", "arguments": {"param": "value"}}
+
+The scanner works on a growing prefix of the response: scan_action reports
+INCOMPLETE while the action is still being generated, which is what lets a
+streamed completion be cut the moment the action closes. Native tool calls
+returned by Ollama are rendered in the JSON form by render_tool_call.
+"""
+
+import inspect
+import json
+import re
+from typing import Any, Callable, Dict, NamedTuple, Optional, Union
+
+ACTION_MARKER = re.compile(r'^[ \t]*Action:[ \t]*', re.MULTILINE)
+TOOL_NAME = re.compile(r'(\w+)\s*\(')
+PARAM_NAME = re.compile(r'(\w+)\s*=\s*')
+NEXT_PARAM = re.compile(r',\s*\w+\s*=')
+JSON_TOOL_KEYS = ("tool", "name", "action")
+JSON_ARGUMENT_KEYS = ("arguments", "args", "parameters", "params")
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+class ParsedAction(NamedTuple):
+    tool: str
+    params: Dict[str, Any]
+    end: int  # index in the text just past the action
+    args: tuple = ()  # positional values, see bind_arguments
+
+
+INCOMPLETE = "incomplete"
+
+
+def _string_end(text: str, pos: int) -> Optional[int]:
+    """Index just past the quoted string starting at pos, or None if unterminated"""
+    quote = text[pos]
+    i = pos + 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return None
+
+
+def _closing(text: str, pos: int) -> Optional[int]:
+    """Index just past the bracket matching the one at pos, skipping quoted strings"""
+    depth = 0
+    i = pos
+    while i < len(text):
+        ch = text[i]
+        if ch in "\"'":
+            end = _string_end(text, i)
+            if end is None:
+                return None
+            i = end
+            continue
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+
+def _unquote(literal: str) -> str:
+    out = []
+    i = 1
+    while i < len(literal) - 1:
+        ch = literal[i]
+        if ch == "\\" and i + 1 < len(literal) - 1:
+            nxt = literal[i + 1]
+            out.append(ESCAPES.get(nxt, nxt))
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _unescaped_string_end(text: str, pos: int, end: int) -> Optional[int]:
+    """
+    Index just past a quoted value at pos whose body contains its own quote
+    character unescaped, e.g. xml_string="<Document xmlns="urn:...">...":
+    the closing quote is the last one before the next ", name=" or, failing
+    that, before the end of the arguments. None if there is no such quote.
+    """
+    quote = text[pos]
+    for match in NEXT_PARAM.finditer(text, pos + 1, end):
+        close = len(text[pos + 1:match.start()].rstrip()) + pos + 1
+        if close > pos + 1 and text[close - 1] == quote:
+            return close
+    close = len(text[pos + 1:end].rstrip()) + pos + 1
+    return close if close > pos + 1 and text[close - 1] == quote else None
+
+
+def _as_argument(value: Any) -> Any:
+    """Tools take JSON strings; structured literals are serialized"""
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def _parse_arguments(text: str, start: int, end: int):
+    """Split the text between a call's parentheses into (positional, named) values"""
+    positional, named = [], {}
+    i = start
+    while i < end:
+        while i < end and text[i] in " \t\r\n,":
+            i += 1
+        if i >= end:
+            break
+        name = None
+        match = PARAM_NAME.match(text, i, end)
+        if match:
+            name = match.group(1)
+            i = match.end()
+        ch = text[i] if i < end else ""
+        if ch in "\"'":
+            value_end = _string_end(text, i)
+            # A well-formed value is followed by the next argument or the end
+            if value_end is None or value_end > end or text[value_end:end].lstrip()[:1] not in ("", ","):
+                value_end = _unescaped_string_end(text, i, end)
+            if value_end is None:
+                return None
+            value = _unquote(text[i:value_end])
+        elif ch in "{[":
+            value_end = _closing(text, i)
+            if value_end is None or value_end > end:
+                return None
+            try:
+                value = _as_argument(json.loads(text[i:value_end]))
+            except ValueError:
+                value = text[i:value_end]
+        else:
+            value_end = i
+            while value_end < end and text[value_end] not in ",\n":
+                value_end += 1
+            value = text[i:value_end].strip()
+        if name is None:
+            positional.append(value)
+        else:
+            named[name] = value
+        i = value_end
+    return positional, named
+
+
+def _parse_json_action(text: str, pos: int) -> Union[ParsedAction, str, None]:
+    end = _closing(text, pos)
+    if end is None:
+        return INCOMPLETE
+    try:
+        data = json.loads(text[pos:end])
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    tool = next((data[k] for k in JSON_TOOL_KEYS if isinstance(data.get(k), str)), None)
+    arguments = next((data[k] for k in JSON_ARGUMENT_KEYS if k in data), {})
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments)
+        except ValueError:
+            return None
+    if tool is None or not isinstance(arguments, dict):
+        return None
+    return ParsedAction(tool, {k: _as_argument(v) for k, v in arguments.items()}, end)
+
+
+def scan_action(text: str) -> Union[ParsedAction, str, None]:
+    """
+    Parse the first Action in text
+
+    Returns:
+        ParsedAction, INCOMPLETE while the action is still open at the end of
+        text, or None when there is no Action or it cannot be parsed
+    """
+    marker = ACTION_MARKER.search(text)
+    if not marker:
+        return None
+    pos = marker.end()
+    rest = text[pos:]
+    if not rest.strip():
+        return INCOMPLETE
+    if rest[0] == "{":
+        return _parse_json_action(text, pos)
+    match = TOOL_NAME.match(text, pos)
+    if not match:
+        return INCOMPLETE if re.fullmatch(r'\w+\s*', rest) else None
+    open_paren = match.end() - 1
+    end = _closing(text, open_paren)
+    if end is None:
+        return INCOMPLETE
+    arguments = _parse_arguments(text, open_paren + 1, end - 1)
+    if arguments is None:
+        return None
+    positional, named = arguments
+    return ParsedAction(match.group(1), named, end, tuple(positional))
+
+
+def bind_arguments(func: Callable[..., str], action: ParsedAction) -> Optional[Dict[str, Any]]:
+    """
+    Keyword arguments for func: the named params plus positional values
+    mapped onto its parameter names, or None when there are more positional
+    values than parameters left to bind them to
+    """
+    params = dict(action.params)
+    if action.args:
+        names = [n for n in inspect.signature(func).parameters if n not in params]
+        if len(action.args) > len(names):
+            return None
+        params.update(zip(names, action.args))
+    return params
+
+
+def render_tool_call(tool_call: Dict[str, Any]) -> str:
+    """Action line, in the JSON form, for a native Ollama tool call"""
+    function = tool_call.get("function", {})
+    arguments = function.get("arguments") or {}
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments)
+        except ValueError:
+            arguments = {}
+    return "Action: " + json.dumps({"tool": function.get("name"), "arguments": arguments})
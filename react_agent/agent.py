@@ -3,11 +3,114 @@ ReACT Agent Implementation
 Uses Ollama LLM to reason and act using available tools
 """
 
+import asyncio
 import json
 import re
-from typing import Dict, List, Any, Optional
+import threading
+from typing import Dict, List, Any, Optional, Tuple
 import requests
-from agent_functions.agent_tools import TOOLS
+from action_parser import ACTION_MARKER, ParsedAction, bind_arguments, render_tool_call, scan_action
+from agent_functions.agent_tools import TOOLS, tool_schemas
+from agent_functions.object_store import XML_KIND, ObjectStore
+from agent_functions.prescreen import ESCALATED, Prescreener, describe
+from agent_functions.tool_cache import ToolCache
+
+TRANSACTION_TASK = """
+Analyze this banking transaction for fraud:
+
+{xml}
+
+Please:
+1. Parse the XML transaction to extract details
+2. Check if the debtor client exists in our database using their IBAN
+3. Check if the creditor client exists in our database using their IBAN
+4. Calculate a fraud risk score for this transaction
+5. If the score indicates 'suspicious' or 'fraud' classification, create an alert in the database
+6. Provide a summary of your findings
+"""
+
+# Replaces the XML in TRANSACTION_TASK when the agent passes handles
+TRANSACTION_XML_HANDLE = "The transaction XML is stored as {handle}; pass {handle} as xml_string to parse_transaction."
+
+MAX_ITERATIONS_REACHED = "Maximum iterations reached without a final answer."
+TOOL_FAILED = '{"error": "Tool execution failed'
+
+NEXT_STEP = re.compile(r'\n\s*(?:Observation|Thought|Action):')
+
+
+def _stream_cut(text: str) -> Optional[int]:
+    """
+    Where a streamed response can be cut, or None to keep reading
+
+    An Action is complete as soon as scan_action can parse it. After the
+    first Action (or Final Answer) anything from the next Observation /
+    Thought / Action marker on is the model running ahead of the tools.
+    """
+    action = ACTION_MARKER.search(text)
+    final = text.find("Final Answer:")
+    starts = [i for i in (action.start() if action else -1, final) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    if action and action.start() == start:
+        parsed = scan_action(text)
+        if isinstance(parsed, ParsedAction):
+            return parsed.end
+    next_step = NEXT_STEP.search(text, start + 1)
+    return next_step.start() if next_step else None
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """Message content, with native tool calls appended as (JSON) Action lines"""
+    text = message.get("content") or ""
+    for tool_call in message.get("tool_calls") or []:
+        text += ("\n" if text and not text.endswith("\n") else "") + render_tool_call(tool_call)
+    return text
+
+
+OBSERVATION_PREFIX = "Observation: "
+# Fields kept when an observation is compacted: what score_transaction reads
+# (amount; found, mean_sum, risk_score, account_status), plus the identifiers
+# later tool calls need
+CLIENT_FIELDS = ("iban", "mean_sum", "risk_score", "account_status")
+TRANSFER_FIELDS = ("debtor_iban", "creditor_iban", "amount", "currency")
+TX_FIELDS = ("handle", "msg_id") + TRANSFER_FIELDS + ("ctrl_sum_matches",)
+
+
+def compact_observation(content: str) -> str:
+    """
+    Shrink an observation message to the fields the rest of the loop uses
+
+    Client records keep CLIENT_FIELDS, parsed transactions TX_FIELDS (and
+    TRANSFER_FIELDS per credit transfer); scores, alerts, errors and non-JSON
+    observations are small already and returned unchanged.
+    """
+    try:
+        data = json.loads(content[len(OBSERVATION_PREFIX):])
+    except ValueError:
+        return content
+    if not isinstance(data, dict):
+        return content
+    if isinstance(data.get("client"), dict):
+        client = data["client"]
+        data = {**data, "client": {k: client[k] for k in CLIENT_FIELDS if k in client}}
+    elif "debtor_iban" in data or "transactions" in data:
+        compacted = {k: data[k] for k in TX_FIELDS if k in data}
+        if len(data.get("transactions") or []) > 1:
+            compacted["transactions"] = [{k: t[k] for k in TRANSFER_FIELDS if k in t}
+                                         for t in data["transactions"]]
+        data = compacted
+    else:
+        return content
+    return OBSERVATION_PREFIX + json.dumps(data)
+
+
+def _compact_previous_observation(messages: List[Dict[str, str]]):
+    """Compact the latest observation in messages, about to be superseded by a new one"""
+    for message in reversed(messages):
+        if message["role"] == "user" and message["content"].startswith(OBSERVATION_PREFIX):
+            message["content"] = compact_observation(message["content"])
+            return
 
 
 class ReACTAgent:
@@ -27,7 +130,14 @@ class ReACTAgent:
         ollama_url: str = "https://ollama.com",
         max_iterations: int = 10,
         verbose: bool = True,
-        api_key: str = ""
+        api_key: str = "",
+        prescreener: Optional[Prescreener] = None,
+        stream: bool = False,
+        keep_alive: Optional[str] = None,
+        compact: bool = True,
+        native_tools: bool = False,
+        handles: bool = True,
+        tool_cache: Optional[ToolCache] = None
     ):
         """
         Initialize the ReACT agent
@@ -38,6 +148,19 @@ class ReACTAgent:
             max_iterations: Maximum number of reasoning loops
             verbose: Whether to print detailed execution logs
             api_key: Ollama API key for cloud models (optional)
+            prescreener: Rule-engine fast path used by analyze_transaction (optional)
+            stream: Stream completions and stop reading at the first complete
+                Action line or Final Answer (see _stream_cut)
+            keep_alive: How long Ollama keeps the model (and its cached prompt
+                prefix) loaded after a request, e.g. "30m" (optional)
+            compact: Shrink observations once a newer one follows (see
+                compact_observation)
+            native_tools: Send the tool schemas in Ollama's "tools" field so the
+                model can return JSON tool calls (needs a tool-capable model)
+            handles: Keep tool results in a per-run ObjectStore and let the model
+                pass short handles (tx#1, client#1) instead of full payloads
+            tool_cache: Replay repeated tool calls from this cache instead of
+                running the tool again (optional; see TOOL_CACHE_POLICIES)
         """
         self.model = model
         self.ollama_url = ollama_url
@@ -45,9 +168,31 @@ class ReACTAgent:
         self.verbose = verbose
         self.api_key = api_key
         self.tools = TOOLS
-
-        # Build tool descriptions for the prompt
+        self.prescreener = prescreener
+        self.stream = stream
+        self.keep_alive = keep_alive
+        self.compact = compact
+        self.native_tools = native_tools
+        self.handles = handles
+        self.tool_cache = tool_cache
+        # Keep-alive connection pool reused by every _call_ollama
+        self.session = requests.Session()
+        # Streamed completions cut short before the model finished
+        self.stream_cuts = 0
+        # Totals over every LLM call (token counts as reported by Ollama)
+        self.token_usage = {"calls": 0, "prompt_chars": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        # Totals over every conversation; wasted iterations produced no usable
+        # action (unparsable, unknown tool, failed tool call) and no final answer
+        self.iteration_stats = {"conversations": 0, "iterations": 0, "wasted": 0}
+        # Guards the counters above: concurrent arun() conversations update
+        # them from the event loop and from their tool threads
+        self._stats_lock = threading.Lock()
+
+        # Build tool descriptions and the system prompt once; an identical prefix
+        # on every request lets Ollama reuse its cached prompt evaluation
         self.tool_descriptions = self._build_tool_descriptions()
+        self.system_prompt = self._build_system_prompt()
+        self.tool_schemas = tool_schemas(self.tools) if native_tools else None
 
     def _build_tool_descriptions(self) -> str:
         """Build formatted tool descriptions for the system prompt"""
@@ -59,6 +204,8 @@ parse_transaction:
   Parameters:
     - xml_string (str): The XML transaction as a string
   Returns: JSON string with transaction details (msg_id, debtor_iban, creditor_iban, amount, currency, etc.)
+           of the first credit transfer, plus a "transactions" list with every credit transfer of a
+           bulk message (nb_of_txs > 1) and "ctrl_sum_matches" (whether CtrlSum equals their total)
   Example: parse_transaction(xml_string="<Document>...</Document>")
 """)
 
@@ -96,6 +243,17 @@ create_alert:
 
     def _build_system_prompt(self) -> str:
         """Build the system prompt that instructs the LLM on ReACT format"""
+        native = ", or a native tool call" if self.native_tools else ""
+        if self.handles:
+            xml_arg, tx_arg, client_arg = "xml#1", "tx#1", "client#1"
+            tx_handle, client_handle = '"handle": "tx#1", ', '"handle": "client#1", '
+            handle_rule = """
+8. Every tool result is stored under the short handle in its "handle" field, numbered per tool
+   (tx#1, client#1, client#2, ...). Pass handles as parameter values instead of copying XML or JSON:
+   score_transaction(tx_json="tx#1", client_json="client#1")"""
+        else:
+            xml_arg, tx_arg, client_arg = "<Document>...</Document>", "{...}", "{...}"
+            tx_handle = client_handle = handle_rule = ""
         return f"""You are a fraud detection AI agent. You analyze banking transactions and create alerts for suspicious activity.
 
 You have access to these tools:
@@ -116,55 +274,78 @@ IMPORTANT RULES:
 3. Wait for "Observation:" before proceeding (the system will provide this)
 4. Use the EXACT tool names and parameter names shown above
 5. When calling actions, use this exact format: tool_name(param1="value", param2="value")
+   (or {{"tool": "tool_name", "arguments": {{"param1": "value"}}}}{native})
 6. Parameter values must be properly escaped strings
-7. When you have a final answer, use "Final Answer:" to conclude
+7. When you have a final answer, use "Final Answer:" to conclude{handle_rule}
 
 Example flow for analyzing a transaction:
 Thought: I need to first parse the XML transaction to extract details
-Action: parse_transaction(xml_string="<Document>...</Document>")
-Observation: {{"debtor_iban": "GB29...", "amount": 15000, ...}}
+Action: parse_transaction(xml_string="{xml_arg}")
+Observation: {{{tx_handle}"debtor_iban": "GB29...", "amount": 15000, ...}}
 Thought: Now I should check if the debtor client exists in our database
 Action: get_client_by_iban(iban="GB29...")
-Observation: {{"found": true, "client": {{"risk_score": 75, ...}}}}
+Observation: {{{client_handle}"found": true, "client": {{"risk_score": 75, ...}}}}
 Thought: I have the transaction and client data, let me calculate the risk score
-Action: score_transaction(tx_json="{{...}}", client_json="{{...}}")
+Action: score_transaction(tx_json="{tx_arg}", client_json="{client_arg}")
 Observation: {{"score": 85, "classification": "fraud", ...}}
 Thought: The score is 85 (fraud level), I should create an alert
-Action: create_alert(tx_json="{{...}}", client_json="{{...}}", reason="High risk score of 85")
-Observation: {{"alert_id": 123, ...}}
+Action: create_alert(tx_json="{tx_arg}", client_json="{client_arg}", reason="High risk score of 85")
+Observation: {{"alert_id": "3f2b8c1e-7a4d-4e9b-9c1a-5d6e7f8a9b0c", ...}}
 Thought: I have completed the analysis and created an alert
-Final Answer: Transaction analyzed. Fraud score: 85. Alert #123 created.
+Final Answer: Transaction analyzed. Fraud score: 85. Alert 3f2b8c1e-7a4d-4e9b-9c1a-5d6e7f8a9b0c created.
 
 Begin!"""
 
+    def _chat_request(self, messages: List[Dict[str, str]]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Endpoint, headers and body of an Ollama /api/chat request"""
+        # Prepare headers
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        # Construct proper API endpoint
+        # For Ollama Cloud: https://ollama.com/api/chat
+        # For local Ollama: http://localhost:11434/api/chat
+        api_endpoint = f"{self.ollama_url.rstrip('/')}/api/chat"
+
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": self.stream,
+            "options": {
+                "temperature": 0.1,  # Low temperature for more deterministic reasoning
+            }
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        if self.tool_schemas:
+            payload["tools"] = self.tool_schemas
+        return api_endpoint, headers, payload
+
     def _call_ollama(self, messages: List[Dict[str, str]]) -> str:
         """Call Ollama API to generate a response"""
         try:
-            # Prepare headers
-            headers = {"Content-Type": "application/json"}
-            if self.api_key:
-                headers["Authorization"] = f"Bearer {self.api_key}"
-
-            # Construct proper API endpoint
-            # For Ollama Cloud: https://ollama.com/api/chat
-            # For local Ollama: http://localhost:11434/api/chat
-            api_endpoint = f"{self.ollama_url.rstrip('/')}/api/chat"
-
-            response = requests.post(
+            api_endpoint, headers, payload = self._chat_request(messages)
+            with self.session.post(
                 api_endpoint,
                 headers=headers,
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,  # Low temperature for more deterministic reasoning
-                    }
-                },
-                timeout=60
-            )
-            response.raise_for_status()
-            return response.json()["message"]["content"]
+                json=payload,
+                timeout=60,
+                stream=self.stream
+            ) as response:
+                response.raise_for_status()
+                if not self.stream:
+                    body = response.json()
+                    self._log_usage(messages, body)
+                    return _message_text(body["message"])
+                text, last = "", None
+                for line in response.iter_lines():
+                    text, done, last = self._read_chunk(text, line, last)
+                    if done:
+                        break
+                # Leaving the block early closes the connection, which stops generation
+                self._log_usage(messages, last)
+                return text
         except requests.exceptions.HTTPError as e:
             raise RuntimeError(f"Ollama API HTTP error: {e.response.status_code} - {e.response.text}")
         except requests.exceptions.JSONDecodeError as e:
@@ -172,115 +353,333 @@ Begin!"""
         except Exception as e:
             raise RuntimeError(f"Ollama API error: {str(e)}")
 
-    def _parse_action(self, text: str) -> Optional[tuple[str, Dict[str, Any]]]:
+    async def _acall_ollama(self, session: "aiohttp.ClientSession", messages: List[Dict[str, str]]) -> str:
+        """Async _call_ollama over a shared aiohttp session (and its connection pool)"""
+        import aiohttp
+
+        try:
+            api_endpoint, headers, payload = self._chat_request(messages)
+            async with session.post(api_endpoint, headers=headers, json=payload,
+                                    timeout=aiohttp.ClientTimeout(total=60)) as response:
+                if response.status >= 400:
+                    raise RuntimeError(f"Ollama API HTTP error: {response.status} - {await response.text()}")
+                if not self.stream:
+                    body = await response.json(content_type=None)
+                    self._log_usage(messages, body)
+                    return _message_text(body["message"])
+                text, last = "", None
+                async for line in response.content:
+                    text, done, last = self._read_chunk(text, line, last)
+                    if done:
+                        break
+                self._log_usage(messages, last)
+                return text
+        except RuntimeError:
+            raise
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Ollama API returned invalid JSON: {str(e)}")
+        except Exception as e:
+            raise RuntimeError(f"Ollama API error: {str(e)}")
+
+    def _read_chunk(self, text: str, line: bytes, last: Optional[dict]) -> Tuple[str, bool, Optional[dict]]:
         """
-        Parse an action from the LLM response
+        Append one streamed NDJSON chunk to text
 
-        Expected format: tool_name(param1="value1", param2="value2")
+        Returns (text, whether to stop reading, the chunk just read)
+        """
+        if not line.strip():
+            return text, False, last
+        chunk = json.loads(line)
+        text += _message_text(chunk.get("message", {}))
+        cut = _stream_cut(text)
+        if cut is not None:
+            with self._stats_lock:
+                self.stream_cuts += 1
+            return text[:cut], True, chunk
+        return text, bool(chunk.get("done")), chunk
+
+    def _log_usage(self, messages: List[Dict[str, str]], body: Optional[dict]):
+        """
+        Record the prompt size and Ollama's token counts of one call
 
-        Returns: (tool_name, {param_dict}) or None if no valid action found
+        prompt_eval_count only covers prompt tokens Ollama had to evaluate, so
+        a reused prefix shows up as a drop. A stream cut before the final
+        chunk has no counts.
         """
-        # Look for Action: line
-        action_match = re.search(r'Action:\s*(\w+)\((.*?)\)\s*$', text, re.MULTILINE)
-        if not action_match:
-            return None
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        body = body or {}
+        prompt_tokens = body.get("prompt_eval_count") or 0
+        completion_tokens = body.get("eval_count") or 0
+        with self._stats_lock:
+            self.token_usage["calls"] += 1
+            self.token_usage["prompt_chars"] += prompt_chars
+            self.token_usage["prompt_tokens"] += prompt_tokens
+            self.token_usage["completion_tokens"] += completion_tokens
+        if self.verbose:
+            counts = (f"prompt {prompt_tokens} / completion {completion_tokens} tokens"
+                      if body.get("done") else "token counts not reported (stream cut)")
+            print(f"\nUsage: {prompt_chars} prompt chars in {len(messages)} messages; {counts}")
 
-        tool_name = action_match.group(1)
-        params_str = action_match.group(2)
+    def close(self):
+        """Close the pooled HTTP connections"""
+        self.session.close()
 
-        if tool_name not in self.tools:
-            return None
+    def _parse_action(self, text: str) -> Optional[tuple[str, Dict[str, Any]]]:
+        """
+        Parse an action from the LLM response (see action_parser)
 
-        # Parse parameters - handle both named and simple formats
-        params = {}
+        Accepted formats: tool_name(param1="value1", param2="value2") and
+        {"tool": "tool_name", "arguments": {...}}; values may contain
+        parentheses, quotes and newlines.
 
-        # Try to parse named parameters: param="value"
-        param_matches = re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', params_str)
-        if param_matches:
-            for param_name, param_value in param_matches:
-                # Unescape the value
-                param_value = param_value.replace('\\"', '"').replace('\\n', '\n')
-                params[param_name] = param_value
+        Returns: (tool_name, {param_dict}) or None if no valid action found
+        """
+        action = scan_action(text)
+        if not isinstance(action, ParsedAction) or action.tool not in self.tools:
+            return None
+        params = bind_arguments(self.tools[action.tool], action)
+        if params is None:
+            return None
+        return action.tool, params
 
-        return (tool_name, params)
+    def _execute_action(self, tool_name: str, params: Dict[str, Any], store: Optional[ObjectStore] = None,
+                        stats: Optional[Dict[str, int]] = None) -> str:
+        """
+        Execute a tool and return the result
 
-    def _execute_action(self, tool_name: str, params: Dict[str, Any]) -> str:
-        """Execute a tool and return the result"""
+        With a store, handles in params are resolved and the result recorded;
+        with a tool cache, a repeated call is answered from the cache (and
+        counted in stats).
+        """
         try:
             tool_func = self.tools[tool_name]
-            result = tool_func(**params)
-            return result
+            if store is not None:
+                params = store.resolve_params(params)
+            if self.tool_cache is None:
+                result = tool_func(**params)
+            else:
+                result = self.tool_cache.call(tool_name, tool_func, stats=stats, **params)
+            return result if store is None else store.record(tool_name, result)
         except Exception as e:
             return json.dumps({"error": f"Tool execution failed: {str(e)}"})
 
-    def run(self, task: str) -> str:
+    def _wasted(self, stats: Dict[str, int]):
+        stats["wasted"] += 1
+        with self._stats_lock:
+            self.iteration_stats["wasted"] += 1
+
+    def _start(self, task: str) -> List[Dict[str, str]]:
+        """Initial conversation: system prompt and user task"""
+        if self.verbose:
+            print(f"\n{'='*80}")
+            print(f"TASK: {task}")
+            print(f"{'='*80}\n")
+
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": task}
+        ]
+
+    def _step(self, messages: List[Dict[str, str]], response: str, stats: Dict[str, int],
+              store: Optional[ObjectStore] = None) -> Optional[str]:
+        """
+        Handle one LLM response: return the final answer, or run the action
+        and append the response and its observation to messages
+
+        Counts the iteration, and whether it was wasted, in stats.
+        """
+        stats["iterations"] += 1
+        with self._stats_lock:
+            self.iteration_stats["iterations"] += 1
+        if self.verbose:
+            print(f"\nLLM Response:\n{response}")
+
+        # Check if we have a final answer
+        if "Final Answer:" in response:
+            final_answer = response.split("Final Answer:")[-1].strip()
+            if self.verbose:
+                print(f"\n{'='*80}")
+                print(f"FINAL ANSWER: {final_answer}")
+                print(f"{'='*80}\n")
+            return final_answer
+
+        # Try to parse and execute an action
+        action_result = self._parse_action(response)
+
+        if action_result:
+            tool_name, params = action_result
+
+            if self.verbose:
+                print(f"\nExecuting: {tool_name}({params})")
+
+            # Execute the tool
+            observation = self._execute_action(tool_name, params, store, stats)
+            if observation.startswith(TOOL_FAILED):
+                self._wasted(stats)
+
+            if self.verbose:
+                print(f"Observation: {observation}")
+
+            # Add the assistant's response and the observation to messages
+            if self.compact:
+                _compact_previous_observation(messages)
+            messages.append({"role": "assistant", "content": response})
+            messages.append({"role": "user", "content": f"{OBSERVATION_PREFIX}{observation}"})
+        else:
+            # No action found, just continue the conversation
+            self._wasted(stats)
+            messages.append({"role": "assistant", "content": response})
+            messages.append({
+                "role": "user",
+                "content": "Please provide your next Thought and Action, or a Final Answer if you're done."
+            })
+        return None
+
+    def run(self, task: str, max_iterations: Optional[int] = None, stats: Optional[Dict[str, int]] = None,
+            store: Optional[ObjectStore] = None) -> str:
         """
         Run the ReACT agent on a task
 
         Args:
             task: The task description (e.g., "Analyze this transaction: <XML>...")
+            max_iterations: Iteration budget for this task (default: self.max_iterations)
+            stats: Dict filled with this conversation's "iterations" and "wasted" counts,
+                plus "cache_hits" and "cache_misses" with a tool cache (optional)
+            store: Object store already holding handles the task refers to (optional)
 
         Returns:
             The final answer from the agent
         """
-        # Initialize conversation with system prompt and user task
-        messages = [
-            {"role": "system", "content": self._build_system_prompt()},
-            {"role": "user", "content": task}
-        ]
+        messages = self._start(task)
+        stats = self._conversation_stats(stats)
+        store = self._run_store(store)
 
-        if self.verbose:
-            print(f"\n{'='*80}")
-            print(f"TASK: {task}")
-            print(f"{'='*80}\n")
-
-        for iteration in range(self.max_iterations):
+        for iteration in range(self.max_iterations if max_iterations is None else max_iterations):
             if self.verbose:
                 print(f"\n--- Iteration {iteration + 1} ---")
 
             # Get LLM response
-            response = self._call_ollama(messages)
+            final_answer = self._step(messages, self._call_ollama(messages), stats, store)
+            if final_answer is not None:
+                break
+        else:
+            final_answer = MAX_ITERATIONS_REACHED
 
-            if self.verbose:
-                print(f"\nLLM Response:\n{response}")
+        self._report_tool_cache(stats)
+        return final_answer
 
-            # Check if we have a final answer
-            if "Final Answer:" in response:
-                final_answer = response.split("Final Answer:")[-1].strip()
-                if self.verbose:
-                    print(f"\n{'='*80}")
-                    print(f"FINAL ANSWER: {final_answer}")
-                    print(f"{'='*80}\n")
-                return final_answer
+    async def arun(self, task: str, session: "aiohttp.ClientSession", max_iterations: Optional[int] = None,
+                   stats: Optional[Dict[str, int]] = None, store: Optional[ObjectStore] = None) -> str:
+        """
+        Async run(): the LLM calls go through session, tools run in a worker thread
 
-            # Try to parse and execute an action
-            action_result = self._parse_action(response)
+        Args:
+            task: The task description
+            session: Shared aiohttp session
+            max_iterations: Iteration budget for this task (default: self.max_iterations)
+            stats: Dict filled with this conversation's "iterations" and "wasted" counts,
+                plus "cache_hits" and "cache_misses" with a tool cache (optional)
+            store: Object store already holding handles the task refers to (optional)
 
-            if action_result:
-                tool_name, params = action_result
+        Returns:
+            The final answer from the agent
+        """
+        messages = self._start(task)
+        stats = self._conversation_stats(stats)
+        store = self._run_store(store)
 
+        for iteration in range(self.max_iterations if max_iterations is None else max_iterations):
+            if self.verbose:
+                print(f"\n--- Iteration {iteration + 1} ---")
+
+            response = await self._acall_ollama(session, messages)
+            final_answer = await asyncio.to_thread(self._step, messages, response, stats, store)
+            if final_answer is not None:
+                break
+        else:
+            final_answer = MAX_ITERATIONS_REACHED
+
+        self._report_tool_cache(stats)
+        return final_answer
+
+    def _conversation_stats(self, stats: Optional[Dict[str, int]]) -> Dict[str, int]:
+        with self._stats_lock:
+            self.iteration_stats["conversations"] += 1
+        stats = {} if stats is None else stats
+        stats.update(iterations=0, wasted=0)
+        if self.tool_cache is not None:
+            stats.update(cache_hits=0, cache_misses=0)
+        return stats
+
+    def _report_tool_cache(self, stats: Dict[str, int]):
+        """Print this conversation's tool cache hits and misses"""
+        if self.tool_cache is None or not self.verbose:
+            return
+        totals = self.tool_cache.stats()
+        print(f"\nTool cache: {stats['cache_hits']} hits / {stats['cache_misses']} misses this run; "
+              f"{totals['hits']} hits / {totals['misses']} misses over {self.iteration_stats['conversations']} "
+              f"runs ({totals['entries']} entries)")
+
+    def _run_store(self, store: Optional[ObjectStore]) -> Optional[ObjectStore]:
+        if store is None and self.handles:
+            return ObjectStore()
+        return store
+
+    def _transaction_task(self, xml_string: str) -> Tuple[Optional[str], Optional[str], Optional[ObjectStore]]:
+        """
+        (task for the ReACT loop, None, its object store), or (None, answer,
+        None) when the pre-screen decided
+        """
+        store = self._run_store(None)
+        if store is None:
+            task = TRANSACTION_TASK.format(xml=xml_string)
+        else:
+            task = TRANSACTION_TASK.format(xml=TRANSACTION_XML_HANDLE.format(handle=store.put(XML_KIND, xml_string)))
+        if self.prescreener is not None:
+            outcome = self.prescreener.screen(xml_string)
+            if outcome["decision"] != ESCALATED:
                 if self.verbose:
-                    print(f"\nExecuting: {tool_name}({params})")
+                    print(f"\nPre-screen decided without the LLM: {describe(outcome)}")
+                return None, describe(outcome), None
+            if self.verbose:
+                print(f"\nPre-screen escalated: {outcome['escalation_reason']}")
+            task += f"\nThe rule-based pre-screen escalated this transaction: {outcome['escalation_reason']}\n"
+        return task, None, store
 
-                # Execute the tool
-                observation = self._execute_action(tool_name, params)
+    def analyze_transaction(self, xml_string: str, max_iterations: Optional[int] = None,
+                            stats: Optional[Dict[str, int]] = None) -> str:
+        """
+        Analyze a pain.001 transaction, calling the LLM only when needed
 
-                if self.verbose:
-                    print(f"Observation: {observation}")
+        With a prescreener, clear-cut transactions are decided by the rules
+        alone; only escalated ones go through the ReACT loop.
 
-                # Add the assistant's response and the observation to messages
-                messages.append({"role": "assistant", "content": response})
-                messages.append({"role": "user", "content": f"Observation: {observation}"})
-            else:
-                # No action found, just continue the conversation
-                messages.append({"role": "assistant", "content": response})
-                messages.append({
-                    "role": "user",
-                    "content": "Please provide your next Thought and Action, or a Final Answer if you're done."
-                })
-
-        # Max iterations reached
-        return "Maximum iterations reached without a final answer."
+        Args:
+            xml_string: The transaction XML
+            max_iterations: Iteration budget for the ReACT loop (default: self.max_iterations)
+            stats: Filled by run() when the ReACT loop is used (optional)
+
+        Returns:
+            The final answer
+        """
+        task, answer, store = self._transaction_task(xml_string)
+        if task is None:
+            return answer
+        return self.run(task, max_iterations, stats, store)
+
+    async def aanalyze_transaction(self, xml_string: str, session: "aiohttp.ClientSession",
+                                   max_iterations: Optional[int] = None,
+                                   stats: Optional[Dict[str, int]] = None) -> str:
+        """
+        Async analyze_transaction over a shared aiohttp session
+
+        The pre-screen runs parsing, database lookups and possibly an alert
+        insert, so it goes to a worker thread instead of blocking the loop.
+        """
+        task, answer, store = await asyncio.to_thread(self._transaction_task, xml_string)
+        if task is None:
+            return answer
+        return await self.arun(task, session, max_iterations, stats, store)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,5 @@
+import inspect
+
 from agent_functions.create_alert import create_alert
 from agent_functions.get_client_by_iban import get_client_by_iban
 from agent_functions.parse_transaction import parse_transaction
@@ -10,7 +12,62 @@ TOOLS = {
     "create_alert": create_alert
 }
 
-def run_tool(tool_name, *args, **kwargs):
+# Descriptions for the native tool-calling schemas (see tool_schemas)
+TOOL_DESCRIPTIONS = {
+    "get_client_by_iban": ("Retrieve client information from the database by IBAN",
+                           {"iban": "The IBAN to look up"}),
+    "parse_transaction": ("Parse an ISO 20022 pain.001 XML transaction and extract key fields",
+                          {"xml_string": "The XML transaction as a string, or its handle (e.g. xml#1)"}),
+    "score_transaction": ("Calculate a fraud risk score (0-100, ok/suspicious/fraud) for a transaction",
+                          {"tx_json": "JSON string from parse_transaction, or its handle (e.g. tx#1)",
+                           "client_json": "JSON string from get_client_by_iban, or its handle (e.g. client#1)"}),
+    "create_alert": ("Create a fraud alert in the database for a suspicious transaction",
+                     {"tx_json": "JSON string with the transaction summary, or its handle",
+                      "client_json": "JSON string with the client summary, or its handle",
+                      "reason": "Human-readable reason for the alert"}),
+}
+
+
+def tool_schemas(tools=None):
+    """
+    Ollama / OpenAI-style function schemas for the tool registry
+
+    Parameters come from each function's signature: every parameter is a
+    string, and the ones without a default are required.
+    """
+    schemas = []
+    for name, func in (tools or TOOLS).items():
+        description, param_descriptions = TOOL_DESCRIPTIONS.get(name, (inspect.getdoc(func) or name, {}))
+        properties, required = {}, []
+        for param in inspect.signature(func).parameters.values():
+            properties[param.name] = {"type": "string", "description": param_descriptions.get(param.name, param.name)}
+            if param.default is inspect.Parameter.empty:
+                required.append(param.name)
+        schemas.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        })
+    return schemas
+
+
+def run_tool(tool_name, *args, store=None, cache=None, **kwargs):
+    """
+    Run a tool by name; with an ObjectStore, handle arguments (tx#1, client#1)
+    are resolved first and the result is recorded under a new handle. With a
+    ToolCache, a repeated call (same resolved arguments) returns the cached
+    result instead of running the tool again.
+    """
     if tool_name not in TOOLS:
         raise ValueError(f"Tool {tool_name} not found")
-    return TOOLS[tool_name](*args, **kwargs)
\ No newline at end of file
+    if store is not None:
+        args = [store.resolve(value) for value in args]
+        kwargs = store.resolve_params(kwargs)
+    if cache is None:
+        result = TOOLS[tool_name](*args, **kwargs)
+    else:
+        result = cache.call(tool_name, TOOLS[tool_name], *args, **kwargs)
+    return result if store is None else store.record(tool_name, result)
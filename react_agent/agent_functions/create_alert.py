@@ -1,30 +1,261 @@
+import atexit
 import json
+import os
+import threading
+import time
+import uuid
 from datetime import datetime
+from sqlalchemy import select # type: ignore
+from sqlalchemy.exc import OperationalError # type: ignore
 from sqlalchemy.orm import Session # type: ignore
 from db.models import Alert
 from db.db import engine
 
+
+class AlertWriter:
+    """
+    Buffered, background sink for alerts
+
+    submit() queues an alert row and returns at once; a daemon thread writes
+    the queue with one multi-row INSERT when batch_size rows are pending or
+    flush_interval seconds have passed. With spool_path set, every row is
+    appended to a JSONL spool before it is queued and after each flush the
+    spool is rewritten with only the rows still queued, so recover() can
+    re-queue alerts a crashed process never wrote. Rows carry a
+    client-generated alert_uid, which recover() uses to skip rows that did
+    reach the table.
+
+    A failed INSERT keeps its rows queued and the thread backs off
+    exponentially (retry_delay doubling up to max_retry_delay) before the
+    next attempt. When the database rejects the batch rather than being
+    unreachable, the rows are retried one by one so a bad row does not hold
+    back the others, and a row rejected max_attempts times is moved to the
+    dead_letter_path JSONL file (or kept queued when that is not set).
+    """
+
+    def __init__(self, engine=None, batch_size=100, flush_interval=1.0, spool_path=None, background=True,
+                 retry_delay=0.5, max_retry_delay=60.0, max_attempts=5, dead_letter_path=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.background = background
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self._pending = []
+        self._in_flight = 0
+        self._attempts = {}
+        self._failures = 0
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._spool = None
+        self._thread = None
+        self._closed = False
+        self.submitted = self.written = self.batches = self.failed_flushes = self.dead_lettered = 0
+        self.last_error = None
+
+    def _engine(self):
+        # Resolved per flush so a swapped module-level engine is honoured
+        return self.engine or engine
+
+    def _spool_file(self):
+        if self._spool is None:
+            self._spool = open(self.spool_path, "a", encoding="utf-8")
+        return self._spool
+
+    def submit(self, row: dict):
+        with self._cond:
+            if self.spool_path:
+                spool = self._spool_file()
+                spool.write(_spool_line(row))
+                spool.flush()
+            self._pending.append(row)
+            self.submitted += 1
+            if self.background and self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="alert-writer", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed:
+                    now = time.monotonic()
+                    if now < self._retry_at:
+                        # Backing off after a failed flush, however many rows are queued
+                        wait_until = self._retry_at
+                    elif len(self._pending) >= self.batch_size or now >= deadline:
+                        break
+                    else:
+                        wait_until = deadline
+                    self._cond.wait(wait_until - now)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _insert(self, rows):
+        """INSERT rows; returns (row, error) for every row that was not written"""
+        try:
+            with self._engine().begin() as conn:
+                conn.execute(Alert.__table__.insert(), rows)
+            return []
+        except OperationalError as e:
+            # Database unreachable: the whole batch waits for the next attempt
+            return [(row, e) for row in rows]
+        except Exception as e:
+            if len(rows) == 1:
+                return [(rows[0], e)]
+        failed = []
+        for row in rows:
+            failed += self._insert([row])
+        return failed
+
+    def flush(self) -> int:
+        """Write every queued alert now; returns the number of rows written"""
+        with self._write_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._in_flight = len(batch)
+            if not batch:
+                return 0
+            failed = self._insert(batch)
+
+            dead = []
+            retry = []
+            for row, error in failed:
+                uid = row["alert_uid"]
+                if not isinstance(error, OperationalError):
+                    self._attempts[uid] = self._attempts.get(uid, 0) + 1
+                if self.dead_letter_path and self._attempts.get(uid, 0) >= self.max_attempts:
+                    dead.append(_spool_line(row, error=str(error), attempts=self._attempts.pop(uid)))
+                else:
+                    retry.append(row)
+            if dead:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.writelines(dead)
+
+            written = len(batch) - len(failed)
+            with self._cond:
+                self._pending[:0] = retry
+                self._in_flight = 0
+                self.written += written
+                self.dead_lettered += len(dead)
+                if failed:
+                    self.failed_flushes += 1
+                    self.last_error = str(failed[-1][1])
+                    self._failures += 1
+                    delay = min(self.max_retry_delay, self.retry_delay * 2 ** (self._failures - 1))
+                    self._retry_at = time.monotonic() + delay
+                else:
+                    self._failures = 0
+                    self._retry_at = 0.0
+                if written:
+                    self.batches += 1
+                    if self._attempts:
+                        failed_uids = {row["alert_uid"] for row, _ in failed}
+                        for row in batch:
+                            if row["alert_uid"] not in failed_uids:
+                                self._attempts.pop(row["alert_uid"], None)
+                if self._spool is not None and (written or dead):
+                    self._rewrite_spool()
+            return written
+
+    def _rewrite_spool(self):
+        """Reduce the spool to the rows still queued (called with _cond held)"""
+        if not self._pending:
+            self._spool.truncate(0)
+            return
+        self._spool.close()
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(_spool_line(row) for row in self._pending)
+        os.replace(tmp_path, self.spool_path)
+        self._spool = open(self.spool_path, "a", encoding="utf-8")
+
+    def recover(self) -> int:
+        """Re-queue spooled alerts that are not in the database yet"""
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return 0
+        with open(self.spool_path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        if not rows:
+            return 0
+        with Session(self._engine()) as session:
+            stored = set(session.execute(
+                select(Alert.alert_uid).where(Alert.alert_uid.in_([r["alert_uid"] for r in rows]))).scalars())
+        missing = [{**r, "created_at": datetime.fromisoformat(r["created_at"])}
+                   for r in rows if r["alert_uid"] not in stored]
+        with self._cond:
+            # Rewrite the spool with only the rows still to be written
+            self._spool_file().truncate(0)
+        for row in missing:
+            self.submit(row)
+        return len(missing)
+
+    def close(self):
+        """Stop the background thread and write whatever is still queued"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def stats(self):
+        return {
+            "queued": len(self._pending) + self._in_flight,
+            "submitted": self.submitted,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+            "last_error": self.last_error,
+        }
+
+
+def _spool_line(row: dict, **extra) -> str:
+    """One JSONL line for the spool or the dead-letter file"""
+    return json.dumps({**row, "created_at": row["created_at"].isoformat(), **extra}) + "\n"
+
+
+alert_writer = AlertWriter(
+    batch_size=int(os.environ.get("ALERT_BATCH_SIZE", "100")),
+    flush_interval=float(os.environ.get("ALERT_FLUSH_INTERVAL", "1.0")),
+    spool_path=os.environ.get("ALERT_SPOOL") or None,
+    max_attempts=int(os.environ.get("ALERT_MAX_ATTEMPTS", "5")),
+    dead_letter_path=os.environ.get("ALERT_DEAD_LETTER") or None,
+)
+atexit.register(alert_writer.close)
+
+
 def create_alert(tx_json: str, client_json: str, reason: str) -> str:
     try:
         created_at = datetime.utcnow()
+        alert_uid = str(uuid.uuid4())
 
-        alert = Alert(
-            created_at=created_at,
-            tx_summary=json.loads(tx_json),
-            client_summary=json.loads(client_json) if client_json else {},
-            reason=reason
-        )
-
-        with Session(engine) as session:
-            session.add(alert)
-            session.commit()
-            session.refresh(alert)
+        alert_writer.submit({
+            "alert_uid": alert_uid,
+            "created_at": created_at,
+            "tx_summary": json.loads(tx_json),
+            "client_summary": json.loads(client_json) if client_json else {},
+            "reason": reason
+        })
 
         return json.dumps({
-            "alert_id": alert.id,
+            "alert_id": alert_uid,
             "created_at": created_at.isoformat() + "Z",
             "reason": reason
         })
 
     except Exception as e:
-        return json.dumps({"error": f"create_alert failed: {str(e)}"})
\ No newline at end of file
+        return json.dumps({"error": f"create_alert failed: {str(e)}"})
@@ -1,27 +1,200 @@
 from db.db import SessionLocal, engine
 from db.models import Party
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+
+class PartyCache:
+    """
+    Process-wide LRU cache of get_client_by_iban results
+
+    Entries are the serialized JSON results (not-found results included), so
+    a hit returns without touching the database or re-serializing. Entries
+    expire after ttl_seconds; the least recently used entry is evicted once
+    max_size is reached. warm() loads the parties table with one SELECT and
+    refresh() then re-reads only rows whose updated_at moved past the last
+    refresh, every refresh_interval seconds, in a background thread started
+    by maybe_refresh() so lookups never wait for it. Each entry keeps the
+    updated_at of its row and put() does not replace it with an older row,
+    so a lookup that read the database before a refresh cannot undo it.
+    Deleted parties are only dropped by the TTL.
+    """
+
+    def __init__(self, max_size=100_000, ttl_seconds=300.0, refresh_interval=60.0,
+                 session_factory=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.refresh_interval = refresh_interval
+        self.session_factory = session_factory
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.watermark = None
+        self.next_refresh = None
+        self._refresh_thread = None
+        self.hits = self.misses = self.expired = self.evictions = 0
+        self.refreshes = self.refreshed_rows = self.refresh_errors = 0
+        self.stale_puts = 0
+
+    def _session(self) -> Session:
+        # Resolved per call so a swapped module-level SessionLocal is honoured
+        return (self.session_factory or SessionLocal)()
+
+    def get(self, iban):
+        """Cached result JSON for iban, or None"""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(iban)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[iban]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(iban)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, iban, result, updated_at=None):
+        """Cache result for iban unless the cached entry comes from a newer row"""
+        if self.max_size <= 0:
+            return
+        expires_at = self.clock() + self.ttl_seconds
+        with self._lock:
+            entry = self._entries.get(iban)
+            if entry is not None and entry[2] is not None and (updated_at is None or updated_at < entry[2]):
+                self.stale_puts += 1
+                return
+            self._entries[iban] = (expires_at, result, updated_at)
+            self._entries.move_to_end(iban)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.watermark = self.next_refresh = None
+
+    def _load(self, query):
+        """Cache every party row returned by query; returns (rows, latest updated_at)"""
+        count, latest = 0, None
+        with self._session() as session:
+            for row in session.execute(query).mappings():
+                self.put(row["iban"], _client_result(row), row["updated_at"])
+                count += 1
+                if row["updated_at"] is not None and (latest is None or row["updated_at"] > latest):
+                    latest = row["updated_at"]
+        return count, latest
+
+    def warm(self) -> int:
+        """Load up to max_size parties with one SELECT, most recently updated first"""
+        if self.max_size <= 0:
+            return 0
+        table = Party.__table__
+        count, self.watermark = self._load(
+            select(table).order_by(table.c.updated_at.desc()).limit(self.max_size))
+        self.next_refresh = self.clock() + self.refresh_interval
+        return count
+
+    def refresh(self) -> int:
+        """Re-read parties updated since the last warm / refresh"""
+        self.next_refresh = self.clock() + self.refresh_interval
+        if self.watermark is None:
+            return 0
+        table = Party.__table__
+        try:
+            # >= so rows committed within the watermark's timestamp are not missed
+            count, latest = self._load(select(table).where(table.c.updated_at >= self.watermark))
+        except Exception:
+            # Keep serving the TTL-bounded entries until the next attempt
+            self.refresh_errors += 1
+            return 0
+        if latest is not None:
+            self.watermark = latest
+        self.refreshes += 1
+        self.refreshed_rows += count
+        return count
+
+    def maybe_refresh(self):
+        """
+        Start refresh() in a background thread once it is due
+
+        Returns the thread, or None when no refresh is due or one is still
+        running.
+        """
+        with self._lock:
+            if self.next_refresh is None or self.clock() < self.next_refresh:
+                return None
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return None
+            # Not due again until this refresh sets the next deadline
+            self.next_refresh = None
+            self._refresh_thread = threading.Thread(target=self.refresh, name="party-cache-refresh",
+                                                    daemon=True)
+        self._refresh_thread.start()
+        return self._refresh_thread
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "refreshed_rows": self.refreshed_rows,
+            "refresh_errors": self.refresh_errors,
+            "stale_puts": self.stale_puts,
+        }
+
+
+party_cache = PartyCache(
+    max_size=int(os.environ.get("PARTY_CACHE_SIZE", "100000")),
+    ttl_seconds=float(os.environ.get("PARTY_CACHE_TTL", "300")),
+    refresh_interval=float(os.environ.get("PARTY_CACHE_REFRESH", "60")),
+)
+
+
+def _client_result(row) -> str:
+    client_obj = {}
+    for name, val in row.items():
+        if hasattr(val, "isoformat"):
+            val = val.isoformat()
+        client_obj[name] = float(val) if hasattr(val, "quantize") else val
+    return json.dumps({"found": True, "client": client_obj})
+
+
 def get_client_by_iban(iban: str) -> str:
     if not iban:
         return json.dumps({"found": False, "error": "no iban provided"})
+    party_cache.maybe_refresh()
+    cached = party_cache.get(iban)
+    if cached is not None:
+        return cached
+
     session: Session = SessionLocal()
     try:
-        party: Party | None = session.query(Party).filter(Party.iban == iban).one_or_none()
-        if not party:
-            return json.dumps({"found": False})
-        client_obj = {}
-        for col in Party.__table__.columns:
-            val = getattr(party, col.name)
-            if hasattr(val, "isoformat"):
-                val = val.isoformat()
-            client_obj[col.name] = float(val) if hasattr(val, "quantize") else val
-        return json.dumps({"found": True, "client": client_obj})
+        row = session.execute(select(Party.__table__).where(Party.iban == iban)).mappings().one_or_none()
+        if row is None:
+            result, updated_at = json.dumps({"found": False}), None
+        else:
+            result, updated_at = _client_result(row), row["updated_at"]
+        party_cache.put(iban, result, updated_at)
+        return result
     except Exception as e:
         return json.dumps({"found": False, "error": f"db error: {str(e)}"})
     finally:
         session.close()
 
 if __name__ == "__main__":
-    print(get_client_by_iban("NO9386011117947"))
\ No newline at end of file
+    print(get_client_by_iban("NO9386011117947"))
@@ -0,0 +1,76 @@
+"""
+Per-run object store for agent tool results
+
+Tool results are kept under short handles (tx#1, client#1, ...) so the LLM can
+pass "tx#1" to the next tool instead of re-emitting the whole JSON or XML.
+Tools accept either a handle or a literal value for every parameter; handles
+are swapped for the stored value before the tool runs. Each kind is numbered
+on its own: the first lookup of a run is client#1, the second client#2.
+"""
+
+import json
+import re
+from typing import Any, Dict
+
+# Handle prefix for each tool's results
+TOOL_HANDLE_KINDS = {
+    "parse_transaction": "tx",
+    "get_client_by_iban": "client",
+    "score_transaction": "score",
+    "create_alert": "alert",
+}
+# The transaction XML given to the agent is stored as xml#N
+XML_KIND = "xml"
+
+HANDLE = re.compile(r'^(?:%s)#\d+$' % "|".join([XML_KIND, *TOOL_HANDLE_KINDS.values()]))
+
+
+class ObjectStore:
+    """Handles to values for one agent run; each kind is numbered from 1"""
+
+    def __init__(self):
+        self._objects: Dict[str, Any] = {}
+        self._counts: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, handle):
+        return handle in self._objects
+
+    def put(self, kind: str, value: Any) -> str:
+        self._counts[kind] = self._counts.get(kind, 0) + 1
+        handle = f"{kind}#{self._counts[kind]}"
+        self._objects[handle] = value
+        return handle
+
+    def get(self, handle: str) -> Any:
+        return self._objects[handle]
+
+    def resolve(self, value: Any) -> Any:
+        """The stored value when value is a handle, value itself otherwise"""
+        if not isinstance(value, str) or not HANDLE.match(value.strip()):
+            return value
+        handle = value.strip()
+        if handle not in self._objects:
+            raise KeyError(f"unknown handle {handle}")
+        return self._objects[handle]
+
+    def resolve_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {name: self.resolve(value) for name, value in params.items()}
+
+    def record(self, tool_name: str, result: str) -> str:
+        """
+        Store a tool's JSON result and return it with its "handle" added
+
+        Errors, non-object results and tools without a handle kind are
+        returned unchanged.
+        """
+        kind = TOOL_HANDLE_KINDS.get(tool_name)
+        try:
+            data = json.loads(result)
+        except (TypeError, ValueError):
+            return result
+        if kind is None or not isinstance(data, dict) or "error" in data:
+            return result
+        return json.dumps({"handle": self.put(kind, result), **data})
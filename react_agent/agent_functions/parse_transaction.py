@@ -1,5 +1,6 @@
 from lxml import etree # type: ignore
 import json
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
 
 def parse_transaction(xml_string: str) -> str:
@@ -36,6 +37,34 @@ def parse_transaction(xml_string: str) -> str:
     else:
         currency = None
 
+    # Every credit transfer of a bulk message (NbOfTxs > 1), one entry each
+    transactions = []
+    for pmt_inf in root.iterfind('.//ns:PmtInf', namespaces=ns):
+        pmt = {
+            "pmt_inf_id": pmt_inf.findtext('ns:PmtInfId', namespaces=ns),
+            "debtor_name": pmt_inf.findtext('ns:Dbtr/ns:Nm', namespaces=ns),
+            "debtor_iban": pmt_inf.findtext('ns:DbtrAcct/ns:Id/ns:IBAN', namespaces=ns),
+        }
+        for cdt_trf in pmt_inf.iterfind('ns:CdtTrfTxInf', namespaces=ns):
+            tx_amt_el = cdt_trf.find('.//ns:InstdAmt', namespaces=ns)
+            tx_amt = tx_amt_el.text if tx_amt_el is not None else None
+            transactions.append({
+                **pmt,
+                "creditor_name": cdt_trf.findtext('ns:Cdtr/ns:Nm', namespaces=ns),
+                "creditor_iban": cdt_trf.findtext('ns:CdtrAcct/ns:Id/ns:IBAN', namespaces=ns),
+                "end_to_end_id": cdt_trf.findtext('ns:PmtId/ns:EndToEndId', namespaces=ns),
+                "amount": float(tx_amt) if tx_amt else None,
+                "currency": tx_amt_el.get("Ccy") if tx_amt_el is not None else None
+            })
+
+    ctrl_sum_matches = None
+    if ctrl_sum:
+        try:
+            total = sum(Decimal(str(tx["amount"] or 0)) for tx in transactions)
+            ctrl_sum_matches = Decimal(ctrl_sum) == total
+        except InvalidOperation:
+            ctrl_sum_matches = False
+
     summary = {
         "msg_id": msg_id,
         "created_at": cre_dt_tm,
@@ -49,7 +78,9 @@ def parse_transaction(xml_string: str) -> str:
         "creditor_iban": cdtr_iban,
         "end_to_end_id": end_to_end_id,
         "amount": float(amt) if amt else None,
-        "currency": currency
+        "currency": currency,
+        "transactions": transactions,
+        "ctrl_sum_matches": ctrl_sum_matches
     }
     return json.dumps(summary)
 
@@ -0,0 +1,131 @@
+"""
+Deterministic pre-screening in front of the ReACT agent
+
+Runs parse_transaction -> get_client_by_iban -> score_transaction directly in
+Python and decides clear-cut transactions without calling the LLM. Every credit
+transfer is scored against both its debtor and its creditor profile:
+
+- all scores "ok"     -> cleared, nothing to do
+- all scores "fraud"  -> alert created directly with create_alert
+- anything else       -> escalated to the ReACT loop: the suspicious band, debtor
+                         and creditor rules disagreeing, parse or lookup errors,
+                         or a CtrlSum that does not match the credit transfers
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from agent_functions.agent_tools import TOOLS
+
+CLEARED = "cleared"
+ALERTED = "alerted"
+ESCALATED = "escalated"
+
+
+class Prescreener:
+    """Rule-engine fast path; keeps counts of how traffic was decided (thread-safe)"""
+
+    def __init__(self, tools: Optional[Dict[str, Callable[..., str]]] = None):
+        """
+        Args:
+            tools: Tool functions by name (default: agent_functions TOOLS)
+        """
+        self.tools = tools or TOOLS
+        self.stats = {CLEARED: 0, ALERTED: 0, ESCALATED: 0}
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def screened(self) -> int:
+        return sum(self.stats.values())
+
+    @property
+    def skip_ratio(self) -> float:
+        """Fraction of screened transactions decided without the LLM"""
+        if not self.screened:
+            return 0.0
+        return (self.stats[CLEARED] + self.stats[ALERTED]) / self.screened
+
+    def screen(self, xml_string: str) -> Dict[str, Any]:
+        """
+        Screen one pain.001 message
+
+        Returns:
+            Dict with "decision" (cleared / alerted / escalated), the worst
+            "score" and "classification", "reasons", "escalation_reason",
+            the parsed "tx", the looked-up "clients" by IBAN and the "alert"
+            created for clear fraud
+        """
+        start = time.perf_counter()
+        outcome = self._screen(xml_string)
+        with self._lock:
+            self.seconds += time.perf_counter() - start
+            self.stats[outcome["decision"]] += 1
+        return outcome
+
+    def _screen(self, xml_string: str) -> Dict[str, Any]:
+        tx = json.loads(self.tools["parse_transaction"](xml_string))
+        outcome = {"decision": ESCALATED, "score": None, "classification": None, "reasons": [],
+                   "escalation_reason": None, "tx": tx, "clients": {}, "alert": None}
+        if "error" in tx:
+            outcome["escalation_reason"] = tx["error"]
+            return outcome
+        if tx.get("ctrl_sum_matches") is False:
+            outcome["escalation_reason"] = "CtrlSum does not match the credit transfers"
+            return outcome
+
+        clients = outcome["clients"]
+        scores = []
+        for transfer in tx.get("transactions") or [tx]:
+            transfer_json = json.dumps(transfer)
+            for role in ("debtor", "creditor"):
+                iban = transfer.get(f"{role}_iban")
+                if iban not in clients:
+                    clients[iban] = self.tools["get_client_by_iban"](iban)
+                if "error" in json.loads(clients[iban]):
+                    outcome["escalation_reason"] = f"{role} lookup failed for {iban}"
+                    return outcome
+                score = json.loads(self.tools["score_transaction"](transfer_json, clients[iban]))
+                scores.append((score, transfer))
+
+        worst, worst_transfer = max(scores, key=lambda item: item[0]["score"])
+        outcome["score"] = worst["score"]
+        outcome["classification"] = worst["classification"]
+        outcome["reasons"] = worst["reasons"]
+
+        classifications = {score["classification"] for score, _ in scores}
+        if classifications == {"ok"}:
+            outcome["decision"] = CLEARED
+        elif classifications == {"fraud"}:
+            reason = f"Pre-screen fraud score {worst['score']:.0f}: " + "; ".join(worst["reasons"])
+            outcome["alert"] = json.loads(self.tools["create_alert"](
+                json.dumps(tx), clients[worst_transfer.get("debtor_iban")], reason))
+            if "error" in outcome["alert"]:
+                outcome["escalation_reason"] = outcome["alert"]["error"]
+            else:
+                outcome["decision"] = ALERTED
+        elif "suspicious" in classifications:
+            outcome["escalation_reason"] = f"suspicious band (score {worst['score']:.0f})"
+        else:
+            outcome["escalation_reason"] = "debtor and creditor rules disagree"
+        return outcome
+
+    def report(self) -> str:
+        """One-line summary of how the screened traffic was decided"""
+        skipped = self.stats[CLEARED] + self.stats[ALERTED]
+        average_us = self.seconds / self.screened * 1e6 if self.screened else 0.0
+        return (f"Pre-screen: {skipped}/{self.screened} transactions ({self.skip_ratio:.1%}) "
+                f"decided without the LLM (cleared {self.stats[CLEARED]}, alerted {self.stats[ALERTED]}, "
+                f"escalated {self.stats[ESCALATED]}); {average_us:.0f} µs per transaction")
+
+
+def describe(outcome: Dict[str, Any]) -> str:
+    """Final answer text for a transaction decided by the pre-screen"""
+    tx = outcome["tx"]
+    text = (f"Transaction {tx.get('msg_id')} pre-screened as {outcome['classification']} "
+            f"(score {outcome['score']:.0f}).")
+    if outcome["decision"] == ALERTED:
+        text += f" Alert #{outcome['alert'].get('alert_id')} created."
+    return text
@@ -0,0 +1,113 @@
+import json
+from pathlib import Path
+
+from action_parser import INCOMPLETE, ParsedAction, bind_arguments, render_tool_call, scan_action
+from agent import ReACTAgent, _message_text
+from agent_functions.agent_tools import TOOLS, tool_schemas
+
+XML = (Path(__file__).parent / "tests_data" / "transaction_example.xml").read_text(encoding="utf-8")
+
+
+def test_arguments_with_parentheses_newlines_and_quotes():
+    xml = '<Document>\n  <Nm>Acme (Holdings) "Ltd"</Nm>\n</Document>'
+    escaped = xml.replace('"', '\\"')
+    text = f'Thought: parse\nAction: parse_transaction(xml_string="{escaped}")\nObservation: made up'
+
+    action = scan_action(text)
+
+    assert action.tool == "parse_transaction"
+    assert action.params == {"xml_string": xml}
+    assert text[action.end:] == "\nObservation: made up"
+
+
+def test_multiline_real_transaction_round_trips():
+    text = f"Action: parse_transaction(xml_string='{XML}')"
+    assert scan_action(text).params["xml_string"] == XML
+
+
+def test_unescaped_double_quotes_in_real_transaction():
+    # Models usually paste pain.001 as is, xmlns="..." quotes and all
+    text = f'Thought: parse\nAction: parse_transaction(xml_string="{XML}")\nObservation: made up'
+    action = scan_action(text)
+    assert action.params == {"xml_string": XML}
+    assert text[action.end:] == "\nObservation: made up"
+
+    action = scan_action(f'Action: score_transaction(tx_json="{XML}", client_json="{{}}")')
+    assert action.params["tx_json"] == XML
+
+    action = scan_action(f'Action: parse_transaction("{XML}")')
+    assert bind_arguments(TOOLS["parse_transaction"], action) == {"xml_string": XML}
+
+
+def test_json_action_and_json_literal_arguments():
+    action = scan_action('Action: {"tool": "score_transaction", "arguments": {"tx_json": {"amount": 5}}}')
+    assert action == ParsedAction("score_transaction", {"tx_json": '{"amount": 5}'}, action.end)
+
+    action = scan_action('Action: score_transaction(tx_json={"amount": 5, "note": "a)b"}, client_json="{}")')
+    assert json.loads(action.params["tx_json"]) == {"amount": 5, "note": "a)b"}
+    assert action.params["client_json"] == "{}"
+
+
+def test_positional_arguments_are_bound_to_parameter_names():
+    action = scan_action('Action: get_client_by_iban("NO9386011117947")')
+    assert bind_arguments(TOOLS["get_client_by_iban"], action) == {"iban": "NO9386011117947"}
+
+    action = scan_action('Action: score_transaction("{}", client_json="{\\"found\\": false}")')
+    assert bind_arguments(TOOLS["score_transaction"], action) == {"tx_json": "{}", "client_json": '{"found": false}'}
+
+    # A value left over is not silently dropped
+    action = scan_action('Action: get_client_by_iban("NO9386011117947", "PT50000201231234567890154")')
+    assert bind_arguments(TOOLS["get_client_by_iban"], action) is None
+
+
+def test_incomplete_and_invalid_actions():
+    assert scan_action("Thought: nothing to do") is None
+    assert scan_action("Action: ") == INCOMPLETE
+    assert scan_action("Action: get_client") == INCOMPLETE
+    assert scan_action('Action: get_client_by_iban(iban="NO93') == INCOMPLETE
+    assert scan_action('Action: {"tool": "get_client_by_iban", "arguments": {') == INCOMPLETE
+    assert scan_action("Action: I will look up the client now.") is None
+    assert scan_action('Action: {"arguments": {}}') is None
+
+
+def test_native_tool_calls_are_rendered_as_actions():
+    message = {"content": "Thought: lookup", "tool_calls": [
+        {"function": {"name": "get_client_by_iban", "arguments": {"iban": "NO9386011117947"}}}]}
+
+    text = _message_text(message)
+
+    assert text == 'Thought: lookup\nAction: {"tool": "get_client_by_iban", "arguments": {"iban": "NO9386011117947"}}'
+    assert scan_action(text).params == {"iban": "NO9386011117947"}
+    assert render_tool_call({"function": {"name": "x", "arguments": '{"a": "1"}'}}) == \
+        'Action: {"tool": "x", "arguments": {"a": "1"}}'
+
+
+def test_tool_schemas_follow_signatures():
+    schemas = {s["function"]["name"]: s["function"] for s in tool_schemas()}
+
+    assert set(schemas) == set(TOOLS)
+    score = schemas["score_transaction"]["parameters"]
+    assert set(score["properties"]) == {"tx_json", "client_json"}
+    assert score["required"] == ["tx_json"]
+    assert schemas["create_alert"]["parameters"]["required"] == ["tx_json", "client_json", "reason"]
+
+    payload = ReACTAgent(verbose=False, native_tools=True)._chat_request([])[2]
+    assert [t["function"]["name"] for t in payload["tools"]] == list(TOOLS)
+    assert "tools" not in ReACTAgent(verbose=False)._chat_request([])[2]
+
+
+def test_wasted_iterations_are_counted(monkeypatch):
+    agent = ReACTAgent(verbose=False)
+    replies = iter([
+        "Thought: I should look up the client",                          # no action
+        'Action: lookup_client(iban="NO9386011117947")',                  # unknown tool
+        'Action: score_transaction(wrong_param="{}")',                    # tool call fails
+        'Action: score_transaction(tx_json="{\\"amount\\": 10}")',
+        "Final Answer: ok",
+    ])
+    monkeypatch.setattr(agent, "_call_ollama", lambda messages: next(replies))
+    stats = {}
+
+    assert agent.run("task", stats=stats) == "ok"
+    assert stats == {"iterations": 5, "wasted": 3}
+    assert agent.iteration_stats == {"conversations": 1, "iterations": 5, "wasted": 3}
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+
+from agent import ReACTAgent, compact_observation
+from agent_functions.score_transaction import score_transaction
+
+DATA_DIR = Path(__file__).parent / "tests_data"
+
+
+def client_observation():
+    return "Observation: " + (DATA_DIR / "client_data.json").read_text(encoding="utf-8")
+
+
+def test_compacted_client_scores_the_same():
+    full = client_observation()
+    compact = compact_observation(full)
+
+    assert len(compact) < len(full) / 3
+    client = json.loads(compact[len("Observation: "):])
+    assert client == {"found": True, "client": {"iban": "NO9386011117947", "mean_sum": 1000.0,
+                                                "risk_score": 12.9, "account_status": "active"}}
+    tx = json.dumps({"amount": 25000.0})
+    assert score_transaction(tx, compact[len("Observation: "):]) == score_transaction(tx, full[len("Observation: "):])
+
+
+def test_compacted_transaction_keeps_identifiers_and_amounts():
+    tx = {"msg_id": "MSG-1", "debtor_iban": "D", "creditor_iban": "C", "amount": 10.0, "currency": "EUR",
+          "debtor_name": "x" * 200, "ctrl_sum_matches": True,
+          "transactions": [{"debtor_iban": "D", "creditor_iban": "C", "amount": 4.0, "end_to_end_id": "E1"},
+                           {"debtor_iban": "D", "creditor_iban": "C2", "amount": 6.0, "end_to_end_id": "E2"}]}
+
+    compact = json.loads(compact_observation("Observation: " + json.dumps(tx))[len("Observation: "):])
+
+    assert compact == {"msg_id": "MSG-1", "debtor_iban": "D", "creditor_iban": "C", "amount": 10.0,
+                       "currency": "EUR", "ctrl_sum_matches": True,
+                       "transactions": [{"debtor_iban": "D", "creditor_iban": "C", "amount": 4.0},
+                                        {"debtor_iban": "D", "creditor_iban": "C2", "amount": 6.0}]}
+
+
+def test_small_and_non_json_observations_are_unchanged():
+    for content in ['Observation: {"score": 85, "classification": "fraud"}',
+                    'Observation: {"found": false}', "Observation: not json", "Observation: [1, 2]"]:
+        assert compact_observation(content) == content
+
+
+def test_only_superseded_observations_are_compacted(monkeypatch):
+    agent = ReACTAgent(verbose=False, handles=False)
+    client_json = (DATA_DIR / "client_data.json").read_text(encoding="utf-8")
+    monkeypatch.setitem(agent.tools, "get_client_by_iban", lambda iban: client_json)
+    replies = iter([
+        'Thought: lookup\nAction: get_client_by_iban(iban="NO9386011117947")',
+        'Thought: again\nAction: get_client_by_iban(iban="NO9386011117947")',
+        "Final Answer: done",
+    ])
+    seen = []
+
+    def fake_call_ollama(messages):
+        seen.append([dict(m) for m in messages])
+        return next(replies)
+
+    monkeypatch.setattr(agent, "_call_ollama", fake_call_ollama)
+    assert agent.run("task") == "done"
+
+    # Second call: the only observation is still full
+    assert seen[1][-1]["content"] == "Observation: " + client_json
+    # Third call: the first observation is compacted, the newest is full
+    assert seen[2][3]["content"] == compact_observation("Observation: " + client_json)
+    assert seen[2][-1]["content"] == "Observation: " + client_json
+    # The system prompt is the same string object every time
+    assert all(call[0]["content"] is agent.system_prompt for call in seen)
+
+
+def test_keep_alive_and_usage(capsys):
+    agent = ReACTAgent(keep_alive="30m")
+    _, _, payload = agent._chat_request([{"role": "user", "content": "hi"}])
+    assert payload["keep_alive"] == "30m"
+    assert "keep_alive" not in ReACTAgent(verbose=False)._chat_request([])[2]
+
+    agent._log_usage([{"role": "user", "content": "hello"}],
+                     {"done": True, "prompt_eval_count": 12, "eval_count": 7})
+    agent._log_usage([{"role": "user", "content": "hi"}], None)
+
+    assert agent.token_usage == {"calls": 2, "prompt_chars": 7, "prompt_tokens": 12, "completion_tokens": 7}
+    out = capsys.readouterr().out
+    assert "prompt 12 / completion 7 tokens" in out
+    assert "not reported (stream cut)" in out
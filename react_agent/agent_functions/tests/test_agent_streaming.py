@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+
+from agent import ReACTAgent, _stream_cut
+
+
+def ndjson(pieces):
+    """Ollama streaming chunks for the given content pieces"""
+    lines = [json.dumps({"message": {"role": "assistant", "content": p}, "done": False}).encode() for p in pieces]
+    lines.append(json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}).encode())
+    return lines
+
+
+class FakeStreamResponse:
+    def __init__(self, lines):
+        self.lines = lines
+        self.read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+
+def streaming_agent(monkeypatch, pieces):
+    agent = ReACTAgent(ollama_url="http://ollama.test", verbose=False, stream=True)
+    response = FakeStreamResponse(ndjson(pieces))
+    requests_seen = []
+
+    def post(url, **kwargs):
+        requests_seen.append(kwargs)
+        return response
+
+    monkeypatch.setattr(agent.session, "post", post)
+    return agent, response, requests_seen
+
+
+def test_stream_cut_positions():
+    assert _stream_cut("Thought: parse first\nAction: parse_tr") is None
+    assert _stream_cut('Thought: x\nAction: parse_transaction(xml_string="<a/>') is None
+    text = 'Thought: x\nAction: parse_transaction(xml_string="<a/>")\n'
+    assert text[:_stream_cut(text)] == 'Thought: x\nAction: parse_transaction(xml_string="<a/>")'
+    # Complete as soon as the call closes, even with ")" inside the argument
+    text = 'Action: create_alert(tx_json="{}", client_json="{}", reason="ratio (x10)")'
+    assert _stream_cut(text) == len(text)
+    # Multi-line arguments are complete at the hallucinated Observation
+    text = 'Action: parse_transaction(xml_string="<a>\n</a>")\nObservation: {"made": "up"}'
+    assert text[:_stream_cut(text)] == 'Action: parse_transaction(xml_string="<a>\n</a>")'
+    text = "Thought: done\nFinal Answer: ok, nothing to flag\nThought: more"
+    assert text[:_stream_cut(text)] == "Thought: done\nFinal Answer: ok, nothing to flag"
+    assert _stream_cut("Thought: done\nFinal Answer: ok, still") is None
+
+
+def test_streaming_stops_after_complete_action_line(monkeypatch):
+    agent, response, requests_seen = streaming_agent(monkeypatch, [
+        "Thought: parse first\n", 'Action: parse_transaction(xml_string="<a/>")', "\n",
+        'Observation: {"amount": 1}', "\nThought: hallucinated",
+    ])
+
+    text = agent._call_ollama([{"role": "user", "content": "go"}])
+
+    assert text == 'Thought: parse first\nAction: parse_transaction(xml_string="<a/>")'
+    assert response.read == 2
+    assert agent.stream_cuts == 1
+    assert requests_seen[0]["stream"] is True
+    assert requests_seen[0]["json"]["stream"] is True
+
+
+def test_streaming_reads_to_done_without_cut(monkeypatch):
+    agent, response, _ = streaming_agent(monkeypatch, ["Thought: done\n", "Final Answer: ", "all clear"])
+
+    assert agent._call_ollama([]) == "Thought: done\nFinal Answer: all clear"
+    assert response.read == 4
+    assert agent.stream_cuts == 0
+
+
+def test_agent_reuses_one_session():
+    agent = ReACTAgent(verbose=False)
+    session = agent.session
+    agent._chat_request([])
+    assert agent.session is session
+    agent.close()
+
+
+def test_async_streaming_cuts_hallucinated_observation():
+    async def chat(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for line in ndjson(["Thought: x\n", 'Action: parse_transaction(xml_string="<a/>")\n',
+                            "Observation: {}\n", "Final Answer: made up"]):
+            await response.write(line + b"\n")
+        await response.write_eof()
+        return response
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/api/chat", chat)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            agent = ReACTAgent(ollama_url=f"http://127.0.0.1:{port}", verbose=False, stream=True)
+            async with aiohttp.ClientSession() as session:
+                return await agent._acall_ollama(session, [])
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(scenario()) == 'Thought: x\nAction: parse_transaction(xml_string="<a/>")'
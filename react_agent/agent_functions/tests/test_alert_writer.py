@@ -0,0 +1,167 @@
+import json
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from db.models import Alert, Base
+from agent_functions.create_alert import AlertWriter
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def make_row(reason="test"):
+    return {"alert_uid": str(uuid.uuid4()), "created_at": datetime(2025, 1, 1, 12, 0),
+            "tx_summary": {"amount": 1.0}, "client_summary": {}, "reason": reason}
+
+
+def stored(engine):
+    with Session(engine) as session:
+        return session.query(Alert).order_by(Alert.id).all()
+
+
+def test_flush_writes_queued_alerts_in_one_batch(engine):
+    writer = AlertWriter(engine=engine, background=False)
+    rows = [make_row(f"r{i}") for i in range(3)]
+    for row in rows:
+        writer.submit(row)
+
+    assert stored(engine) == []
+    assert writer.flush() == 3
+    alerts = stored(engine)
+    assert [a.alert_uid for a in alerts] == [r["alert_uid"] for r in rows]
+    assert alerts[0].tx_summary == {"amount": 1.0}
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["queued"] == 0
+
+
+def test_background_thread_flushes_on_batch_size(engine):
+    writer = AlertWriter(engine=engine, batch_size=2, flush_interval=60)
+    writer.submit(make_row())
+    writer.submit(make_row())
+
+    deadline = time.monotonic() + 5
+    while writer.written < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(stored(engine)) == 2
+    writer.close()
+
+
+def test_close_writes_pending_alerts(engine):
+    writer = AlertWriter(engine=engine, batch_size=100, flush_interval=60)
+    writer.submit(make_row())
+    writer.close()
+
+    assert len(stored(engine)) == 1
+
+
+def test_failed_flush_keeps_alerts_queued(engine):
+    writer = AlertWriter(engine=create_engine("sqlite://"), background=False)
+    writer.submit(make_row())
+
+    assert writer.flush() == 0
+    assert writer.stats()["failed_flushes"] == 1
+    assert writer.stats()["queued"] == 1
+
+    writer.engine = engine
+    assert writer.flush() == 1
+    assert len(stored(engine)) == 1
+
+
+def test_spool_is_truncated_after_flush(engine, tmp_path):
+    spool = tmp_path / "alerts.jsonl"
+    writer = AlertWriter(engine=engine, spool_path=str(spool), background=False)
+    row = make_row()
+    writer.submit(row)
+
+    assert json.loads(spool.read_text())["alert_uid"] == row["alert_uid"]
+    writer.flush()
+    assert spool.read_text() == ""
+    writer.close()
+
+
+def test_recover_requeues_only_unwritten_alerts(engine, tmp_path):
+    spool = tmp_path / "alerts.jsonl"
+    crashed = AlertWriter(engine=engine, spool_path=str(spool), background=False)
+    written, lost = make_row("written"), make_row("lost")
+    crashed.submit(written)
+    crashed.submit(lost)
+    # Simulate a crash after the first row reached the table
+    with engine.begin() as conn:
+        conn.execute(Alert.__table__.insert(), [written])
+
+    writer = AlertWriter(engine=engine, spool_path=str(spool), background=False)
+    assert writer.recover() == 1
+    writer.flush()
+
+    assert [a.reason for a in stored(engine)] == ["written", "lost"]
+    assert stored(engine)[1].created_at == lost["created_at"]
+    writer.close()
+
+
+def test_failing_database_is_retried_with_backoff(engine):
+    writer = AlertWriter(engine=create_engine("sqlite://"), batch_size=1, flush_interval=60,
+                         retry_delay=0.05, max_retry_delay=0.1)
+    for _ in range(3):
+        writer.submit(make_row())
+
+    # batch_size rows stay queued, which used to flush again without waiting
+    time.sleep(0.5)
+    assert 2 <= writer.stats()["failed_flushes"] <= 10
+    assert writer.stats()["queued"] == 3
+
+    writer.engine = engine
+    deadline = time.monotonic() + 5
+    while writer.written < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(stored(engine)) == 3
+    assert writer._retry_at == 0.0
+    writer.close()
+
+
+def test_rejected_row_is_isolated_and_dead_lettered(engine, tmp_path):
+    spool, dead_letter = tmp_path / "alerts.jsonl", tmp_path / "alerts.dead.jsonl"
+    writer = AlertWriter(engine=engine, spool_path=str(spool), background=False,
+                         max_attempts=2, dead_letter_path=str(dead_letter))
+    duplicate = make_row("duplicate")
+    with engine.begin() as conn:
+        conn.execute(Alert.__table__.insert(), [duplicate])
+
+    writer.submit(make_row("first"))
+    writer.submit(dict(duplicate))
+    writer.submit(make_row("last"))
+    assert writer.flush() == 2
+    assert [a.reason for a in stored(engine)] == ["duplicate", "first", "last"]
+    # The spool keeps only the row still queued
+    assert [json.loads(line)["reason"] for line in spool.read_text().splitlines()] == ["duplicate"]
+
+    assert writer.flush() == 0
+    assert writer.stats()["queued"] == 0 and writer.stats()["dead_lettered"] == 1
+    dead = json.loads(dead_letter.read_text())
+    assert dead["alert_uid"] == duplicate["alert_uid"] and dead["attempts"] == 2
+    assert "UNIQUE" in dead["error"]
+    assert spool.read_text() == ""
+    writer.close()
+
+
+def test_unreachable_database_does_not_dead_letter(tmp_path):
+    dead_letter = tmp_path / "alerts.dead.jsonl"
+    writer = AlertWriter(engine=create_engine("sqlite://"), background=False,
+                         max_attempts=1, dead_letter_path=str(dead_letter))
+    writer.submit(make_row())
+
+    for _ in range(3):
+        assert writer.flush() == 0
+    assert writer.stats()["queued"] == 1
+    assert not dead_letter.exists()
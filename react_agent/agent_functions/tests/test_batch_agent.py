@@ -0,0 +1,257 @@
+import asyncio
+import random
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+from kafka.structs import TopicPartition
+
+from agent import MAX_ITERATIONS_REACHED, ReACTAgent
+from agent_functions.prescreen import CLEARED, Prescreener
+from batch_agent import (BatchRunner, OffsetTracker, TrackerRebalanceListener, commit_offsets, directory_source,
+                         kafka_source, percentile)
+
+XML_FILE = Path(__file__).parent / "tests_data" / "transaction_example.xml"
+
+
+async def fake_ollama(reply, delay=0.05):
+    """Local /api/chat server; reply(messages) gives the assistant content"""
+    state = {"in_flight": 0, "max_in_flight": 0, "requests": 0}
+
+    async def chat(request):
+        body = await request.json()
+        state["requests"] += 1
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(delay)
+        state["in_flight"] -= 1
+        return web.json_response({"message": {"role": "assistant", "content": reply(body["messages"])}})
+
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", state
+
+
+def parse_then_answer(messages):
+    if len(messages) == 2:
+        return 'Thought: parse first\nAction: parse_transaction(xml_string="<Document/>")'
+    return "Thought: done\nFinal Answer: reviewed"
+
+
+async def items(n):
+    xml = XML_FILE.read_text(encoding="utf-8")
+    for i in range(n):
+        yield f"tx{i}", xml
+
+
+def run_batch(reply, n, concurrency, max_iterations=None):
+    async def scenario():
+        server, url, state = await fake_ollama(reply)
+        try:
+            agent = ReACTAgent(ollama_url=url, verbose=False)
+            runner = BatchRunner(agent, concurrency=concurrency, max_iterations=max_iterations)
+            await runner.run(items(n))
+            return runner, state
+        finally:
+            await server.cleanup()
+
+    return asyncio.run(scenario())
+
+
+def test_runs_conversations_concurrently_within_the_limit():
+    runner, state = run_batch(parse_then_answer, n=12, concurrency=4)
+
+    assert sorted(r["name"] for r in runner.results) == sorted(f"tx{i}" for i in range(12))
+    assert all(r["answer"] == "reviewed" and r["error"] is None for r in runner.results)
+    assert state["requests"] == 24
+    assert 1 < state["max_in_flight"] <= 4
+
+    stats = runner.stats()
+    assert stats["transactions"] == 12
+    assert stats["tx_per_min"] > 0
+    assert stats["p50_seconds"] <= stats["p95_seconds"]
+    assert "12 transactions" in runner.report()
+
+
+def test_iteration_budget_per_conversation():
+    runner, state = run_batch(lambda messages: "Thought: still thinking", n=3, concurrency=3, max_iterations=2)
+
+    assert all(r["answer"] == MAX_ITERATIONS_REACHED for r in runner.results)
+    assert state["requests"] == 6
+    assert runner.stats()["budget_exhausted"] == 3
+
+
+def test_http_errors_are_recorded_per_transaction():
+    async def scenario():
+        agent = ReACTAgent(ollama_url="http://127.0.0.1:9", verbose=False)
+        runner = BatchRunner(agent, concurrency=2)
+        await runner.run(items(2))
+        return runner
+
+    runner = asyncio.run(scenario())
+    assert runner.stats()["errors"] == 2
+    assert all("Ollama API error" in r["error"] for r in runner.results)
+
+
+def test_prescreen_runs_off_the_event_loop():
+    class SlowPrescreener(Prescreener):
+        def _screen(self, xml_string):
+            time.sleep(0.2)
+            return {"decision": CLEARED, "score": 0, "classification": "ok", "tx": {"msg_id": "M1"}}
+
+    async def scenario():
+        agent = ReACTAgent(verbose=False, prescreener=SlowPrescreener(tools={}))
+        start = time.perf_counter()
+        answers = await asyncio.gather(*(agent.aanalyze_transaction("<Document/>", None) for _ in range(4)))
+        return answers, time.perf_counter() - start, agent
+
+    answers, elapsed, agent = asyncio.run(scenario())
+    assert len(answers) == 4 and all("pre-screened as ok" in answer for answer in answers)
+    # Four 0.2 s screens in worker threads, not one after another on the loop
+    assert elapsed < 0.6
+    assert agent.prescreener.stats[CLEARED] == 4
+
+
+Record = namedtuple("Record", "offset value")
+
+
+class FakeConsumer:
+    """
+    Hands out the given records in polls of up to 3 per partition and records
+    every commit with the names in finished at that moment
+    """
+
+    def __init__(self, partitions, finished):
+        self.records = {tp: [Record(offset, xml.encode()) for offset, xml in enumerate(values)]
+                        for tp, values in partitions.items()}
+        self.finished = finished
+        self.commits = []
+
+    def poll(self, timeout_ms=0):
+        batch = {}
+        for tp, records in self.records.items():
+            if records:
+                batch[tp], self.records[tp] = records[:3], records[3:]
+        return batch
+
+    def commit(self, offsets):
+        self.commits.append(({tp: meta.offset for tp, meta in offsets.items()}, set(self.finished)))
+
+
+def test_offset_tracker_commits_in_order_per_partition():
+    tp0, tp1 = TopicPartition("t", 0), TopicPartition("t", 1)
+    tracker = OffsetTracker()
+    for offset in range(3):
+        tracker.started(f"t:0:{offset}", tp0, offset)
+    tracker.started("t:1:7", tp1, 7)
+
+    tracker.done("t:0:1")
+    tracker.done("t:1:7")
+    # t:0:0 is still being analyzed, so partition 0 cannot move yet
+    assert tracker.take() == {tp1: 8}
+    tracker.done("t:0:0")
+    assert tracker.take() == {tp0: 2}
+    tracker.done("other")
+    tracker.done("t:0:2")
+    assert tracker.take() == {tp0: 3}
+    assert tracker.take() == {}
+
+
+def test_partition_handed_back_keeps_committing():
+    tp0, tp1 = TopicPartition("t", 0), TopicPartition("t", 1)
+    commits = []
+    consumer = namedtuple("Consumer", "commit")(
+        lambda offsets: commits.append({tp: meta.offset for tp, meta in offsets.items()}))
+    tracker = OffsetTracker()
+    listener = TrackerRebalanceListener(consumer, tracker)
+    for offset in range(3):
+        tracker.started(f"t:0:{offset}", tp0, offset)
+    tracker.started("t:1:4", tp1, 4)
+    tracker.done("t:0:0")
+
+    # Rebalance while t:0:1 and t:0:2 are in flight; finished offsets are committed first
+    listener.on_partitions_revoked([tp0, tp1])
+    assert commits == [{tp0: 1}]
+    listener.on_partitions_assigned([tp0])
+    # The partition comes back and Kafka redelivers from the committed offset
+    tracker.started("t:0:1", tp0, 1)
+    tracker.started("t:0:2", tp0, 2)
+    tracker.done("t:1:4")
+    tracker.done("t:0:1")
+    tracker.done("t:0:2")
+    assert tracker.take() == {tp0: 3}
+
+    # Without a rebalance, a second delivery of a message in flight is not tracked twice
+    tracker.started("t:0:3", tp0, 3)
+    tracker.started("t:0:3", tp0, 3)
+    tracker.done("t:0:3")
+    assert tracker.take() == {tp0: 4}
+
+
+def test_kafka_offsets_are_committed_after_analysis():
+    xml = XML_FILE.read_text(encoding="utf-8")
+    tp0, tp1 = TopicPartition("unprocessed", 0), TopicPartition("unprocessed", 1)
+    finished = []
+    consumer = FakeConsumer({tp0: [xml] * 7, tp1: [xml] * 5}, finished)
+    tracker = OffsetTracker()
+    rng = random.Random(3)
+
+    def reply(messages):
+        return "Thought: done\nFinal Answer: reviewed"
+
+    async def scenario():
+        server, url, _ = await fake_ollama(reply, delay=0.0)
+        try:
+            agent = ReACTAgent(ollama_url=url, verbose=False)
+            original = agent.aanalyze_transaction
+
+            async def analyze(*args, **kwargs):
+                # Finish out of order
+                await asyncio.sleep(rng.uniform(0, 0.05))
+                return await original(*args, **kwargs)
+
+            agent.aanalyze_transaction = analyze
+            runner = BatchRunner(agent, concurrency=4,
+                                 on_done=lambda name: (finished.append(name), tracker.done(name)))
+            await runner.run(kafka_source(consumer, idle_timeout=0, poll_timeout_ms=0, tracker=tracker))
+        finally:
+            await server.cleanup()
+
+    asyncio.run(scenario())
+    commit_offsets(consumer, tracker)
+
+    assert len(finished) == 12
+    assert len(consumer.commits) > 1
+    for offsets, done in consumer.commits:
+        # Never past a message that had not finished when the commit was made
+        for tp, offset in offsets.items():
+            assert all(f"{tp.topic}:{tp.partition}:{o}" in done for o in range(offset))
+    for tp, count in ((tp0, 7), (tp1, 5)):
+        committed = [offsets[tp] for offsets, _ in consumer.commits if tp in offsets]
+        assert committed == sorted(committed) and committed[-1] == count
+
+
+def test_directory_source_reads_xml_files(tmp_path):
+    (tmp_path / "b.xml").write_text("<b/>")
+    (tmp_path / "a.xml").write_text("<a/>")
+    (tmp_path / "notes.txt").write_text("skip")
+
+    async def collect():
+        return [item async for item in directory_source(str(tmp_path))]
+
+    assert asyncio.run(collect()) == [("a.xml", "<a/>"), ("b.xml", "<b/>")]
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile([], 95) == 0.0
+    assert percentile([3.0], 50) == pytest.approx(3.0)
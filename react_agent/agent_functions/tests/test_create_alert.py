@@ -6,7 +6,7 @@ from sqlalchemy import create_engine # type: ignore
 from sqlalchemy.orm import Session, sessionmaker, declarative_base # type: ignore
 from sqlalchemy import Column, Integer, DateTime, JSON, String # type: ignore
 from db.models import Alert, Base
-from agent_functions.create_alert import create_alert
+from agent_functions.create_alert import alert_writer, create_alert
 
 @pytest.fixture(scope="module")
 def test_engine():
@@ -44,6 +44,7 @@ def test_create_alert_success(monkeypatch, test_engine, load_test_data):
 
     result_json = create_alert(tx_json, client_json, reason)
     result = json.loads(result_json)
+    alert_writer.flush()
 
     assert "alert_id" in result
     assert "created_at" in result
@@ -54,6 +55,7 @@ def test_create_alert_success(monkeypatch, test_engine, load_test_data):
         assert len(alerts) == 1
         a = alerts[0]
         assert a.reason == reason
+        assert a.alert_uid == result["alert_id"]
         assert isinstance(a.created_at, datetime)
         assert isinstance(a.tx_summary, dict)
         assert isinstance(a.client_summary, dict)
@@ -68,6 +70,7 @@ def test_create_alert_without_client_json(monkeypatch, test_engine, load_test_da
     reason = "No client info"
     result_json = create_alert(tx_json, "", reason)
     result = json.loads(result_json)
+    alert_writer.flush()
 
     assert "alert_id" in result
     assert result["reason"] == reason
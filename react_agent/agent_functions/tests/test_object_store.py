@@ -0,0 +1,109 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from action_parser import scan_action
+from agent import ReACTAgent
+from agent_functions.agent_tools import run_tool
+from agent_functions.object_store import ObjectStore
+
+DATA_DIR = Path(__file__).parent / "tests_data"
+XML = (DATA_DIR / "transaction_example.xml").read_text(encoding="utf-8")
+CLIENT_JSON = (DATA_DIR / "client_data.json").read_text(encoding="utf-8")
+
+
+def test_put_resolve_and_record():
+    store = ObjectStore()
+    assert store.put("xml", "<a/>") == "xml#1"
+    assert store.resolve("xml#1") == "<a/>"
+    assert store.resolve(" xml#1 ") == "<a/>"
+    # Literals, IBANs and unknown kinds pass through
+    assert store.resolve("NO9386011117947") == "NO9386011117947"
+    assert store.resolve("issue#1") == "issue#1"
+    assert store.resolve(12) == 12
+    with pytest.raises(KeyError):
+        store.resolve("tx#7")
+
+    recorded = json.loads(store.record("score_transaction", '{"score": 10}'))
+    assert recorded == {"handle": "score#1", "score": 10}
+    assert store.get("score#1") == '{"score": 10}'
+    assert store.record("score_transaction", '{"error": "bad"}') == '{"error": "bad"}'
+    assert store.record("unknown_tool", '{"a": 1}') == '{"a": 1}'
+    assert len(store) == 2
+
+
+def test_run_tool_accepts_handles_or_literals():
+    store = ObjectStore()
+    xml = store.put("xml", XML)
+
+    tx = json.loads(run_tool("parse_transaction", xml, store=store))
+    assert tx["handle"] == "tx#1" and tx["amount"] == 1214.15
+
+    by_handle = json.loads(run_tool("score_transaction", tx_json="tx#1", store=store))
+    by_literal = json.loads(run_tool("score_transaction", tx_json=store.get("tx#1"), store=store))
+    assert by_handle["handle"] == "score#1" and by_literal["handle"] == "score#2"
+    assert {**by_handle, "handle": None} == {**by_literal, "handle": None}
+
+    assert "handle" not in json.loads(run_tool("score_transaction", tx_json=store.get("tx#1")))
+
+
+def test_agent_run_passes_handles_between_tools(monkeypatch):
+    agent = ReACTAgent(verbose=False)
+    monkeypatch.setitem(agent.tools, "get_client_by_iban", lambda iban: CLIENT_JSON)
+    replies = iter([
+        'Action: parse_transaction(xml_string="xml#1")',
+        'Action: get_client_by_iban(iban="NO9386011117947")',
+        'Action: score_transaction(tx_json="tx#1", client_json="client#1")',
+        "Final Answer: scored",
+    ])
+    seen = []
+
+    def fake_call_ollama(messages):
+        seen.append([m["content"] for m in messages])
+        return next(replies)
+
+    monkeypatch.setattr(agent, "_call_ollama", fake_call_ollama)
+    stats = {}
+
+    assert agent.analyze_transaction(XML, stats=stats) == "scored"
+    assert stats["wasted"] == 0
+    # The task carries the handle, not the XML
+    assert "xml#1" in seen[0][1] and "<Document" not in seen[0][1]
+    score = json.loads(seen[3][-1][len("Observation: "):])
+    assert score["handle"] == "score#1"
+    assert score["classification"] == "ok"
+
+
+def test_unknown_handle_is_a_failed_tool_call(monkeypatch):
+    agent = ReACTAgent(verbose=False)
+    replies = iter(['Action: score_transaction(tx_json="tx#9")', "Final Answer: gave up"])
+    monkeypatch.setattr(agent, "_call_ollama", lambda messages: next(replies))
+    stats = {}
+
+    agent.run("task", stats=stats)
+
+    assert stats["wasted"] == 1
+
+
+def test_system_prompt_teaches_handles():
+    assert 'score_transaction(tx_json="tx#1", client_json="client#1")' in ReACTAgent(verbose=False).system_prompt
+    assert "tx#1" not in ReACTAgent(verbose=False, handles=False).system_prompt
+
+
+def test_prompt_example_resolves_against_a_run_in_documented_order():
+    store = ObjectStore()
+    store.put("xml", XML)
+    run_tool("parse_transaction", "xml#1", store=store)
+    store.record("get_client_by_iban", CLIENT_JSON)
+    store.record("get_client_by_iban", CLIENT_JSON)
+
+    prompt = ReACTAgent(verbose=False).system_prompt
+    for line in prompt.splitlines():
+        if line.startswith("Action: score_transaction("):
+            action = scan_action(line)
+            break
+    params = store.resolve_params(action.params)
+
+    assert params == {"tx_json": store.get("tx#1"), "client_json": CLIENT_JSON}
+    assert json.loads(run_tool("score_transaction", **action.params, store=store))["handle"] == "score#1"
@@ -37,6 +37,10 @@ def test_parse_transaction_happy_path(example_xml_text):
     assert parsed["amount"] == pytest.approx(1214.15)
     assert parsed["currency"] == "EUR"
 
+    assert len(parsed["transactions"]) == 1
+    assert parsed["transactions"][0]["end_to_end_id"] == "E2E-1"
+    assert parsed["ctrl_sum_matches"] is True
+
 
 def test_parse_transaction_invalid_xml_returns_error():
     bad = "this is not xml"
@@ -61,4 +65,58 @@ def test_parse_transaction_missing_amount():
     assert parsed["msg_id"] == "MSG-2"
     assert parsed["pmt_inf_id"] == "P-2"
     assert parsed["amount"] is None
-    assert parsed["currency"] is None
\ No newline at end of file
+    assert parsed["currency"] is None
+
+def test_parse_transaction_bulk_message():
+    bulk_xml = """<?xml version="1.0" encoding="UTF-8"?>
+    <Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.03">
+      <CstmrCdtTrfInitn>
+        <GrpHdr><MsgId>MSG-3</MsgId><NbOfTxs>3</NbOfTxs><CtrlSum>350.75</CtrlSum></GrpHdr>
+        <PmtInf>
+          <PmtInfId>P-1</PmtInfId>
+          <Dbtr><Nm>ACME Corp</Nm></Dbtr>
+          <DbtrAcct><Id><IBAN>DE89370400440532013000</IBAN></Id></DbtrAcct>
+          <CdtTrfTxInf>
+            <PmtId><EndToEndId>E2E-1</EndToEndId></PmtId>
+            <Amt><InstdAmt Ccy="EUR">100.50</InstdAmt></Amt>
+            <Cdtr><Nm>John Doe</Nm></Cdtr>
+            <CdtrAcct><Id><IBAN>GB29NWBK60161331926819</IBAN></Id></CdtrAcct>
+          </CdtTrfTxInf>
+          <CdtTrfTxInf>
+            <PmtId><EndToEndId>E2E-2</EndToEndId></PmtId>
+            <Amt><InstdAmt Ccy="EUR">200.25</InstdAmt></Amt>
+            <Cdtr><Nm>Alpha Ltd</Nm></Cdtr>
+            <CdtrAcct><Id><IBAN>FR1420041010050500013M02606</IBAN></Id></CdtrAcct>
+          </CdtTrfTxInf>
+        </PmtInf>
+        <PmtInf>
+          <PmtInfId>P-2</PmtInfId>
+          <Dbtr><Nm>Beta LLC</Nm></Dbtr>
+          <DbtrAcct><Id><IBAN>ES9121000418450200051332</IBAN></Id></DbtrAcct>
+          <CdtTrfTxInf>
+            <PmtId><EndToEndId>E2E-3</EndToEndId></PmtId>
+            <Amt><InstdAmt Ccy="GBP">50.00</InstdAmt></Amt>
+            <Cdtr><Nm>ACME Corp</Nm></Cdtr>
+            <CdtrAcct><Id><IBAN>DE89370400440532013000</IBAN></Id></CdtrAcct>
+          </CdtTrfTxInf>
+        </PmtInf>
+      </CstmrCdtTrfInitn>
+    </Document>
+    """
+    parsed = json.loads(parse_transaction(bulk_xml))
+
+    assert parsed["end_to_end_id"] == "E2E-1"
+    assert parsed["ctrl_sum_matches"] is True
+
+    txs = parsed["transactions"]
+    assert [tx["end_to_end_id"] for tx in txs] == ["E2E-1", "E2E-2", "E2E-3"]
+    assert [tx["pmt_inf_id"] for tx in txs] == ["P-1", "P-1", "P-2"]
+    assert [tx["debtor_iban"] for tx in txs] == [
+        "DE89370400440532013000", "DE89370400440532013000", "ES9121000418450200051332"
+    ]
+    assert txs[2]["creditor_name"] == "ACME Corp"
+    assert txs[2]["amount"] == pytest.approx(50.0)
+    assert txs[2]["currency"] == "GBP"
+
+    mismatched = json.loads(parse_transaction(bulk_xml.replace("350.75", "400.00")))
+    assert mismatched["ctrl_sum_matches"] is False
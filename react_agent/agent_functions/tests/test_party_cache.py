@@ -0,0 +1,185 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.models import Base, Party
+from agent_functions.get_client_by_iban import PartyCache
+
+START = datetime(2025, 1, 1, 12, 0, 0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with factory() as session:
+        for i in range(5):
+            session.add(Party(name=f"Party {i}", iban=f"NO{i:013d}", mean_sum=1000 + i,
+                              updated_at=START + timedelta(minutes=i)))
+        session.commit()
+    yield factory
+    engine.dispose()
+
+
+def make_cache(session_factory, **kwargs):
+    clock = FakeClock()
+    return PartyCache(session_factory=session_factory, clock=clock, **kwargs), clock
+
+
+def test_warm_loads_parties_with_the_lookup_format(session_factory):
+    cache, _ = make_cache(session_factory)
+
+    assert cache.warm() == 5
+    assert cache.watermark == START + timedelta(minutes=4)
+
+    result = json.loads(cache.get("NO0000000000003"))
+    assert result["found"] is True
+    assert result["client"]["name"] == "Party 3"
+    assert result["client"]["mean_sum"] == 1003.0
+    assert result["client"]["updated_at"] == (START + timedelta(minutes=3)).isoformat()
+    assert cache.get("NO9999999999999") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction_keeps_most_recently_used(session_factory):
+    cache, _ = make_cache(session_factory, max_size=2)
+    cache.put("A", "a")
+    cache.put("B", "b")
+    cache.get("A")
+    cache.put("C", "c")
+
+    assert cache.get("B") is None
+    assert cache.get("A") == "a" and cache.get("C") == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_warm_respects_max_size_and_prefers_recent_updates(session_factory):
+    cache, _ = make_cache(session_factory, max_size=2)
+
+    assert cache.warm() == 2
+    assert cache.stats()["size"] == 2
+    assert cache.get("NO0000000000004") is not None
+    assert cache.get("NO0000000000000") is None
+
+
+def test_entries_expire_after_ttl(session_factory):
+    cache, clock = make_cache(session_factory, ttl_seconds=10)
+    cache.put("A", "a")
+
+    clock.now += 9
+    assert cache.get("A") == "a"
+    clock.now += 1
+    assert cache.get("A") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_refresh_reads_only_updated_parties(session_factory):
+    cache, clock = make_cache(session_factory, refresh_interval=60)
+    cache.warm()
+
+    with session_factory() as session:
+        party = session.query(Party).filter(Party.iban == "NO0000000000001").one()
+        party.account_status = "blocked"
+        party.updated_at = START + timedelta(hours=1)
+        session.commit()
+
+    assert cache.maybe_refresh() is None
+    assert cache.refreshes == 0
+
+    clock.now += 60
+    cache.maybe_refresh().join()
+    assert cache.refreshes == 1
+    # The changed party plus the one at the previous watermark
+    assert cache.refreshed_rows == 2
+    assert cache.watermark == START + timedelta(hours=1)
+    assert json.loads(cache.get("NO0000000000001"))["client"]["account_status"] == "blocked"
+
+
+def test_refresh_runs_in_the_background(session_factory):
+    cache, clock = make_cache(session_factory, refresh_interval=60)
+    cache.warm()
+    release = threading.Event()
+
+    def slow_session():
+        release.wait(5)
+        return session_factory()
+
+    cache.session_factory = slow_session
+    clock.now += 60
+    thread = cache.maybe_refresh()
+
+    # Lookups are served while the refresh waits for the database
+    assert cache.get("NO0000000000000") is not None
+    assert cache.maybe_refresh() is None
+    release.set()
+    thread.join()
+    assert cache.refreshes == 1 and cache.next_refresh == clock.now + 60
+
+
+def test_put_keeps_the_newer_row(session_factory):
+    cache, _ = make_cache(session_factory)
+    older, newer = START, START + timedelta(minutes=1)
+
+    cache.put("A", "refreshed", newer)
+    # A lookup that read the row before the refresh finishes afterwards
+    cache.put("A", "looked up", older)
+    cache.put("A", "not found")
+    assert cache.get("A") == "refreshed"
+    assert cache.stats()["stale_puts"] == 2
+
+    cache.put("A", "updated", newer + timedelta(minutes=1))
+    assert cache.get("A") == "updated"
+
+
+def test_refresh_error_is_counted_and_entries_kept(session_factory):
+    cache, _ = make_cache(session_factory)
+    cache.warm()
+
+    def broken_session():
+        raise RuntimeError("db down")
+
+    cache.session_factory = broken_session
+    assert cache.refresh() == 0
+    assert cache.stats()["refresh_errors"] == 1
+    assert cache.get("NO0000000000000") is not None
+
+
+def test_zero_size_disables_cache(session_factory):
+    cache, _ = make_cache(session_factory, max_size=0)
+
+    assert cache.warm() == 0
+    cache.put("A", "a")
+    assert cache.get("A") is None
+
+
+def test_get_client_by_iban_caches_results(session_factory, monkeypatch):
+    import sys
+    module = sys.modules["agent_functions.get_client_by_iban"]
+    cache, _ = make_cache(session_factory)
+    monkeypatch.setattr(module, "party_cache", cache)
+    monkeypatch.setattr(module, "SessionLocal", session_factory)
+
+    first = module.get_client_by_iban("NO0000000000002")
+    assert json.loads(first)["client"]["name"] == "Party 2"
+    assert json.loads(module.get_client_by_iban("NOPE"))["found"] is False
+
+    # Served from the cache even once the database is unreachable
+    monkeypatch.setattr(module, "SessionLocal", None)
+    assert module.get_client_by_iban("NO0000000000002") == first
+    assert json.loads(module.get_client_by_iban("NOPE"))["found"] is False
+    assert (cache.hits, cache.misses) == (2, 2)
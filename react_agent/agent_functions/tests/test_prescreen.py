@@ -0,0 +1,136 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from agent import ReACTAgent
+from agent_functions.parse_transaction import parse_transaction
+from agent_functions.prescreen import ALERTED, CLEARED, ESCALATED, Prescreener
+from agent_functions.score_transaction import score_transaction
+
+DATA_DIR = Path(__file__).parent / "tests_data"
+XML_FILE = DATA_DIR / "transaction_example.xml"
+DEBTOR_IBAN = "NO9386011117947"
+CREDITOR_IBAN = "PT50000201231234567890154"
+
+
+@pytest.fixture
+def example_xml() -> str:
+    return XML_FILE.read_text(encoding="utf-8")
+
+
+@pytest.fixture
+def client_data():
+    return json.loads((DATA_DIR / "client_data.json").read_text(encoding="utf-8"))
+
+
+def with_amount(xml: str, amount: str) -> str:
+    return xml.replace("1214.15", amount)
+
+
+def make_prescreener(clients):
+    """Prescreener over the real parse / score tools and in-memory client lookups and alerts"""
+    alerts = []
+    lookups = []
+
+    def get_client_by_iban(iban):
+        lookups.append(iban)
+        if iban in clients:
+            return json.dumps({"found": True, "client": clients[iban]})
+        return json.dumps({"found": False})
+
+    def create_alert(tx_json, client_json, reason):
+        alerts.append((json.loads(tx_json), reason))
+        return json.dumps({"alert_id": len(alerts), "reason": reason})
+
+    prescreener = Prescreener(tools={
+        "parse_transaction": parse_transaction,
+        "get_client_by_iban": get_client_by_iban,
+        "score_transaction": score_transaction,
+        "create_alert": create_alert,
+    })
+    return prescreener, alerts, lookups
+
+
+def test_clear_ok_transaction_is_cleared(example_xml, client_data):
+    prescreener, alerts, lookups = make_prescreener({DEBTOR_IBAN: client_data["client"]})
+
+    outcome = prescreener.screen(example_xml)
+
+    assert outcome["decision"] == CLEARED
+    assert outcome["classification"] == "ok"
+    assert outcome["score"] < 35
+    assert alerts == []
+    assert lookups == [DEBTOR_IBAN, CREDITOR_IBAN]
+
+
+def test_clear_fraud_creates_alert_directly(example_xml, client_data):
+    clients = {DEBTOR_IBAN: client_data["client"], CREDITOR_IBAN: client_data["client"]}
+    prescreener, alerts, _ = make_prescreener(clients)
+
+    outcome = prescreener.screen(with_amount(example_xml, "50000.00"))
+
+    assert outcome["decision"] == ALERTED
+    assert outcome["alert"]["alert_id"] == 1
+    assert len(alerts) == 1 and "Pre-screen fraud score" in alerts[0][1]
+
+
+def test_suspicious_band_is_escalated(example_xml, client_data):
+    # Known debtor scores fraud, the unknown creditor only suspicious
+    prescreener, alerts, _ = make_prescreener({DEBTOR_IBAN: client_data["client"]})
+
+    outcome = prescreener.screen(with_amount(example_xml, "50000.00"))
+
+    assert outcome["decision"] == ESCALATED
+    assert outcome["escalation_reason"].startswith("suspicious band")
+    assert alerts == []
+
+
+def test_disagreeing_rules_are_escalated(example_xml, client_data):
+    wealthy = {**client_data["client"], "mean_sum": 100000.0}
+    clients = {DEBTOR_IBAN: wealthy, CREDITOR_IBAN: client_data["client"]}
+    prescreener, _, _ = make_prescreener(clients)
+
+    outcome = prescreener.screen(with_amount(example_xml, "20000.00"))
+
+    assert outcome["decision"] == ESCALATED
+    assert outcome["escalation_reason"] == "debtor and creditor rules disagree"
+
+
+def test_parse_error_and_ctrl_sum_mismatch_are_escalated(example_xml):
+    prescreener, _, lookups = make_prescreener({})
+
+    assert prescreener.screen("not xml")["decision"] == ESCALATED
+    mismatch = example_xml.replace("<CtrlSum>1214.15</CtrlSum>", "<CtrlSum>1.00</CtrlSum>", 1)
+    assert prescreener.screen(mismatch)["escalation_reason"] == "CtrlSum does not match the credit transfers"
+    assert lookups == []
+
+
+def test_skip_ratio_and_report(example_xml, client_data):
+    prescreener, _, _ = make_prescreener({DEBTOR_IBAN: client_data["client"]})
+    for _ in range(3):
+        prescreener.screen(example_xml)
+    prescreener.screen(with_amount(example_xml, "50000.00"))
+
+    assert prescreener.stats == {CLEARED: 3, ALERTED: 0, ESCALATED: 1}
+    assert prescreener.skip_ratio == pytest.approx(0.75)
+    assert "3/4 transactions (75.0%) decided without the LLM" in prescreener.report()
+
+
+def test_agent_only_calls_llm_for_escalated_transactions(example_xml, client_data, monkeypatch):
+    prescreener, _, _ = make_prescreener({DEBTOR_IBAN: client_data["client"]})
+    agent = ReACTAgent(verbose=False, prescreener=prescreener)
+    calls = []
+
+    def fake_call_ollama(messages):
+        calls.append(messages)
+        return "Thought: done\nFinal Answer: escalated and reviewed"
+
+    monkeypatch.setattr(agent, "_call_ollama", fake_call_ollama)
+
+    assert "pre-screened as ok" in agent.analyze_transaction(example_xml)
+    assert calls == []
+
+    assert agent.analyze_transaction(with_amount(example_xml, "50000.00")) == "escalated and reviewed"
+    assert len(calls) == 1
+    assert "suspicious band" in calls[0][1]["content"]
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+from agent_functions.score_transaction import score_transaction
+from agent_functions.score_transactions_batch import (
+    REASON_ABSOLUTE_AMOUNT,
+    REASON_RATIO_VERY_LARGE,
+    columns_from_records,
+    reasons_from_mask,
+    score_transactions_batch,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "tests_data")
+
+
+def load(name):
+    with open(os.path.join(DATA_DIR, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def assert_parity(txs, clients):
+    """Batch scores must equal score_transaction row by row, reasons included"""
+    batch = score_transactions_batch(**columns_from_records(txs, clients))
+
+    for i, (tx, client) in enumerate(zip(txs, clients)):
+        expected = json.loads(score_transaction(json.dumps(tx), json.dumps(client) if client else None))
+        status = client["client"].get("account_status") if client and client.get("found") else None
+
+        assert batch["score"][i] == expected["score"], (tx, client)
+        assert batch["classification"][i] == expected["classification"], (tx, client)
+        assert reasons_from_mask(int(batch["reasons"][i]), batch["ratio"][i], status) == expected["reasons"]
+
+
+def test_parity_on_fixtures():
+    client = load("client_data.json")
+    tx = load("transaction_data.json")
+    amounts = [tx["amount"], 0, 50, 2000, 4000, 9999.99, 10000, 15000, 20000, 1e6]
+    txs = [{**tx, "amount": amount} for amount in amounts]
+
+    assert_parity(txs, [client] * len(txs))
+    assert_parity(txs, [None] * len(txs))
+    assert_parity(txs, [{"found": False}] * len(txs))
+
+
+def test_parity_on_random_inputs():
+    rng = random.Random(15)
+    statuses = ["active", "ACTIVE", "suspended", "Blocked", "closed", "pending", None, ""]
+    txs, clients = [], []
+    for _ in range(5000):
+        amount = rng.choice([
+            rng.uniform(0, 2000),
+            rng.uniform(0, 200000),
+            rng.choice([0, 999.99, 1000, 4999.99, 5000, 9999.99, 10000]),
+            None,
+        ])
+        txs.append({"amount": amount})
+        if rng.random() < 0.2:
+            clients.append(rng.choice([None, {"found": False}]))
+            continue
+        mean_sum = rng.choice([rng.uniform(0, 5000), 0, None, 500, 1000])
+        if mean_sum and amount and rng.random() < 0.1:
+            # Hit the ratio thresholds exactly
+            amount = txs[-1]["amount"] = mean_sum * rng.choice([2, 4, 10])
+        clients.append({"found": True, "client": {
+            "mean_sum": mean_sum,
+            "risk_score": rng.choice([rng.uniform(0, 100), 0, None, 100, 150]),
+            "account_status": rng.choice(statuses),
+        }})
+
+    assert_parity(txs, clients)
+
+
+def test_batch_output_shapes_and_masks():
+    result = score_transactions_batch(
+        amount=[50.0, 20000.0],
+        mean_sum=[1000.0, 1000.0],
+        risk_score=[0.0, 0.0],
+        account_status=[0, 0],
+        found=[True, True],
+    )
+    assert result["score"].tolist() == [0.0, 80.0]
+    assert result["classification"].tolist() == ["ok", "fraud"]
+    assert result["reasons"].tolist() == [0, REASON_RATIO_VERY_LARGE | REASON_ABSOLUTE_AMOUNT]
+    assert result["ratio"][1] == pytest.approx(20.0)
+
+
+def test_zero_mean_sum_gives_infinite_ratio():
+    result = score_transactions_batch(amount=[10.0, 0.0], mean_sum=[0.0, 0.0], risk_score=[0.0, 0.0],
+                                      account_status=[0, 0], found=[True, True])
+    assert np.isinf(result["ratio"][0]) and result["ratio"][1] == 0.0
+    assert result["score"].tolist() == [60.0, 0.0]
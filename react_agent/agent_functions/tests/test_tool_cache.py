@@ -0,0 +1,90 @@
+import json
+from pathlib import Path
+
+from agent import ReACTAgent
+from agent_functions.agent_tools import run_tool
+from agent_functions.tool_cache import ToolCache, cache_key
+from agent_functions.score_transaction import score_transaction
+
+DATA_DIR = Path(__file__).parent / "tests_data"
+XML = (DATA_DIR / "transaction_example.xml").read_text(encoding="utf-8")
+CLIENT_JSON = (DATA_DIR / "client_data.json").read_text(encoding="utf-8")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_normalizes_arguments():
+    def lookup(iban, extra=None):
+        pass
+
+    assert cache_key("lookup", lookup, ("X",)) == cache_key("lookup", lookup, (), {"iban": " X "})
+    assert cache_key("score", score_transaction, ('{"b": 1, "a": 2}',)) == \
+        cache_key("score", score_transaction, (), {"tx_json": '{ "a": 2,\n "b": 1 }'})
+    assert cache_key("lookup", lookup, ("X",)) != cache_key("lookup", lookup, ("Y",))
+
+
+def test_policies_ttl_and_errors():
+    clock = FakeClock()
+    cache = ToolCache({"pure": None, "lookup": 10.0}, clock=clock)
+    calls = []
+
+    def tool(value):
+        calls.append(value)
+        return json.dumps({"value": value})
+
+    for _ in range(3):
+        cache.call("pure", tool, "a")
+        cache.call("lookup", tool, "b")
+        cache.call("create_alert", tool, "c")
+    assert calls == ["a", "b", "c", "c", "c"]
+
+    clock.now = 11.0
+    cache.call("pure", tool, "a")
+    cache.call("lookup", tool, "b")
+    assert calls[-1] == "b" and cache.expired == 1
+
+    assert cache.call("pure", lambda value: '{"error": "db down"}', "e") == '{"error": "db down"}'
+    assert cache.call("pure", tool, "e") == '{"value": "e"}'
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (5, 5)
+    assert stats["by_tool"] == {"lookup": {"hits": 2, "misses": 2}, "pure": {"hits": 3, "misses": 3}}
+
+
+def test_run_tool_with_cache():
+    cache = ToolCache()
+    tx = json.loads(run_tool("parse_transaction", XML, cache=cache))
+    again = json.loads(run_tool("parse_transaction", xml_string="\n" + XML, cache=cache))
+    assert tx == again and cache.stats()["hits"] == 1
+
+
+def test_repeated_agent_calls_hit_the_cache(monkeypatch, capsys):
+    lookups = []
+
+    def get_client(iban):
+        lookups.append(iban)
+        return CLIENT_JSON
+
+    agent = ReACTAgent(tool_cache=ToolCache())
+    monkeypatch.setitem(agent.tools, "get_client_by_iban", get_client)
+    replies = iter([
+        'Action: parse_transaction(xml_string="xml#1")',
+        'Action: get_client_by_iban(iban="NO9386011117947")',
+        'Action: get_client_by_iban("NO9386011117947")',
+        'Action: parse_transaction(xml_string="xml#1")',
+        "Final Answer: done",
+    ])
+    monkeypatch.setattr(agent, "_call_ollama", lambda messages: next(replies))
+    stats = {}
+
+    assert agent.analyze_transaction(XML, stats=stats) == "done"
+
+    assert lookups == ["NO9386011117947"]
+    assert stats == {"iterations": 5, "wasted": 0, "cache_hits": 2, "cache_misses": 2}
+    assert "Tool cache: 2 hits / 2 misses this run" in capsys.readouterr().out
@@ -0,0 +1,139 @@
+"""
+Memoization of agent tool results
+
+The model often repeats a tool call it already made (parse the same XML
+again, look up the same IBAN twice). ToolCache keys each call on the tool
+name plus its normalized arguments and replays the stored result instead of
+running the tool again. Whether and for how long a tool is cached is set per
+tool in TOOL_CACHE_POLICIES.
+"""
+
+import inspect
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Tool name -> seconds a result stays valid (None: forever). Tools not listed
+# (create_alert) have side effects and are never cached.
+TOOL_CACHE_POLICIES = {
+    "parse_transaction": None,
+    "score_transaction": None,
+    "get_client_by_iban": 30.0,
+}
+
+
+def _normalize(value: Any) -> Any:
+    """Canonical form of one argument: JSON re-serialized with sorted keys, other strings stripped"""
+    if isinstance(value, str):
+        text = value.strip()
+        if text[:1] in ("{", "["):
+            try:
+                return json.dumps(json.loads(text), sort_keys=True, separators=(",", ":"))
+            except ValueError:
+                pass
+        return text
+    try:
+        return json.dumps(value, sort_keys=True, separators=(",", ":"))
+    except TypeError:
+        return repr(value)
+
+
+def cache_key(tool_name: str, func: Callable, args: tuple = (), kwargs: Optional[Dict[str, Any]] = None) -> Tuple:
+    """
+    (tool_name, ((param, normalized value), ...)) with positional arguments
+    bound to their parameter names and defaults filled in, so
+    get_client_by_iban("X") and get_client_by_iban(iban=" X ") share a key
+
+    Raises TypeError when the arguments don't fit the signature.
+    """
+    bound = inspect.signature(func).bind(*args, **(kwargs or {}))
+    bound.apply_defaults()
+    return tool_name, tuple((name, _normalize(value)) for name, value in bound.arguments.items())
+
+
+class ToolCache:
+    """
+    Thread-safe tool result cache following TOOL_CACHE_POLICIES
+
+    Only successful results are stored: a JSON object with an "error" key
+    (e.g. a database failure in get_client_by_iban) is returned but not kept.
+    Hits and misses are counted per tool.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Optional[float]]] = None, clock=time.monotonic):
+        self.policies = TOOL_CACHE_POLICIES if policies is None else policies
+        self.clock = clock
+        self._entries: Dict[Tuple, Tuple[Optional[float], str]] = {}
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cacheable(self, tool_name: str) -> bool:
+        return tool_name in self.policies
+
+    def get(self, key: Tuple) -> Optional[str]:
+        """Cached result for key, or None (counted as a miss)"""
+        tool_name = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            counts = self.misses if entry is None else self.hits
+            counts[tool_name] = counts.get(tool_name, 0) + 1
+            return None if entry is None else entry[1]
+
+    def put(self, key: Tuple, result: str):
+        ttl = self.policies.get(key[0])
+        try:
+            if "error" in json.loads(result):
+                return
+        except (TypeError, ValueError):
+            pass
+        with self._lock:
+            self._entries[key] = (None if ttl is None else self.clock() + ttl, result)
+
+    def call(self, tool_name: str, func: Callable, *args, stats: Optional[Dict[str, int]] = None, **kwargs) -> str:
+        """
+        func(*args, **kwargs) through the cache
+
+        stats, when given, also gets this call counted under "cache_hits" or
+        "cache_misses" (per-conversation counts; the totals are in stats()).
+        """
+        if not self.cacheable(tool_name):
+            return func(*args, **kwargs)
+        key = cache_key(tool_name, func, args, kwargs)
+        result = self.get(key)
+        if stats is not None:
+            outcome = "cache_misses" if result is None else "cache_hits"
+            stats[outcome] = stats.get(outcome, 0) + 1
+        if result is None:
+            result = func(*args, **kwargs)
+            self.put(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def counts(self) -> Tuple[int, int]:
+        """(hits, misses) over every tool"""
+        return sum(self.hits.values()), sum(self.misses.values())
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self.counts()
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "expired": self.expired,
+            "by_tool": {name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)}
+                        for name in sorted(set(self.hits) | set(self.misses))},
+        }
@@ -0,0 +1,336 @@
+"""
+Batch runner for the ReACT Agent
+Analyzes a directory of XML files or a Kafka topic with many agent conversations in flight
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from kafka import ConsumerRebalanceListener, KafkaConsumer
+from kafka.errors import KafkaError
+from kafka.structs import OffsetAndMetadata
+
+from agent import MAX_ITERATIONS_REACHED, ReACTAgent
+from agent_functions.create_alert import alert_writer
+from agent_functions.get_client_by_iban import party_cache
+from agent_functions.prescreen import Prescreener
+from agent_functions.tool_cache import TOOL_CACHE_POLICIES, ToolCache
+import config
+
+
+async def directory_source(path: str) -> AsyncIterator[Tuple[str, str]]:
+    """Yield (file name, xml) for every *.xml file in path"""
+    for file in sorted(Path(path).glob("*.xml")):
+        yield file.name, file.read_text(encoding="utf-8")
+
+
+class OffsetTracker:
+    """
+    Kafka offsets that are safe to commit, per partition
+
+    Conversations finish out of order, so a partition's offset only moves
+    past a message once that message and every earlier one of the partition
+    have been analyzed. After a crash, every message whose analysis had not
+    finished is delivered again, along with finished ones behind it.
+    started() and done() run on the event loop; take() and revoke() run in
+    the polling thread.
+    """
+
+    def __init__(self):
+        # tp -> [offset, done] per message in flight, in offset order
+        self._in_flight: Dict[Any, deque] = {}
+        self._by_name: Dict[str, Tuple[Any, list]] = {}
+        # tp -> next offset to consume, not committed yet
+        self._committable: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def started(self, name: str, tp, offset: int):
+        """Register a delivered message; a redelivery of one still in flight is ignored"""
+        with self._lock:
+            if name in self._by_name:
+                return
+            entry = [offset, False]
+            self._in_flight.setdefault(tp, deque()).append(entry)
+            self._by_name[name] = (tp, entry)
+
+    def done(self, name: str):
+        """Mark a message analyzed; unknown names (other sources, revoked partitions) are ignored"""
+        with self._lock:
+            tp, entry = self._by_name.pop(name, (None, None))
+            if entry is None:
+                return
+            entry[1] = True
+            queue = self._in_flight[tp]
+            next_offset = None
+            while queue and queue[0][1]:
+                next_offset = queue.popleft()[0] + 1
+            if next_offset is not None:
+                self._committable[tp] = next_offset
+
+    def revoke(self, partitions):
+        """
+        Forget the messages of partitions this consumer no longer owns
+
+        Their new owner (possibly this consumer again) re-reads them from the
+        committed offset, so the analyses still running for them must not
+        move that offset any more.
+        """
+        partitions = set(partitions)
+        with self._lock:
+            for tp in partitions:
+                self._in_flight.pop(tp, None)
+                self._committable.pop(tp, None)
+            self._by_name = {name: value for name, value in self._by_name.items() if value[0] not in partitions}
+
+    def take(self) -> Dict[Any, int]:
+        """Offsets to commit now, by partition; cleared once taken"""
+        with self._lock:
+            offsets, self._committable = self._committable, {}
+        return offsets
+
+
+def commit_offsets(consumer, tracker: OffsetTracker) -> bool:
+    """
+    Commit the tracker's finished offsets; a failed commit is only reported
+
+    A later commit of the partition covers the same messages, and without
+    one they are analyzed again after a restart.
+    """
+    offsets = tracker.take()
+    if not offsets:
+        return True
+    try:
+        consumer.commit({tp: OffsetAndMetadata(offset, None) for tp, offset in offsets.items()})
+        return True
+    except KafkaError as e:
+        print(f"✗ Offset commit failed, the messages will be re-read: {type(e).__name__}: {e}")
+        return False
+
+
+class TrackerRebalanceListener(ConsumerRebalanceListener):
+    """
+    Commits the finished offsets of revoked partitions, then drops them from the tracker
+
+    Without this, a partition handed back to the same consumer is redelivered
+    from its committed offset while the old messages are still in flight,
+    and the partition would never commit again.
+    """
+
+    def __init__(self, consumer, tracker: OffsetTracker):
+        self.consumer = consumer
+        self.tracker = tracker
+
+    def on_partitions_revoked(self, revoked):
+        commit_offsets(self.consumer, self.tracker)
+        self.tracker.revoke(revoked)
+
+    def on_partitions_assigned(self, assigned):
+        pass
+
+
+async def kafka_source(consumer, idle_timeout: Optional[float] = None, poll_timeout_ms: int = 1000,
+                       tracker: Optional[OffsetTracker] = None) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Yield ("topic:partition:offset", xml) from a KafkaConsumer
+
+    Polls in a worker thread so the event loop keeps serving conversations.
+    Runs until cancelled, or until no message arrived for idle_timeout seconds.
+    With a tracker (and enable_auto_commit=False), every yielded message is
+    registered in it and the offsets finished since the last poll are
+    committed right before the next one, from the same thread: the consumer
+    is not thread-safe. Subscribe with a TrackerRebalanceListener so revoked
+    partitions leave the tracker.
+    """
+    def commit_and_poll():
+        if tracker is not None:
+            commit_offsets(consumer, tracker)
+        return consumer.poll(timeout_ms=poll_timeout_ms)
+
+    last_message = time.monotonic()
+    while True:
+        records = await asyncio.to_thread(commit_and_poll)
+        if records:
+            last_message = time.monotonic()
+        elif idle_timeout is not None and time.monotonic() - last_message >= idle_timeout:
+            return
+        for tp, messages in records.items():
+            for message in messages:
+                name = f"{tp.topic}:{tp.partition}:{message.offset}"
+                if tracker is not None:
+                    tracker.started(name, tp, message.offset)
+                yield name, message.value.decode("utf-8")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+class BatchRunner:
+    """Runs one agent conversation per transaction, at most `concurrency` at a time"""
+
+    def __init__(self, agent: ReACTAgent, concurrency: int = 8, max_iterations: Optional[int] = None,
+                 on_done: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            agent: Agent whose prompt, tools and pre-screen every conversation uses
+            concurrency: Max conversations in flight (also the HTTP connection pool size)
+            max_iterations: Iteration budget per conversation (default: agent.max_iterations)
+            on_done: Called with the name of every transaction once its
+                conversation has ended, with an answer or an error (optional)
+        """
+        self.agent = agent
+        self.concurrency = concurrency
+        self.max_iterations = max_iterations
+        self.on_done = on_done
+        self.results: List[Dict[str, Any]] = []
+        self.elapsed = 0.0
+
+    async def _analyze(self, session, semaphore, name: str, xml: str):
+        start = time.perf_counter()
+        result = {"name": name, "answer": None, "error": None, "iterations": 0, "wasted": 0}
+        try:
+            result["answer"] = await self.agent.aanalyze_transaction(xml, session, self.max_iterations, result)
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            result["seconds"] = time.perf_counter() - start
+            self.results.append(result)
+            if self.on_done is not None:
+                self.on_done(name)
+            semaphore.release()
+            if self.agent.verbose:
+                print(f"{name}: {result['error'] or result['answer']} ({result['seconds']:.2f}s)")
+
+    async def run(self, source: AsyncIterator[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Analyze every (name, xml) from source
+
+        Reading from source waits for a free slot, so a live topic is not
+        drained into memory faster than it is analyzed.
+
+        Returns:
+            One dict per transaction with "name", "answer", "error", "seconds",
+            and the LLM "iterations" used and "wasted" on unusable responses
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        start = time.perf_counter()
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = set()
+            async for name, xml in source:
+                await semaphore.acquire()
+                task = asyncio.create_task(self._analyze(session, semaphore, name, xml))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        self.elapsed = time.perf_counter() - start
+        return self.results
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = [r["seconds"] for r in self.results]
+        return {
+            "transactions": len(self.results),
+            "errors": sum(1 for r in self.results if r["error"]),
+            "budget_exhausted": sum(1 for r in self.results if r["answer"] == MAX_ITERATIONS_REACHED),
+            "iterations": sum(r["iterations"] for r in self.results),
+            "wasted_iterations": sum(r["wasted"] for r in self.results),
+            "wasted_per_tx": sum(r["wasted"] for r in self.results) / len(self.results) if self.results else 0.0,
+            "tx_per_min": len(self.results) / self.elapsed * 60 if self.elapsed else 0.0,
+            "p50_seconds": percentile(latencies, 50),
+            "p95_seconds": percentile(latencies, 95),
+        }
+
+    def report(self) -> str:
+        """One-line throughput / latency summary"""
+        s = self.stats()
+        return (f"Batch: {s['transactions']} transactions in {self.elapsed:.1f}s "
+                f"({s['tx_per_min']:.1f} tx/min, concurrency {self.concurrency}); "
+                f"latency p50 {s['p50_seconds']:.2f}s, p95 {s['p95_seconds']:.2f}s; "
+                f"{s['errors']} errors, {s['budget_exhausted']} out of iterations; "
+                f"{s['wasted_iterations']}/{s['iterations']} LLM iterations wasted ({s['wasted_per_tx']:.2f} per tx)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze many transactions concurrently with the ReACT agent")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('directory', nargs='?', help="directory of pain.001 XML files")
+    source.add_argument('--kafka-topic', help="Kafka topic of pain.001 XML messages")
+    parser.add_argument('--bootstrap-servers', default=config.KAFKA_BOOTSTRAP_SERVERS)
+    parser.add_argument('--group-id', default=config.KAFKA_GROUP_ID)
+    parser.add_argument('--idle-timeout', type=float, default=None,
+                        help="stop after this many seconds without Kafka messages (default: run forever)")
+    parser.add_argument('--concurrency', type=int, default=config.AGENT_CONCURRENCY)
+    parser.add_argument('--max-iterations', type=int, default=config.MAX_ITERATIONS,
+                        help="iteration budget per conversation")
+    args = parser.parse_args()
+
+    agent = ReACTAgent(
+        model=config.OLLAMA_MODEL,
+        ollama_url=config.OLLAMA_URL,
+        max_iterations=args.max_iterations,
+        verbose=config.VERBOSE,
+        api_key=config.OLLAMA_API_KEY,
+        prescreener=Prescreener() if config.PRESCREEN else None,
+        stream=config.OLLAMA_STREAM,
+        keep_alive=config.OLLAMA_KEEP_ALIVE or None,
+        compact=config.COMPACT_OBSERVATIONS,
+        native_tools=config.NATIVE_TOOLS,
+        handles=config.AGENT_HANDLES,
+        tool_cache=ToolCache({**TOOL_CACHE_POLICIES, "get_client_by_iban": config.TOOL_CACHE_CLIENT_TTL})
+        if config.TOOL_CACHE else None
+    )
+    try:
+        print(f"Party cache warmed with {party_cache.warm()} parties")
+    except Exception as e:
+        print(f"Party cache not warmed ({e}); falling back to per-IBAN lookups")
+
+    consumer = tracker = None
+    if args.kafka_topic:
+        # Offsets are committed by kafka_source once the analysis of a message
+        # (and of every earlier one in its partition) has finished
+        consumer = KafkaConsumer(
+            bootstrap_servers=args.bootstrap_servers,
+            group_id=args.group_id,
+            auto_offset_reset='earliest',
+            enable_auto_commit=False,
+        )
+        tracker = OffsetTracker()
+        consumer.subscribe([args.kafka_topic], listener=TrackerRebalanceListener(consumer, tracker))
+        messages = kafka_source(consumer, idle_timeout=args.idle_timeout, tracker=tracker)
+    else:
+        messages = directory_source(args.directory)
+
+    runner = BatchRunner(agent, concurrency=args.concurrency, on_done=tracker.done if tracker else None)
+    try:
+        asyncio.run(runner.run(messages))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if consumer is not None:
+            commit_offsets(consumer, tracker)
+            consumer.close()
+        print(runner.report())
+        if agent.prescreener is not None and agent.prescreener.screened:
+            print(agent.prescreener.report())
+        print(f"LLM usage: {agent.token_usage}")
+        print(f"Party cache: {party_cache.stats()}")
+        if agent.tool_cache is not None:
+            print(f"Tool cache: {agent.tool_cache.stats()}")
+        alert_writer.close()
+        print(f"Alert writer: {alert_writer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
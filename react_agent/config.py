@@ -9,9 +9,31 @@ OLLAMA_URL = os.environ.get("OLLAMA_URL", "https://ollama.com")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "gpt-oss:120b-cloud")
 OLLAMA_API_KEY = os.environ.get("OLLAMA_API_KEY", "9a430fe5f9734565876d821bb4b94212.H_q8zjKAtq0xMC7KAfqnWNsc")
 
+# Stream completions and stop reading at the first complete Action / Final Answer
+OLLAMA_STREAM = os.environ.get("OLLAMA_STREAM", "true").lower() == "true"
+# Keep the model and its cached prompt prefix loaded between requests (empty: Ollama default)
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# Send tool schemas in the "tools" field for native JSON tool calls (tool-capable models only)
+NATIVE_TOOLS = os.environ.get("NATIVE_TOOLS", "true").lower() == "true"
+
 # Agent Configuration
 MAX_ITERATIONS = int(os.environ.get("MAX_ITERATIONS", "10"))
+# Shrink superseded observations to the fields score_transaction uses
+COMPACT_OBSERVATIONS = os.environ.get("COMPACT_OBSERVATIONS", "true").lower() == "true"
+# Let the model pass short handles (tx#1, client#1) between tools instead of full payloads
+AGENT_HANDLES = os.environ.get("AGENT_HANDLES", "true").lower() == "true"
+# Replay repeated parse/score/client lookup calls from a cache (create_alert is never cached)
+TOOL_CACHE = os.environ.get("TOOL_CACHE", "true").lower() == "true"
+# Seconds a cached get_client_by_iban result stays valid
+TOOL_CACHE_CLIENT_TTL = float(os.environ.get("TOOL_CACHE_CLIENT_TTL", "30"))
 VERBOSE = os.environ.get("VERBOSE", "true").lower() == "true"
+# Decide clear-cut transactions with the rule engine and only escalate the rest to the LLM
+PRESCREEN = os.environ.get("PRESCREEN", "true").lower() == "true"
+
+# Batch Configuration (batch_agent.py)
+AGENT_CONCURRENCY = int(os.environ.get("AGENT_CONCURRENCY", "8"))
+KAFKA_BOOTSTRAP_SERVERS = os.environ.get("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+KAFKA_GROUP_ID = os.environ.get("KAFKA_GROUP_ID", "react-agent")
 
 # Database Configuration (inherited from bank_db)
 DATABASE_URL = os.environ.get(
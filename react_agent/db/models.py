@@ -35,6 +35,7 @@ class Alert(Base):
     __tablename__ = "alerts"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    alert_uid = Column(String(36), nullable=True, unique=True, index=True)  # client-generated uuid4
     created_at = Column(DateTime, default=datetime.utcnow)
     tx_summary = Column(JSON)
     client_summary = Column(JSON)
@@ -6,6 +6,10 @@ Demonstrates how to use the agent with real transaction data
 import sys
 from pathlib import Path
 from agent import ReACTAgent
+from agent_functions.prescreen import Prescreener
+from agent_functions.tool_cache import TOOL_CACHE_POLICIES, ToolCache
+from agent_functions.get_client_by_iban import party_cache
+from agent_functions.create_alert import alert_writer
 import config
 
 
@@ -28,29 +32,37 @@ def main():
         ollama_url=config.OLLAMA_URL,
         max_iterations=config.MAX_ITERATIONS,
         verbose=config.VERBOSE,
-        api_key=config.OLLAMA_API_KEY
+        api_key=config.OLLAMA_API_KEY,
+        prescreener=Prescreener() if config.PRESCREEN else None,
+        stream=config.OLLAMA_STREAM,
+        keep_alive=config.OLLAMA_KEEP_ALIVE or None,
+        compact=config.COMPACT_OBSERVATIONS,
+        native_tools=config.NATIVE_TOOLS,
+        handles=config.AGENT_HANDLES,
+        tool_cache=ToolCache({**TOOL_CACHE_POLICIES, "get_client_by_iban": config.TOOL_CACHE_CLIENT_TTL})
+        if config.TOOL_CACHE else None
     )
 
+    # Load the parties table into the lookup cache with one SELECT
+    try:
+        print(f"Party cache warmed with {party_cache.warm()} parties")
+    except Exception as e:
+        print(f"Party cache not warmed ({e}); falling back to per-IBAN lookups")
+
+    # Re-queue alerts spooled by a previous run that never reached the database
+    if alert_writer.spool_path:
+        try:
+            print(f"Recovered {alert_writer.recover()} spooled alerts")
+        except Exception as e:
+            print(f"Alert spool not recovered ({e})")
+
     # Check if transaction XML file is provided
     if len(sys.argv) > 1:
         # Use provided XML file
         xml_file = sys.argv[1]
         print(f"\nLoading transaction from: {xml_file}")
         transaction_xml = read_transaction_xml(xml_file)
-
-        task = f"""
-Analyze this banking transaction for fraud:
-
-{transaction_xml}
-
-Please:
-1. Parse the XML transaction to extract details
-2. Check if the debtor client exists in our database using their IBAN
-3. Check if the creditor client exists in our database using their IBAN
-4. Calculate a fraud risk score for this transaction
-5. If the score indicates 'suspicious' or 'fraud' classification, create an alert in the database
-6. Provide a summary of your findings
-"""
+        result = agent.analyze_transaction(transaction_xml)
     else:
         # Use default example task
         print("\nNo transaction file provided. Using example task.")
@@ -78,13 +90,23 @@ Please:
 6. Provide a summary of your findings
 """
 
-    # Run the agent
-    result = agent.run(task)
+        # Run the agent
+        result = agent.run(task)
 
     print("\n" + "="*80)
     print("EXECUTION COMPLETE")
     print("="*80)
     print(f"\nResult: {result}\n")
+    agent.close()
+    if agent.prescreener is not None and agent.prescreener.screened:
+        print(agent.prescreener.report())
+    print(f"LLM usage: {agent.token_usage}")
+    print(f"Iterations: {agent.iteration_stats}")
+    print(f"Party cache: {party_cache.stats()}")
+    if agent.tool_cache is not None:
+        print(f"Tool cache: {agent.tool_cache.stats()}")
+    alert_writer.close()
+    print(f"Alert writer: {alert_writer.stats()}")
 
 
 if __name__ == "__main__":
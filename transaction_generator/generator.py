@@ -10,36 +10,69 @@ import random
 import uuid
 from datetime import datetime, timedelta
 from decimal import Decimal
-from xml.etree.ElementTree import Element, SubElement, tostring
 from xml.dom import minidom
+from xml.sax.saxutils import escape
 
 from kafka import KafkaProducer
 from kafka.errors import KafkaError
 
 
+class Parties:
+    """
+    Loaded parties as two parallel lists of names and IBANs
+
+    A 10M-party file would take gigabytes as one dict per party, so the
+    per-party dict the XML template uses (pre-escaped values, country and
+    currency) is only built for the parties actually drawn.
+    """
+
+    __slots__ = ('names', 'ibans', 'currency_from_country')
+
+    def __init__(self, currency_from_country):
+        self.names = []
+        self.ibans = []
+        self.currency_from_country = currency_from_country
+
+    def append(self, name, iban):
+        self.names.append(name)
+        self.ibans.append(iban)
+
+    def __len__(self):
+        return len(self.ibans)
+
+    def __getitem__(self, index):
+        name, iban = self.names[index], self.ibans[index]
+        country = iban[:2] if len(iban) >= 2 else 'XX'
+        return {
+            'name': name,
+            'iban': iban,
+            # Pre-escaped for the XML template
+            'name_xml': escape(name),
+            'iban_xml': escape(iban),
+            'country': country,
+            'currency': self.currency_from_country(country)
+        }
+
+
 class TransactionGenerator:
     """Generates ISO 20022 pain.001.001.03 transactions"""
 
-    def __init__(self, parties_file='../data/parties.txt'):
+    def __init__(self, parties_file='../data/parties.txt', pretty=False):
         self.parties = self._load_parties(parties_file)
         self.namespace = "urn:iso:std:iso:20022:tech:xsd:pain.001.001.03"
         self.message_counter = 0
+        self.pretty = pretty
 
     def _load_parties(self, parties_file):
         """Load parties from CSV file"""
-        parties = []
+        parties = Parties(self._currency_from_country)
         try:
             with open(parties_file, 'r', encoding='utf-8') as f:
                 for line in f:
                     line = line.strip()
                     if line:
                         name, iban = line.split(',')
-                        parties.append({
-                            'name': name.strip(),
-                            'iban': iban.strip(),
-                            'country': iban[:2] if len(iban) >= 2 else 'XX',
-                            'currency': self._currency_from_country(iban[:2] if len(iban) >= 2 else 'XX')
-                        })
+                        parties.append(name.strip(), iban.strip())
         except FileNotFoundError:
             print(f"Error: Parties file not found at {parties_file}")
             sys.exit(1)
@@ -47,6 +80,9 @@ class TransactionGenerator:
         if not parties:
             print("Error: No parties loaded from file")
             sys.exit(1)
+        if all(iban == parties.ibans[0] for iban in parties.ibans):
+            print("Error: At least two parties with different IBANs are required")
+            sys.exit(1)
 
         print(f"Loaded {len(parties)} parties")
         return parties
@@ -61,118 +97,113 @@ class TransactionGenerator:
         }
         return mapping.get(country_iso, "EUR")
 
-    def generate_transaction_xml(self):
-        """Generate a single transaction in ISO 20022 XML format"""
-        self.message_counter += 1
-
-        # Select random debtor and creditor
-        debtor = random.choice(self.parties)
-        creditor = random.choice([p for p in self.parties if p['iban'] != debtor['iban']])
-
-        # Generate transaction details
+    def _random_amount(self):
+        """Draw a transaction amount"""
         # 90% of transactions: around 1000 with noise +-300-600
         # 10% of transactions: really big amounts (10,000 - 100,000)
         if random.random() < 0.9:
             noise = random.uniform(300, 600)
             if random.random() < 0.5:
-                amount = round(1000 + noise, 2)
-            else:
-                amount = round(1000 - noise, 2)
-        else:
-            amount = round(random.uniform(10000.0, 100000.0), 2)
+                return round(1000 + noise, 2)
+            return round(1000 - noise, 2)
+        return round(random.uniform(10000.0, 100000.0), 2)
 
-        currency = random.choice(["EUR", "USD", "GBP", "CHF", debtor['currency']])
-        timestamp = datetime.utcnow() - timedelta(seconds=random.randint(0, 86400))
+    def _random_creditor(self, debtor):
+        """Pick a random party other than the debtor"""
+        ibans = self.parties.ibans
+        while True:
+            index = random.randrange(len(ibans))
+            if ibans[index] != debtor['iban']:
+                return self.parties[index]
+
+    def generate_transaction_xml(self, num_transactions=1, pretty=None):
+        """
+        Generate a transaction message in ISO 20022 XML format
+
+        With num_transactions > 1 a bulk message is produced: one debtor pays
+        num_transactions random creditors from a single PmtInf, and NbOfTxs /
+        CtrlSum cover all of them. The fixed pain.001 skeleton is written
+        directly with escaped field values; pretty=True (default: the
+        generator's pretty setting) re-indents the result with minidom for
+        debugging.
+        """
+        self.message_counter += 1
+
+        # Select random debtor
+        debtor = random.choice(self.parties)
 
+        # Generate transaction details
+        cdt_trfs = []
+        ctrl_sum = Decimal(0)
+        for _ in range(num_transactions):
+            creditor = self._random_creditor(debtor)
+            amount = str(self._random_amount())
+            currency = random.choice(["EUR", "USD", "GBP", "CHF", debtor['currency']])
+            e2e_id = f"E2E-{uuid.uuid4().hex[:12]}"
+            ctrl_sum += Decimal(amount)
+
+            # Credit Transfer Transaction Information
+            cdt_trfs.append(
+                f'<CdtTrfTxInf>'
+                f'<PmtId><EndToEndId>{e2e_id}</EndToEndId></PmtId>'
+                f'<Amt><InstdAmt Ccy="{currency}">{amount}</InstdAmt></Amt>'
+                f'<Cdtr><Nm>{creditor["name_xml"]}</Nm></Cdtr>'
+                f'<CdtrAcct><Id><IBAN>{creditor["iban_xml"]}</IBAN></Id></CdtrAcct>'
+                f'</CdtTrfTxInf>'
+            )
+
+        timestamp = datetime.utcnow() - timedelta(seconds=random.randint(0, 86400))
         msg_id = f"MSG-{uuid.uuid4().hex[:8]}"
         pmt_inf_id = f"PmtInf-{self.message_counter}"
-        e2e_id = f"E2E-{uuid.uuid4().hex[:12]}"
-
-        # Build XML structure
-        root = Element('Document', xmlns=self.namespace)
-        cstmr = SubElement(root, 'CstmrCdtTrfInitn')
-
-        # Group Header
-        grp_hdr = SubElement(cstmr, 'GrpHdr')
-        SubElement(grp_hdr, 'MsgId').text = msg_id
-        SubElement(grp_hdr, 'CreDtTm').text = timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')
-        SubElement(grp_hdr, 'NbOfTxs').text = '1'
-        SubElement(grp_hdr, 'CtrlSum').text = str(amount)
-        initg_pty = SubElement(grp_hdr, 'InitgPty')
-        SubElement(initg_pty, 'Nm').text = debtor['name']
-
-        # Payment Information
-        pmt_inf = SubElement(cstmr, 'PmtInf')
-        SubElement(pmt_inf, 'PmtInfId').text = pmt_inf_id
-        SubElement(pmt_inf, 'PmtMtd').text = 'TRF'
-        SubElement(pmt_inf, 'NbOfTxs').text = '1'
-        SubElement(pmt_inf, 'CtrlSum').text = str(amount)
-
-        # Debtor
-        dbtr = SubElement(pmt_inf, 'Dbtr')
-        SubElement(dbtr, 'Nm').text = debtor['name']
-        dbtr_acct = SubElement(pmt_inf, 'DbtrAcct')
-        dbtr_id = SubElement(dbtr_acct, 'Id')
-        SubElement(dbtr_id, 'IBAN').text = debtor['iban']
-
-        # Credit Transfer Transaction Information
-        cdt_trf = SubElement(pmt_inf, 'CdtTrfTxInf')
-        pmt_id = SubElement(cdt_trf, 'PmtId')
-        SubElement(pmt_id, 'EndToEndId').text = e2e_id
-
-        # Amount
-        amt = SubElement(cdt_trf, 'Amt')
-        instd_amt = SubElement(amt, 'InstdAmt', Ccy=currency)
-        instd_amt.text = str(amount)
-
-        # Creditor
-        cdtr = SubElement(cdt_trf, 'Cdtr')
-        SubElement(cdtr, 'Nm').text = creditor['name']
-        cdtr_acct = SubElement(cdt_trf, 'CdtrAcct')
-        cdtr_id = SubElement(cdtr_acct, 'Id')
-        SubElement(cdtr_id, 'IBAN').text = creditor['iban']
-
-        # Convert to pretty XML string
-        xml_str = minidom.parseString(tostring(root, encoding='utf-8')).toprettyxml(indent="  ")
+
+        xml_str = (
+            f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<Document xmlns="{self.namespace}"><CstmrCdtTrfInitn>'
+            # Group Header
+            f'<GrpHdr>'
+            f'<MsgId>{msg_id}</MsgId>'
+            f'<CreDtTm>{timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")}</CreDtTm>'
+            f'<NbOfTxs>{num_transactions}</NbOfTxs>'
+            f'<CtrlSum>{ctrl_sum}</CtrlSum>'
+            f'<InitgPty><Nm>{debtor["name_xml"]}</Nm></InitgPty>'
+            f'</GrpHdr>'
+            # Payment Information
+            f'<PmtInf>'
+            f'<PmtInfId>{pmt_inf_id}</PmtInfId>'
+            f'<PmtMtd>TRF</PmtMtd>'
+            f'<NbOfTxs>{num_transactions}</NbOfTxs>'
+            f'<CtrlSum>{ctrl_sum}</CtrlSum>'
+            # Debtor
+            f'<Dbtr><Nm>{debtor["name_xml"]}</Nm></Dbtr>'
+            f'<DbtrAcct><Id><IBAN>{debtor["iban_xml"]}</IBAN></Id></DbtrAcct>'
+            f'{"".join(cdt_trfs)}'
+            f'</PmtInf>'
+            f'</CstmrCdtTrfInitn></Document>'
+        )
+
+        if pretty or (pretty is None and self.pretty):
+            xml_str = minidom.parseString(xml_str).toprettyxml(indent="  ")
 
         return xml_str
 
 
-def main():
-    """Main entry point"""
-    # Configuration
-    kafka_bootstrap_servers = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
-    kafka_topic = os.environ.get('KAFKA_TOPIC', 'unprocessed')
-    generation_interval = float(os.environ.get('GENERATION_INTERVAL', '2'))  # seconds
-    max_transactions = int(os.environ.get('MAX_TRANSACTIONS', '0'))  # 0 = infinite
+class DeliveryStats:
+    """Counts asynchronous Kafka deliveries reported through send callbacks"""
 
-    print("=" * 60)
-    print("Transaction Generator Starting")
-    print("=" * 60)
-    print(f"Kafka Servers: {kafka_bootstrap_servers}")
-    print(f"Topic: {kafka_topic}")
-    print(f"Interval: {generation_interval}s")
-    print(f"Max Transactions: {'infinite' if max_transactions == 0 else max_transactions}")
-    print("=" * 60)
+    def __init__(self):
+        self.delivered = 0
+        self.failed = 0
 
-    # Initialize generator
-    generator = TransactionGenerator()
+    def on_success(self, record_metadata):
+        self.delivered += 1
 
-    # Initialize Kafka producer
-    try:
-        producer = KafkaProducer(
-            bootstrap_servers=kafka_bootstrap_servers,
-            value_serializer=lambda v: v.encode('utf-8'),
-            acks='all',
-            retries=3,
-            max_in_flight_requests_per_connection=1
-        )
-        print("✓ Connected to Kafka")
-    except Exception as e:
-        print(f"✗ Failed to connect to Kafka: {e}")
-        sys.exit(1)
+    def on_error(self, exc):
+        self.failed += 1
+        print(f"✗ Failed to send transaction: {exc}")
 
-    # Generate and send transactions
+
+def run_sync(generator, producer, kafka_topic, generation_interval, max_transactions):
+    """Send one transaction at a time and wait for each broker acknowledgement"""
     transactions_sent = 0
     try:
         while True:
@@ -207,5 +238,135 @@ def main():
         print(f"✓ Sent {transactions_sent} transactions total")
 
 
+def run_bulk(generator, producer, kafka_topic, generation_interval, max_transactions,
+             txs_per_message, report_interval=5.0):
+    """
+    Pipeline sends without waiting for acknowledgements
+
+    Deliveries are counted by callbacks while the producer batches records
+    (linger_ms / batch_size), so throughput is bound by generation rather
+    than by broker round-trips.
+    """
+    stats = DeliveryStats()
+    messages_sent = 0
+    transactions_sent = 0
+    started = last_report = time.monotonic()
+    last_transactions = 0
+
+    try:
+        while max_transactions == 0 or transactions_sent < max_transactions:
+            num_transactions = txs_per_message
+            if max_transactions > 0:
+                num_transactions = min(num_transactions, max_transactions - transactions_sent)
+
+            xml_transaction = generator.generate_transaction_xml(num_transactions)
+            try:
+                producer.send(kafka_topic, value=xml_transaction) \
+                    .add_callback(stats.on_success) \
+                    .add_errback(stats.on_error)
+            except KafkaError as e:
+                print(f"✗ Failed to send transaction: {e}")
+                continue
+
+            messages_sent += 1
+            transactions_sent += num_transactions
+
+            now = time.monotonic()
+            if now - last_report >= report_interval:
+                rate = (transactions_sent - last_transactions) / (now - last_report)
+                print(f"[{transactions_sent}] {rate:,.0f} tx/s | messages sent {messages_sent} | "
+                      f"delivered {stats.delivered} | failed {stats.failed}")
+                last_report, last_transactions = now, transactions_sent
+
+            if generation_interval > 0:
+                time.sleep(generation_interval)
+
+        print(f"\n✓ Reached max transactions ({max_transactions}). Stopping.")
+
+    except KeyboardInterrupt:
+        print("\n\nShutting down gracefully...")
+    finally:
+        producer.flush()
+        producer.close()
+        elapsed = time.monotonic() - started
+        print(f"✓ Sent {transactions_sent} transactions in {messages_sent} messages total "
+              f"({transactions_sent / elapsed:,.0f} tx/s)")
+        print(f"  Delivered {stats.delivered} messages, failed {stats.failed}")
+
+
+def main():
+    """Main entry point"""
+    # Configuration
+    kafka_bootstrap_servers = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
+    kafka_topic = os.environ.get('KAFKA_TOPIC', 'unprocessed')
+    generator_mode = os.environ.get('GENERATOR_MODE', 'sync')
+    bulk = generator_mode == 'bulk'
+    generation_interval = float(os.environ.get('GENERATION_INTERVAL', '0' if bulk else '2'))  # seconds
+    max_transactions = int(os.environ.get('MAX_TRANSACTIONS', '0'))  # 0 = infinite
+    txs_per_message = int(os.environ.get('TXS_PER_MESSAGE', '1'))
+    linger_ms = int(os.environ.get('KAFKA_LINGER_MS', '20'))
+    batch_size = int(os.environ.get('KAFKA_BATCH_SIZE', str(256 * 1024)))
+    compression_type = os.environ.get('KAFKA_COMPRESSION') or None  # gzip, snappy, lz4, zstd
+    pretty_xml = os.environ.get('PRETTY_XML', 'false').lower() == 'true'  # debug only
+    parties_file = os.environ.get('PARTIES_FILE', '../data/parties.txt')
+
+    if generator_mode not in ('sync', 'bulk'):
+        print(f"Error: Unknown GENERATOR_MODE '{generator_mode}' (expected 'sync' or 'bulk')")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Transaction Generator Starting")
+    print("=" * 60)
+    print(f"Kafka Servers: {kafka_bootstrap_servers}")
+    print(f"Topic: {kafka_topic}")
+    print(f"Mode: {generator_mode}")
+    print(f"Interval: {generation_interval}s")
+    print(f"Max Transactions: {'infinite' if max_transactions == 0 else max_transactions}")
+    if pretty_xml:
+        print("Pretty XML: enabled (debug)")
+    if bulk:
+        print(f"Transactions per message: {txs_per_message}")
+        print(f"Producer: linger {linger_ms}ms, batch {batch_size} bytes, "
+              f"compression {compression_type or 'none'}")
+    print("=" * 60)
+
+    # Initialize generator
+    generator = TransactionGenerator(parties_file, pretty=pretty_xml)
+
+    # Initialize Kafka producer
+    if bulk:
+        producer_config = dict(
+            acks='all',
+            retries=3,
+            linger_ms=linger_ms,
+            batch_size=batch_size,
+            compression_type=compression_type,
+            max_in_flight_requests_per_connection=5
+        )
+    else:
+        producer_config = dict(
+            acks='all',
+            retries=3,
+            max_in_flight_requests_per_connection=1
+        )
+    try:
+        producer = KafkaProducer(
+            bootstrap_servers=kafka_bootstrap_servers,
+            value_serializer=lambda v: v.encode('utf-8'),
+            **producer_config
+        )
+        print("✓ Connected to Kafka")
+    except Exception as e:
+        print(f"✗ Failed to connect to Kafka: {e}")
+        sys.exit(1)
+
+    # Generate and send transactions
+    if bulk:
+        run_bulk(generator, producer, kafka_topic, generation_interval, max_transactions,
+                 max(1, txs_per_message))
+    else:
+        run_sync(generator, producer, kafka_topic, generation_interval, max_transactions)
+
+
 if __name__ == '__main__':
     main()
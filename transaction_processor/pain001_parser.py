@@ -0,0 +1,223 @@
+"""
+Streaming extractor for ISO 20022 pain.001.001.03 messages
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from decimal import Decimal
+
+PAIN001_NAMESPACE = "urn:iso:std:iso:20022:tech:xsd:pain.001.001.03"
+
+# Opening and closing CdtTrfTxInf tags with any namespace prefix
+CDT_TRF_TAG = re.compile(r'<(/?)(?:[\w.-]+:)?CdtTrfTxInf(?:\s[^>]*)?>')
+
+
+class ControlSumError(ValueError):
+    """NbOfTxs / CtrlSum of a message do not match its credit transfers"""
+
+
+def check_control_sum(scope, nb_of_txs, ctrl_sum, count, total):
+    """Validate declared NbOfTxs / CtrlSum (either may be None) against the parsed rows"""
+    if nb_of_txs is not None and int(nb_of_txs) != count:
+        raise ControlSumError(f"{scope} NbOfTxs is {nb_of_txs} but {count} transactions were found")
+    if ctrl_sum is not None and Decimal(ctrl_sum) != total:
+        raise ControlSumError(f"{scope} CtrlSum is {ctrl_sum} but transactions sum to {total}")
+
+
+class Pain001Extractor:
+    """
+    Extracts one field dict per CdtTrfTxInf from a pain.001 document
+
+    Only the GrpHdr, PmtInf and CdtTrfTxInf elements drive the extraction.
+    Each of them is read through its direct children, dispatched on
+    precomputed qualified tags, so no namespaced find() paths are evaluated:
+    leaf fields (MsgId, PmtInfId, NbOfTxs, ...) are taken from the child's
+    text and nested ones (Dbtr/Nm, CdtrAcct/Id/IBAN, PmtId/EndToEndId, ...)
+    from the first matching descendant of the child. The first occurrence of
+    a field within its scope wins.
+
+    Messages up to chunk_size characters, i.e. nearly every single-transaction
+    message, are parsed in one go with ET.fromstring(). Larger ones are fed to
+    an XMLPullParser in chunks and every completed CdtTrfTxInf and PmtInf is
+    cleared, which keeps memory flat for bulk files with thousands of credit
+    transfers.
+    """
+
+    def __init__(self, namespace=PAIN001_NAMESPACE, chunk_size=64 * 1024):
+        def q(tag):
+            return f"{{{namespace}}}{tag}"
+
+        self.chunk_size = chunk_size
+        self.root_tag = q('CstmrCdtTrfInitn')
+        self.grp_hdr_tag = q('GrpHdr')
+        self.pmt_inf_tag = q('PmtInf')
+        self.cdt_trf_tag = q('CdtTrfTxInf')
+
+        # Leaf children of GrpHdr / PmtInf / CdtTrfTxInf, mapped to their field
+        self.field_tags = {
+            q('MsgId'): 'msg_id',
+            q('CreDtTm'): 'cre_dt_tm',
+            q('NbOfTxs'): 'nb_of_txs',
+            q('CtrlSum'): 'ctrl_sum',
+            q('PmtInfId'): 'pmt_inf_id',
+            q('PmtMtd'): 'pmt_mtd',
+        }
+
+        # Container children, mapped to the (descendant tag, field) pairs they hold
+        self.nested_tags = {
+            q('Dbtr'): [(q('Nm'), 'dbtr_name')],
+            q('DbtrAcct'): [(q('IBAN'), 'dbtr_iban')],
+            q('PmtId'): [(q('InstrId'), 'instr_id'), (q('EndToEndId'), 'e2e_id')],
+            q('Amt'): [(q('InstdAmt'), 'amount')],
+            q('Cdtr'): [(q('Nm'), 'cdtr_name')],
+            q('CdtrAcct'): [(q('IBAN'), 'cdtr_iban')],
+        }
+
+    def _collect(self, section, scope):
+        """Add the fields held by the direct children of section to scope"""
+        field_tags = self.field_tags
+        nested_tags = self.nested_tags
+        for child in section:
+            tag = child.tag
+            key = field_tags.get(tag)
+            if key is not None:
+                if key not in scope:
+                    scope[key] = child.text
+                continue
+            targets = nested_tags.get(tag)
+            if targets is None:
+                continue
+            for leaf_tag, key in targets:
+                if key in scope:
+                    continue
+                leaf = next(child.iter(leaf_tag), None)
+                if leaf is not None:
+                    scope[key] = leaf.text
+                    if key == 'amount':
+                        scope['currency'] = leaf.get('Ccy')
+        return scope
+
+    def _tree_events(self, xml_string):
+        """(event, element) pairs iter_transactions acts on, from a fully parsed document"""
+        for root in ET.fromstring(xml_string).iter(self.root_tag):
+            for section in root:
+                if section.tag == self.pmt_inf_tag:
+                    yield 'start', section
+                    for cdt_trf in section.iterfind(self.cdt_trf_tag):
+                        yield 'end', cdt_trf
+                yield 'end', section
+            yield 'end', root
+
+    def _stream_events(self, xml_string):
+        """(event, element) pairs from an XMLPullParser fed chunk_size characters at a time"""
+        chunk_size = self.chunk_size
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        for offset in range(0, len(xml_string), chunk_size):
+            parser.feed(xml_string[offset:offset + chunk_size])
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+    def iter_transactions(self, xml_string):
+        """
+        Yield the raw text fields of every credit transfer in the message
+
+        Each dict merges the group header, its PmtInf and the CdtTrfTxInf
+        fields; the group header NbOfTxs / CtrlSum take precedence, and
+        'tx_index' is the 1-based position of the CdtTrfTxInf in its PmtInf.
+        For messages with more than one transaction the source text of the
+        CdtTrfTxInf is returned under 'raw_xml'. Raises ControlSumError once a
+        PmtInf or the whole message does not match its declared NbOfTxs /
+        CtrlSum.
+        """
+        if len(xml_string) > self.chunk_size:
+            events = self._stream_events(xml_string)
+        else:
+            events = self._tree_events(xml_string)
+
+        header = {}
+        pmt = pmt_el = None
+        fragments = None
+        found_root = False
+        pmt_count = pmt_total = 0
+        msg_count = msg_total = 0
+
+        collect = self._collect
+        cdt_trf_tag = self.cdt_trf_tag
+        pmt_inf_tag = self.pmt_inf_tag
+
+        for event, el in events:
+            tag = el.tag
+            if tag == cdt_trf_tag:
+                if event != 'end':
+                    continue
+                # PmtInf fields precede its credit transfers
+                if pmt is None:
+                    pmt = collect(pmt_el, {}) if pmt_el is not None else {}
+                tx = collect(el, {})
+                if header.get('nb_of_txs') != '1':
+                    if fragments is None:
+                        fragments = cdt_trf_fragments(xml_string)
+                    tx['raw_xml'] = next(fragments, None)
+                amount = Decimal(tx['amount']) if tx.get('amount') is not None else 0
+                pmt_count += 1
+                pmt_total += amount
+                msg_count += 1
+                msg_total += amount
+                tx['tx_index'] = pmt_count
+
+                fields = {**pmt, **tx}
+                fields.update(header)
+                yield fields
+                el.clear()
+            elif tag == pmt_inf_tag:
+                if event == 'start':
+                    pmt_el = el
+                    continue
+                if pmt is None:
+                    pmt = collect(el, {})
+                check_control_sum(f"PmtInf {pmt.get('pmt_inf_id')}", pmt.get('nb_of_txs'),
+                                  pmt.get('ctrl_sum'), pmt_count, pmt_total)
+                pmt = pmt_el = None
+                pmt_count = pmt_total = 0
+                el.clear()
+            elif event != 'end':
+                continue
+            elif tag == self.grp_hdr_tag:
+                collect(el, header)
+                header.setdefault('nb_of_txs', None)
+                header.setdefault('ctrl_sum', None)
+            elif tag == self.root_tag:
+                found_root = True
+
+        if not found_root:
+            raise ValueError("Invalid XML structure: CstmrCdtTrfInitn not found")
+        check_control_sum("Message", header.get('nb_of_txs'), header.get('ctrl_sum'),
+                          msg_count, msg_total)
+
+
+def cdt_trf_fragments(xml_string):
+    """
+    Yield the source text of every CdtTrfTxInf element, in document order
+
+    The text is sliced out of the message as it was received instead of
+    re-serializing the parsed element, so it keeps its original namespace
+    prefixes (and inherits the default namespace of the Document).
+    """
+    start = None
+    for match in CDT_TRF_TAG.finditer(xml_string):
+        if match.group(1):
+            if start is not None:
+                yield xml_string[start:match.end()]
+                start = None
+        else:
+            start = match.start()
+
+
+def parse_iso_datetime(value):
+    """Parse a 'YYYY-MM-DDTHH:MM:SSZ' timestamp without going through strptime"""
+    if len(value) == 20 and value[4] == '-' and value[10] == 'T' and value[19] == 'Z':
+        return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                        int(value[11:13]), int(value[14:16]), int(value[17:19]))
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
@@ -3,24 +3,194 @@
 Transaction Processor - Consumes transactions from Kafka and loads to ClickHouse DW
 """
 
+import multiprocessing
 import os
+import signal
 import sys
+import time
 import xml.etree.ElementTree as ET
 from datetime import datetime
 from decimal import Decimal
 
-from kafka import KafkaConsumer
+from kafka import ConsumerRebalanceListener, KafkaConsumer
 from kafka.errors import KafkaError
+from kafka.structs import OffsetAndMetadata
 import clickhouse_connect
 
+from pain001_parser import (ControlSumError, Pain001Extractor, cdt_trf_fragments, check_control_sum,
+                            parse_iso_datetime)
+
+
+# Column order of the rows produced by parse_transactions / PartyAggregator
+TRANSACTION_COLUMNS = [
+    'transaction_id', 'message_id', 'end_to_end_id', 'payment_info_id',
+    'created_datetime', 'processing_datetime', 'amount', 'currency',
+    'debtor_name', 'debtor_iban', 'debtor_country',
+    'creditor_name', 'creditor_iban', 'creditor_country',
+    'payment_method', 'control_sum', 'num_transactions',
+    'raw_xml', 'processed_status',
+    'kafka_topic', 'kafka_partition', 'kafka_offset'
+]
+RAW_MESSAGE_COLUMNS = ['transaction_id', 'message_id', 'raw_xml']
+
+# Where the original XML of a transaction is kept:
+#   inline   - transactions.raw_xml (ZSTD compressed column)
+#   external - separate raw_messages table keyed by transaction_id
+#   none     - not stored, only the kafka_topic/partition/offset reference
+RAW_XML_STORAGE_MODES = ('inline', 'external', 'none')
+# Commit metadata prefix of a batch that is being inserted (see mark_pending)
+PENDING_MARKER = 'pending:'
+PARTY_COLUMNS = [
+    'iban', 'party_name', 'country', 'currency', 'last_seen',
+    'total_transactions', 'total_sent', 'total_received'
+]
+
+
+def transaction_id(fields):
+    """
+    Unique key of a credit transfer: MsgId / PmtInfId / InstrId
+
+    EndToEndId is chosen by the debtor and is often NOTPROVIDED or reused,
+    so it is kept in its own column only. Without an InstrId the position of
+    the CdtTrfTxInf in its PmtInf is used, which a replayed message repeats.
+    """
+    instr_id = fields.get('instr_id') or fields['tx_index']
+    return f"{fields['msg_id']}/{fields['pmt_inf_id']}/{instr_id}"
+
+
+class ColumnBuffer:
+    """Accumulates rows column by column for a single column-oriented insert"""
+
+    def __init__(self, column_names):
+        self.column_names = list(column_names)
+        self.columns = [[] for _ in self.column_names]
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def append(self, row):
+        """Append a row given as a dict keyed by column name"""
+        for column, name in zip(self.columns, self.column_names):
+            column.append(row[name])
+
+    def truncate(self, length):
+        """Drop the rows after the first length rows"""
+        for column in self.columns:
+            del column[length:]
+
+    def clear(self):
+        self.columns = [[] for _ in self.column_names]
+
+
+class PartyAggregator:
+    """
+    Per-IBAN running aggregate of party activity since the last flush
+
+    dim_parties is an AggregatingMergeTree that sums the counters and keeps
+    max(last_seen), so each flush only has to write one delta row per party
+    that changed instead of one row per debtor and creditor occurrence.
+    """
+
+    # Transaction columns a party update is computed from, in _add() order
+    SOURCE_COLUMNS = ('amount', 'currency', 'processing_datetime',
+                      'debtor_iban', 'debtor_name', 'debtor_country',
+                      'creditor_iban', 'creditor_name', 'creditor_country')
+
+    def __init__(self):
+        # iban -> [party_name, country, currency, last_seen, count, sent, received]
+        self.parties = {}
+
+    def __len__(self):
+        return len(self.parties)
+
+    def add(self, tx_data):
+        """Account a transaction to its debtor and creditor"""
+        self._add(*(tx_data[name] for name in self.SOURCE_COLUMNS))
+
+    def add_columns(self, transactions):
+        """Account every row of a transactions ColumnBuffer"""
+        columns = dict(zip(transactions.column_names, transactions.columns))
+        for values in zip(*(columns[name] for name in self.SOURCE_COLUMNS)):
+            self._add(*values)
+
+    def _add(self, amount, currency, seen, debtor_iban, debtor_name, debtor_country,
+             creditor_iban, creditor_name, creditor_country):
+        amount = Decimal(str(amount))
+        self._update(debtor_iban, debtor_name, debtor_country, currency, seen, amount, 0)
+        self._update(creditor_iban, creditor_name, creditor_country, currency, seen, 0, amount)
+
+    def _update(self, iban, name, country, currency, seen, sent, received):
+        party = self.parties.get(iban)
+        if party is None:
+            self.parties[iban] = [name, country, currency, seen, 1, sent, received]
+            return
+        party[0], party[1], party[2] = name, country, currency
+        if seen > party[3]:
+            party[3] = seen
+        party[4] += 1
+        party[5] += sent
+        party[6] += received
+
+    def columns(self):
+        """Changed parties as columns in PARTY_COLUMNS order"""
+        columns = [list(self.parties.keys())]
+        columns.extend(list(values) for values in zip(*self.parties.values()))
+        return columns
+
+    def clear(self):
+        self.parties = {}
+
+
+class PartitionBatch:
+    """
+    Rows read from one Kafka partition since its last flush
+
+    Every partition is flushed on its own, with a deduplication token built
+    from its own offset range, so reproducing a batch after a failure only
+    depends on where that one partition's batch was cut.
+    """
+
+    def __init__(self):
+        self.transactions = ColumnBuffer(TRANSACTION_COLUMNS)
+        self.raw_messages = ColumnBuffer(RAW_MESSAGE_COLUMNS)
+        self.offsets = None
+        self.started_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def track_offset(self, offset):
+        first = offset if self.offsets is None else self.offsets[0]
+        self.offsets = (first, offset)
+
 
 class TransactionProcessor:
     """Processes XML transactions and loads to data warehouse"""
 
-    def __init__(self, clickhouse_host, clickhouse_port, clickhouse_user, clickhouse_password):
+    def __init__(self, clickhouse_host, clickhouse_port, clickhouse_user, clickhouse_password,
+                 batch_size=1, batch_max_linger_ms=0, parser='fast', raw_xml_storage='inline',
+                 client=None):
         self.namespace = {"ns": "urn:iso:std:iso:20022:tech:xsd:pain.001.001.03"}
-        self.client = self._connect_clickhouse(clickhouse_host, clickhouse_port,
-                                                clickhouse_user, clickhouse_password)
+        if parser not in ('fast', 'etree'):
+            raise ValueError(f"Unknown parser: {parser}")
+        if raw_xml_storage not in RAW_XML_STORAGE_MODES:
+            raise ValueError(f"Unknown raw_xml storage: {raw_xml_storage}")
+        self.parser = parser
+        self.raw_xml_storage = raw_xml_storage
+        self.extractor = Pain001Extractor(self.namespace['ns'])
+        # An already connected client can be injected (e.g. for benchmarks)
+        self.client = client or self._connect_clickhouse(clickhouse_host, clickhouse_port,
+                                                          clickhouse_user, clickhouse_password)
+
+        # Micro-batching state: a PartitionBatch per (topic, partition), under
+        # None for rows without a Kafka source
+        self.batch_size = max(1, batch_size)
+        self.batch_max_linger = batch_max_linger_ms / 1000.0
+        self.batches = {}
+        # (topic, partition) -> last offset of a batch being re-read, which
+        # has to be cut at the same offset again to get the same token
+        self.replay_cuts = {}
+        self.insert_calls = 0
 
     def _connect_clickhouse(self, host, port, user, password):
         """Connect to ClickHouse data warehouse"""
@@ -38,89 +208,175 @@ class TransactionProcessor:
             print(f"✗ Failed to connect to ClickHouse: {e}")
             sys.exit(1)
 
-    def parse_transaction(self, xml_string):
-        """Parse ISO 20022 XML transaction"""
+    def parse_transactions(self, xml_string):
+        """
+        Parse an ISO 20022 XML message into a list of transaction rows
+
+        Returns None if the message is invalid or its NbOfTxs / CtrlSum do
+        not match the credit transfers it holds.
+        """
         try:
-            root = ET.fromstring(xml_string)
-
-            # Navigate through the XML structure
-            cstmr = root.find('ns:CstmrCdtTrfInitn', self.namespace)
-            if cstmr is None:
-                raise ValueError("Invalid XML structure: CstmrCdtTrfInitn not found")
-
-            # Parse Group Header
-            grp_hdr = cstmr.find('ns:GrpHdr', self.namespace)
-            msg_id = grp_hdr.find('ns:MsgId', self.namespace).text
-            cre_dt_tm = grp_hdr.find('ns:CreDtTm', self.namespace).text
-            nb_of_txs = int(grp_hdr.find('ns:NbOfTxs', self.namespace).text)
-            ctrl_sum = Decimal(grp_hdr.find('ns:CtrlSum', self.namespace).text)
-
-            # Parse Payment Information
-            pmt_inf = cstmr.find('ns:PmtInf', self.namespace)
-            pmt_inf_id = pmt_inf.find('ns:PmtInfId', self.namespace).text
-            pmt_mtd = pmt_inf.find('ns:PmtMtd', self.namespace).text
-
-            # Parse Debtor
-            dbtr = pmt_inf.find('ns:Dbtr', self.namespace)
-            dbtr_name = dbtr.find('ns:Nm', self.namespace).text
-            dbtr_acct = pmt_inf.find('ns:DbtrAcct', self.namespace)
-            dbtr_iban = dbtr_acct.find('ns:Id/ns:IBAN', self.namespace).text
+            return list(self.iter_rows(xml_string))
+        except Exception as e:
+            self._report_invalid(e)
+            return None
 
-            # Parse Credit Transfer Transaction Info
-            cdt_trf = pmt_inf.find('ns:CdtTrfTxInf', self.namespace)
-            pmt_id = cdt_trf.find('ns:PmtId', self.namespace)
-            e2e_id = pmt_id.find('ns:EndToEndId', self.namespace).text
+    def iter_rows(self, xml_string):
+        """
+        Yield one transactions row per credit transfer of an ISO 20022 XML message
+
+        Rows are built as the parser reaches each CdtTrfTxInf. An invalid
+        message raises, possibly after some of its rows were yielded.
+        """
+        if self.parser == 'fast':
+            fields_iter = self.extractor.iter_transactions(xml_string)
+        else:
+            fields_iter = self._iter_transactions_etree(xml_string)
+
+        processing_datetime = datetime.utcnow()
+        build_row = self._build_row
+        for fields in fields_iter:
+            yield build_row(fields, xml_string, processing_datetime)
+
+    @staticmethod
+    def _report_invalid(error):
+        if isinstance(error, ControlSumError):
+            print(f"✗ Rejected message: {error}")
+        elif isinstance(error, KeyError):
+            print(f"✗ Error parsing transaction: missing element {error}")
+        else:
+            print(f"✗ Error parsing transaction: {error}")
+
+    def _iter_transactions_etree(self, xml_string):
+        """Yield the raw text fields of every credit transfer using namespaced find() lookups"""
+        root = ET.fromstring(xml_string)
+
+        # Navigate through the XML structure
+        cstmr = root.find('ns:CstmrCdtTrfInitn', self.namespace)
+        if cstmr is None:
+            raise ValueError("Invalid XML structure: CstmrCdtTrfInitn not found")
+
+        # Parse Group Header
+        grp_hdr = cstmr.find('ns:GrpHdr', self.namespace)
+        header = {
+            'msg_id': grp_hdr.find('ns:MsgId', self.namespace).text,
+            'cre_dt_tm': grp_hdr.find('ns:CreDtTm', self.namespace).text,
+            'nb_of_txs': grp_hdr.find('ns:NbOfTxs', self.namespace).text,
+            'ctrl_sum': grp_hdr.find('ns:CtrlSum', self.namespace).text,
+        }
+        msg_count, msg_total = 0, Decimal(0)
+        fragments = cdt_trf_fragments(xml_string)
+
+        # Parse Payment Information blocks
+        for pmt_inf in cstmr.findall('ns:PmtInf', self.namespace):
+            pmt = {
+                'pmt_inf_id': pmt_inf.find('ns:PmtInfId', self.namespace).text,
+                'pmt_mtd': pmt_inf.find('ns:PmtMtd', self.namespace).text,
+                'dbtr_name': pmt_inf.find('ns:Dbtr/ns:Nm', self.namespace).text,
+                'dbtr_iban': pmt_inf.find('ns:DbtrAcct/ns:Id/ns:IBAN', self.namespace).text,
+            }
+            pmt_count, pmt_total = 0, Decimal(0)
 
-            # Parse Amount
-            amt = cdt_trf.find('ns:Amt/ns:InstdAmt', self.namespace)
-            amount = Decimal(amt.text)
-            currency = amt.get('Ccy')
+            # Parse Credit Transfer Transaction Info
+            for cdt_trf in pmt_inf.findall('ns:CdtTrfTxInf', self.namespace):
+                amt = cdt_trf.find('ns:Amt/ns:InstdAmt', self.namespace)
+                instr_id = cdt_trf.find('ns:PmtId/ns:InstrId', self.namespace)
+                tx = {
+                    'e2e_id': cdt_trf.find('ns:PmtId/ns:EndToEndId', self.namespace).text,
+                    'amount': amt.text,
+                    'currency': amt.get('Ccy'),
+                    'cdtr_name': cdt_trf.find('ns:Cdtr/ns:Nm', self.namespace).text,
+                    'cdtr_iban': cdt_trf.find('ns:CdtrAcct/ns:Id/ns:IBAN', self.namespace).text,
+                }
+                if instr_id is not None:
+                    tx['instr_id'] = instr_id.text
+                if header['nb_of_txs'] != '1':
+                    tx['raw_xml'] = next(fragments, None)
+
+                pmt_count += 1
+                pmt_total += Decimal(amt.text)
+                tx['tx_index'] = pmt_count
+                yield {**pmt, **tx, **header}
+
+            nb_of_txs = pmt_inf.find('ns:NbOfTxs', self.namespace)
+            ctrl_sum = pmt_inf.find('ns:CtrlSum', self.namespace)
+            check_control_sum(f"PmtInf {pmt['pmt_inf_id']}",
+                              nb_of_txs.text if nb_of_txs is not None else None,
+                              ctrl_sum.text if ctrl_sum is not None else None,
+                              pmt_count, pmt_total)
+            msg_count += pmt_count
+            msg_total += pmt_total
+
+        check_control_sum("Message", header['nb_of_txs'], header['ctrl_sum'],
+                          msg_count, msg_total)
+
+    def _build_row(self, fields, xml_string, processing_datetime):
+        """Convert extracted text fields into a transactions row"""
+        dbtr_iban = fields['dbtr_iban']
+        cdtr_iban = fields['cdtr_iban']
+
+        return {
+            'transaction_id': transaction_id(fields),
+            'message_id': fields['msg_id'],
+            'end_to_end_id': fields['e2e_id'],
+            'payment_info_id': fields['pmt_inf_id'],
+            'created_datetime': parse_iso_datetime(fields['cre_dt_tm']),
+            'processing_datetime': processing_datetime,
+            'amount': float(fields['amount']),
+            'currency': fields['currency'],
+            'debtor_name': fields['dbtr_name'],
+            'debtor_iban': dbtr_iban,
+            # Extract country codes from IBANs
+            'debtor_country': dbtr_iban[:2] if len(dbtr_iban) >= 2 else 'XX',
+            'creditor_name': fields['cdtr_name'],
+            'creditor_iban': cdtr_iban,
+            'creditor_country': cdtr_iban[:2] if len(cdtr_iban) >= 2 else 'XX',
+            'payment_method': fields['pmt_mtd'],
+            'control_sum': float(fields['ctrl_sum']),
+            'num_transactions': int(fields['nb_of_txs']),
+            # Bulk messages keep only the CdtTrfTxInf fragment of each transaction
+            'raw_xml': fields.get('raw_xml', xml_string),
+            'processed_status': 'SUCCESS',
+            # Source reference, filled in by add_to_batch when consuming from Kafka
+            'kafka_topic': '',
+            'kafka_partition': 0,
+            'kafka_offset': 0
+        }
 
-            # Parse Creditor
-            cdtr = cdt_trf.find('ns:Cdtr', self.namespace)
-            cdtr_name = cdtr.find('ns:Nm', self.namespace).text
-            cdtr_acct = cdt_trf.find('ns:CdtrAcct', self.namespace)
-            cdtr_iban = cdtr_acct.find('ns:Id/ns:IBAN', self.namespace).text
+    def _detach_raw_xml(self, transaction_data):
+        """
+        Apply the raw_xml storage mode to a row
 
-            # Parse timestamp
-            created_datetime = datetime.strptime(cre_dt_tm, '%Y-%m-%dT%H:%M:%SZ')
+        Returns the raw_messages row for external storage, otherwise None. In
+        external and none mode the row's own raw_xml is blanked.
+        """
+        if self.raw_xml_storage == 'inline':
+            return None
 
-            # Extract country codes from IBANs
-            debtor_country = dbtr_iban[:2] if len(dbtr_iban) >= 2 else 'XX'
-            creditor_country = cdtr_iban[:2] if len(cdtr_iban) >= 2 else 'XX'
-
-            return {
-                'transaction_id': e2e_id,
-                'message_id': msg_id,
-                'end_to_end_id': e2e_id,
-                'payment_info_id': pmt_inf_id,
-                'created_datetime': created_datetime,
-                'processing_datetime': datetime.utcnow(),
-                'amount': float(amount),
-                'currency': currency,
-                'debtor_name': dbtr_name,
-                'debtor_iban': dbtr_iban,
-                'debtor_country': debtor_country,
-                'creditor_name': cdtr_name,
-                'creditor_iban': cdtr_iban,
-                'creditor_country': creditor_country,
-                'payment_method': pmt_mtd,
-                'control_sum': float(ctrl_sum),
-                'num_transactions': nb_of_txs,
-                'raw_xml': xml_string,
-                'processed_status': 'SUCCESS'
+        raw_message = None
+        if self.raw_xml_storage == 'external':
+            raw_message = {
+                'transaction_id': transaction_data['transaction_id'],
+                'message_id': transaction_data['message_id'],
+                'raw_xml': transaction_data['raw_xml']
             }
-
-        except Exception as e:
-            print(f"✗ Error parsing transaction: {e}")
-            return None
+        transaction_data['raw_xml'] = ''
+        return raw_message
 
     def load_to_warehouse(self, transaction_data):
         """Load parsed transaction to ClickHouse"""
         try:
+            raw_message = self._detach_raw_xml(transaction_data)
+
             # Insert transaction
             self.client.insert('transactions', [list(transaction_data.values())],
                              column_names=list(transaction_data.keys()))
+            self.insert_calls += 1
+
+            if raw_message is not None:
+                self.client.insert('raw_messages', [list(raw_message.values())],
+                                   column_names=list(raw_message.keys()))
+                self.insert_calls += 1
 
             # Update dimension tables
             self._update_party_dimension(transaction_data)
@@ -133,118 +389,570 @@ class TransactionProcessor:
             return False
 
     def _update_party_dimension(self, tx_data):
-        """Update or insert party dimension data"""
-        now = datetime.utcnow()
-
-        # Update debtor
-        debtor_data = {
-            'iban': tx_data['debtor_iban'],
-            'party_name': tx_data['debtor_name'],
-            'country': tx_data['debtor_country'],
-            'currency': tx_data['currency'],
-            'last_seen': now,
-            'total_transactions': 1,
-            'total_sent': tx_data['amount'],
-            'total_received': 0
-        }
-        self.client.insert('dim_parties', [list(debtor_data.values())],
-                          column_names=list(debtor_data.keys()))
-
-        # Update creditor
-        creditor_data = {
-            'iban': tx_data['creditor_iban'],
-            'party_name': tx_data['creditor_name'],
-            'country': tx_data['creditor_country'],
-            'currency': tx_data['currency'],
-            'last_seen': now,
-            'total_transactions': 1,
-            'total_sent': 0,
-            'total_received': tx_data['amount']
-        }
-        self.client.insert('dim_parties', [list(creditor_data.values())],
-                          column_names=list(creditor_data.keys()))
+        """Insert the debtor and creditor activity of a transaction into dim_parties"""
+        parties = PartyAggregator()
+        parties.add(tx_data)
+        self.client.insert('dim_parties', parties.columns(), column_names=PARTY_COLUMNS,
+                           column_oriented=True)
+        self.insert_calls += 1
 
     def process_message(self, xml_message):
-        """Process a single transaction message"""
-        # Parse transaction
-        transaction_data = self.parse_transaction(xml_message)
-        if transaction_data is None:
+        """Process a single message, loading every transaction it contains"""
+        # Parse transactions
+        transactions = self.parse_transactions(xml_message)
+        if transactions is None:
             return False
 
         # Load to warehouse
-        success = self.load_to_warehouse(transaction_data)
-        return success
-
+        return all(self.load_to_warehouse(transaction_data) for transaction_data in transactions)
+
+    def add_message(self, xml_string, source=None):
+        """
+        Parse a message and buffer its rows as they are produced
+
+        Returns the number of rows added, or None if the message is invalid,
+        in which case the rows it already added are dropped from the batch
+        again. source is as for add_to_batch.
+        """
+        batch = self._batch(source[:2] if source is not None else None)
+        marks = len(batch.transactions), len(batch.raw_messages)
+        added = 0
+        try:
+            for transaction_data in self.iter_rows(xml_string):
+                self.add_to_batch(transaction_data, source)
+                added += 1
+        except Exception as e:
+            batch.transactions.truncate(marks[0])
+            batch.raw_messages.truncate(marks[1])
+            self._report_invalid(e)
+            return None
+        return added
+
+    def add_to_batch(self, transaction_data, source=None):
+        """
+        Buffer a parsed transaction until the next flush of its partition
+
+        source is the (topic, partition, offset) of the Kafka message the
+        transaction was read from. Parties are aggregated from the buffer at
+        flush time.
+        """
+        key = None
+        if source is not None:
+            (transaction_data['kafka_topic'], transaction_data['kafka_partition'],
+             transaction_data['kafka_offset']) = source
+            key = source[:2]
+        batch = self._batch(key)
+
+        raw_message = self._detach_raw_xml(transaction_data)
+        if raw_message is not None:
+            batch.raw_messages.append(raw_message)
+        batch.transactions.append(transaction_data)
+
+    def _batch(self, key):
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = PartitionBatch()
+        return batch
+
+    def track_offset(self, topic_partition, offset):
+        """Remember the first and last offset covered by the partition's current batch"""
+        self._batch(topic_partition).track_offset(offset)
+
+    def pending_rows(self, keys=None):
+        """Number of buffered transactions in the given batches (default: all)"""
+        keys = self.batches if keys is None else keys
+        return sum(len(self.batches[key]) for key in keys if key in self.batches)
+
+    def due_batches(self):
+        """
+        Partitions whose batch should be flushed now
+
+        A batch is due once it reached its row count or linger deadline, or,
+        while its partition is being re-read, exactly when it reached the
+        replay cut (and not before, whatever its size or age).
+        """
+        now = time.monotonic()
+        due = []
+        for key, batch in self.batches.items():
+            cut = self.replay_cuts.get(key)
+            if cut is not None:
+                if batch.offsets is not None and batch.offsets[1] >= cut:
+                    due.append(key)
+            elif len(batch) >= self.batch_size or now - batch.started_at >= self.batch_max_linger:
+                due.append(key)
+        return due
+
+    def batch_due(self):
+        """Whether any batch is due"""
+        return bool(self.due_batches())
+
+    def batch_offsets(self, keys=None):
+        """(first_offset, last_offset) of the given batches (default: all) that have offsets"""
+        keys = list(self.batches) if keys is None else keys
+        return {key: self.batches[key].offsets for key in keys
+                if key in self.batches and self.batches[key].offsets is not None}
+
+    def flush(self, keys=None):
+        """
+        Write the given batches (default: all), each with one column-oriented
+        insert per table and its own deduplication token
+
+        Returns (success, offsets) where offsets maps TopicPartition to the
+        (first_offset, last_offset) range of its flushed batch. The batches
+        are dropped in both cases. After a failure the remaining batches are
+        not attempted, and every range is kept as a replay cut so re-reading
+        from first_offset reproduces the same batches: the ones already
+        inserted are then dropped by ClickHouse as duplicates.
+        """
+        keys = list(self.batches) if keys is None else keys
+        offsets = {}
+        failed = False
+        for key in keys:
+            self.replay_cuts.pop(key, None)
+            batch = self.batches.pop(key, None)
+            if batch is None:
+                continue
+            if batch.offsets is not None:
+                offsets[key] = batch.offsets
+            if not failed:
+                failed = not self._insert_batch(batch, insert_settings({key: batch.offsets}
+                                                                       if batch.offsets else None))
+        if failed:
+            self.replay_cuts.update((key, last) for key, (_, last) in offsets.items())
+        return not failed, offsets
+
+    def _insert_batch(self, batch, settings):
+        try:
+            if len(batch.transactions):
+                self.client.insert('transactions', batch.transactions.columns,
+                                   column_names=batch.transactions.column_names,
+                                   column_oriented=True, settings=settings)
+                self.insert_calls += 1
+                if len(batch.raw_messages):
+                    self.client.insert('raw_messages', batch.raw_messages.columns,
+                                       column_names=RAW_MESSAGE_COLUMNS, column_oriented=True,
+                                       settings=settings)
+                    self.insert_calls += 1
+                # Parties are flushed together with the transactions whose offsets get committed
+                parties = PartyAggregator()
+                parties.add_columns(batch.transactions)
+                self.client.insert('dim_parties', parties.columns(),
+                                   column_names=PARTY_COLUMNS, column_oriented=True,
+                                   settings=settings)
+                self.insert_calls += 1
+            return True
+        except Exception as e:
+            print(f"✗ Error flushing batch of {len(batch)} transactions: {type(e).__name__}: {e}")
+            return False
 
-def main():
-    """Main entry point"""
-    # Configuration
-    kafka_bootstrap_servers = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
-    kafka_topic = os.environ.get('KAFKA_TOPIC', 'unprocessed')
-    kafka_group_id = os.environ.get('KAFKA_GROUP_ID', 'transaction-processor')
+    def drop_batches(self, keys):
+        """Forget the batches and replay cuts of partitions this consumer no longer owns"""
+        for key in keys:
+            self.batches.pop(key, None)
+            self.replay_cuts.pop(key, None)
+
+    def restore_replay_cut(self, topic_partition, committed):
+        """
+        Resume a batch interrupted between its inserts and its offset commit
+
+        committed is the partition's OffsetAndMetadata (or None). When its
+        metadata is a pending marker written by mark_pending for the
+        committed offset, the partition's next batch is cut at the marked
+        last offset.
+        """
+        self.replay_cuts.pop(topic_partition, None)
+        pending = parse_pending_marker(getattr(committed, 'metadata', None))
+        if pending is not None and pending[0] == committed.offset:
+            self.replay_cuts[topic_partition] = pending[1]
+
+
+def batch_dedup_token(offsets):
+    """
+    Deterministic insert deduplication token for a batch
+
+    Built from the Kafka offset range the batch covers. Replays cut their
+    batches at the same offsets (see TransactionProcessor.replay_cuts), so
+    re-inserting the same messages after a failed flush, crash or
+    rebalance yields the same token and ClickHouse drops the repeated
+    blocks.
+    """
+    return ",".join(f"{tp[0]}:{tp[1]}:{first}-{last}"
+                    for tp, (first, last) in sorted(offsets.items()))
+
+
+def insert_settings(offsets):
+    """ClickHouse insert settings that make a batch insert idempotent"""
+    if not offsets:
+        return None
+    return {
+        'insert_deduplication_token': batch_dedup_token(offsets),
+        # Skip the materialized views too when a block is dropped as a duplicate,
+        # otherwise daily_transaction_summary would count the replay again
+        'deduplicate_blocks_in_dependent_materialized_views': 1,
+    }
+
+
+def parse_pending_marker(metadata):
+    """(first, last) from commit metadata written by mark_pending, or None"""
+    if not metadata or not metadata.startswith(PENDING_MARKER):
+        return None
+    try:
+        first, last = metadata[len(PENDING_MARKER):].split('-')
+        return int(first), int(last)
+    except ValueError:
+        return None
+
+
+def mark_pending(consumer, offsets):
+    """
+    Record the ranges of batches about to be inserted in the committed metadata
+
+    The committed offset stays at the first message of each batch. If the
+    consumer dies after the inserts but before commit_offsets, whoever
+    consumes the partition next reads the range back (restore_replay_cut)
+    and cuts its first batch at the same offset. Returns False if the commit
+    failed, e.g. because the partitions are being reassigned; the batches
+    must then not be inserted.
+    """
+    if not offsets:
+        return True
+    try:
+        consumer.commit({tp: OffsetAndMetadata(first, f"{PENDING_MARKER}{first}-{last}")
+                         for tp, (first, last) in offsets.items()})
+        return True
+    except KafkaError as e:
+        print(f"✗ Could not record pending batch offsets: {type(e).__name__}: {e}")
+        return False
+
+
+def commit_offsets(consumer, offsets):
+    """
+    Commit the offsets following the last message of each flushed partition
+
+    A failed commit (e.g. CommitFailedError after a rebalance) is reported
+    and otherwise ignored: the batches stay marked pending, so the next
+    owner re-reads them with the same cuts and their inserts are dropped as
+    duplicates.
+    """
+    if not offsets:
+        return True
+    try:
+        consumer.commit({tp: OffsetAndMetadata(last + 1, None)
+                         for tp, (_, last) in offsets.items()})
+        return True
+    except KafkaError as e:
+        print(f"✗ Offset commit failed, the batch will be re-read: {type(e).__name__}: {e}")
+        return False
 
-    clickhouse_host = os.environ.get('CLICKHOUSE_HOST', 'localhost')
-    clickhouse_port = int(os.environ.get('CLICKHOUSE_PORT', '8123'))
-    clickhouse_user = os.environ.get('CLICKHOUSE_USER', 'dwuser')
-    clickhouse_password = os.environ.get('CLICKHOUSE_PASSWORD', 'dwpass')
 
-    print("=" * 60)
-    print("Transaction Processor Starting")
-    print("=" * 60)
-    print(f"Kafka Servers: {kafka_bootstrap_servers}")
-    print(f"Topic: {kafka_topic}")
-    print(f"Group ID: {kafka_group_id}")
-    print(f"ClickHouse: {clickhouse_host}:{clickhouse_port}")
-    print("=" * 60)
+def rewind_offsets(consumer, offsets):
+    """Seek back to the first message of a failed batch so it is consumed again"""
+    for tp, (first, _) in offsets.items():
+        try:
+            consumer.seek(tp, first)
+        except (AssertionError, KafkaError) as e:
+            # Not assigned to this consumer any more; its next owner starts
+            # from the committed offset
+            print(f"✗ Could not rewind {tp}: {type(e).__name__}: {e}")
+
+
+class BatchRebalanceListener(ConsumerRebalanceListener):
+    """
+    Keeps the processor's batches in line with the partitions it owns
+
+    Revoked partitions lose their uncommitted batch (the new owner re-reads
+    it from the committed offset) and assigned partitions pick up the replay
+    cut of a batch that was inserted but not committed.
+    """
+
+    def __init__(self, consumer, processor):
+        self.consumer = consumer
+        self.processor = processor
+
+    def on_partitions_revoked(self, revoked):
+        self.processor.drop_batches(revoked)
+
+    def on_partitions_assigned(self, assigned):
+        for tp in assigned:
+            self.processor.restore_replay_cut(tp, self.consumer.committed(tp, metadata=True))
+
+
+def flush_batches(consumer, processor, keys=None):
+    """
+    Flush batches (default: all) and commit their offsets
+
+    The ranges are first recorded with mark_pending, then inserted and
+    committed. A failed insert rewinds the partitions so the batches are
+    re-read. Returns (success, transactions flushed).
+    """
+    rows = processor.pending_rows(keys)
+    offsets = processor.batch_offsets(keys)
+    if not mark_pending(consumer, offsets):
+        processor.drop_batches(list(processor.batches) if keys is None else keys)
+        rewind_offsets(consumer, offsets)
+        return False, 0
+
+    success, offsets = processor.flush(keys)
+    if not success:
+        rewind_offsets(consumer, offsets)
+        return False, 0
+    commit_offsets(consumer, offsets)
+    return True, rows
+
+
+def load_config():
+    """Read processor configuration from environment variables"""
+    return {
+        'kafka_bootstrap_servers': os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092'),
+        'kafka_topic': os.environ.get('KAFKA_TOPIC', 'unprocessed'),
+        'kafka_group_id': os.environ.get('KAFKA_GROUP_ID', 'transaction-processor'),
+        'batch_size': int(os.environ.get('BATCH_SIZE', '1000')),
+        'batch_max_linger_ms': int(os.environ.get('BATCH_MAX_LINGER_MS', '1000')),
+        'workers': int(os.environ.get('PROCESSOR_WORKERS', '1')),
+        'stats_interval': float(os.environ.get('STATS_INTERVAL', '10')),
+        'max_restarts': int(os.environ.get('WORKER_MAX_RESTARTS', '5')),
+        'restart_window': float(os.environ.get('WORKER_RESTART_WINDOW', '300')),
+        'parser': os.environ.get('PARSER', 'fast'),
+        'raw_xml_storage': os.environ.get('RAW_XML_STORAGE', 'inline'),
+
+        'clickhouse_host': os.environ.get('CLICKHOUSE_HOST', 'localhost'),
+        'clickhouse_port': int(os.environ.get('CLICKHOUSE_PORT', '8123')),
+        'clickhouse_user': os.environ.get('CLICKHOUSE_USER', 'dwuser'),
+        'clickhouse_password': os.environ.get('CLICKHOUSE_PASSWORD', 'dwpass'),
+    }
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    """Turn SIGTERM into the same graceful shutdown path as Ctrl+C (once)"""
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def run_consumer(config, counters=None, worker_id=None):
+    """
+    Consume, batch and load transactions until interrupted
+
+    counters is an optional shared [processed, failed] array used by the
+    supervisor to aggregate throughput across worker processes.
+    """
+    tag = f"[worker {worker_id}] " if worker_id is not None else ""
 
     # Initialize processor
-    processor = TransactionProcessor(clickhouse_host, clickhouse_port,
-                                     clickhouse_user, clickhouse_password)
+    processor = TransactionProcessor(config['clickhouse_host'], config['clickhouse_port'],
+                                     config['clickhouse_user'], config['clickhouse_password'],
+                                     batch_size=config['batch_size'],
+                                     batch_max_linger_ms=config['batch_max_linger_ms'],
+                                     parser=config['parser'],
+                                     raw_xml_storage=config['raw_xml_storage'])
 
     # Initialize Kafka consumer
     try:
         consumer = KafkaConsumer(
-            kafka_topic,
-            bootstrap_servers=kafka_bootstrap_servers,
-            group_id=kafka_group_id,
+            bootstrap_servers=config['kafka_bootstrap_servers'],
+            group_id=config['kafka_group_id'],
             auto_offset_reset='earliest',
-            enable_auto_commit=True,
+            enable_auto_commit=False,
+            max_poll_records=config['batch_size'],
             value_deserializer=lambda m: m.decode('utf-8')
         )
-        print("✓ Connected to Kafka")
-        print("Waiting for messages...\n")
+        consumer.subscribe([config['kafka_topic']], listener=BatchRebalanceListener(consumer, processor))
+        print(f"{tag}✓ Connected to Kafka")
+        print(f"{tag}Waiting for messages...\n")
     except Exception as e:
-        print(f"✗ Failed to connect to Kafka: {e}")
+        print(f"{tag}✗ Failed to connect to Kafka: {e}")
         sys.exit(1)
 
     # Process messages
+    poll_timeout_ms = max(1, min(config['batch_max_linger_ms'], 1000))
+    messages_processed = messages_failed = 0
+    try:
+        messages_processed, messages_failed = consume_messages(
+            consumer, processor, poll_timeout_ms=poll_timeout_ms, counters=counters, tag=tag)
+    finally:
+        consumer.close()
+        processor.client.close()
+        print(f"\n{tag}✓ Processed {messages_processed} transactions")
+        print(f"{tag}✗ Failed {messages_failed} transactions")
+
+
+def consume_messages(consumer, processor, poll_timeout_ms=1000, counters=None, tag="",
+                     stop_event=None, verbose=True):
+    """
+    Poll, parse, batch and flush until interrupted or stop_event is set
+
+    The consumer only needs poll / commit / seek (and committed for the
+    BatchRebalanceListener), so in-memory stand-ins can be used for
+    benchmarks. Every partition is batched and flushed on its own; a
+    partition being re-read is flushed exactly at its replay cut. The
+    pending batches are flushed before returning. Returns the (processed
+    transactions, failed messages) counts.
+    """
     messages_processed = 0
     messages_failed = 0
 
+    def count(processed=0, failed=0):
+        nonlocal messages_processed, messages_failed
+        messages_processed += processed
+        messages_failed += failed
+        if counters is not None:
+            with counters.get_lock():
+                counters[0] += processed
+                counters[1] += failed
+
+    def flush(keys=None):
+        success, flushed = flush_batches(consumer, processor, keys)
+        if not success:
+            # Re-consume the batches after a short backoff
+            time.sleep(1)
+            return False
+        count(processed=flushed)
+        if flushed and verbose:
+            print(f"{tag}[{messages_processed}] ✓ Flushed batch of {flushed} transactions")
+        return True
+
     try:
-        for message in consumer:
-            try:
-                xml_transaction = message.value
-                success = processor.process_message(xml_transaction)
-
-                if success:
-                    messages_processed += 1
-                    print(f"[{messages_processed}] ✓ Processed transaction from offset {message.offset}")
-                else:
-                    messages_failed += 1
-                    print(f"✗ Failed to process transaction from offset {message.offset}")
-
-            except Exception as e:
-                messages_failed += 1
-                print(f"✗ Error processing message: {e}")
+        while stop_event is None or not stop_event.is_set():
+            records = consumer.poll(timeout_ms=poll_timeout_ms)
+            for tp, messages in records.items():
+                for message in messages:
+                    cut = processor.replay_cuts.get(tp)
+                    if cut is not None and message.offset > cut and not flush([tp]):
+                        # The partition was rewound, the rest of this poll is re-read
+                        break
+
+                    # Unparseable messages are still tracked so their offsets get committed
+                    processor.track_offset(tp, message.offset)
+                    added = processor.add_message(message.value, (tp.topic, tp.partition, message.offset))
+                    if added is None:
+                        count(failed=1)
+                        print(f"{tag}✗ Failed to process message from offset {message.offset}")
+
+            due = processor.due_batches()
+            if due:
+                flush(due)
 
     except KeyboardInterrupt:
-        print("\n\nShutting down gracefully...")
+        print(f"\n\n{tag}Shutting down gracefully...")
+
+    success, flushed = flush_batches(consumer, processor)
+    if success:
+        count(processed=flushed)
+    return messages_processed, messages_failed
+
+
+def _worker_main(config, counters, worker_id):
+    """Entry point of a supervised worker process"""
+    # Shutdown is driven by the supervisor, which forwards Ctrl+C as SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    run_consumer(config, counters=counters, worker_id=worker_id)
+
+
+def supervise(config, target=_worker_main):
+    """
+    Run config['workers'] consumer processes in the same consumer group
+
+    Each worker owns its own KafkaConsumer, TransactionProcessor and
+    ClickHouse client. Crashed workers are restarted and the per-worker
+    counters are summed into a periodic throughput report. A worker that
+    dies again after config['max_restarts'] restarts within
+    config['restart_window'] seconds is crash-looping: the other workers are
+    stopped and the supervisor exits with status 1. target(config, counters,
+    worker_id) is the worker entry point.
+    """
+    num_workers = config['workers']
+    ctx = multiprocessing.get_context('spawn')
+    counters = [ctx.Array('q', 2) for _ in range(num_workers)]
+    workers = [None] * num_workers
+    recent_restarts = [[] for _ in range(num_workers)]
+    restarts = 0
+    crash_looping = None
+
+    def start_worker(worker_id):
+        process = ctx.Process(target=target, args=(config, counters[worker_id], worker_id),
+                              name=f"processor-worker-{worker_id}", daemon=False)
+        process.start()
+        workers[worker_id] = process
+        print(f"✓ Started worker {worker_id} (pid {process.pid})")
+
+    def totals():
+        processed = failed = 0
+        for c in counters:
+            with c.get_lock():
+                processed += c[0]
+                failed += c[1]
+        return processed, failed
+
+    previous_handler = signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    for worker_id in range(num_workers):
+        start_worker(worker_id)
+
+    last_processed, _ = totals()
+    last_report = time.monotonic()
+    try:
+        while crash_looping is None:
+            time.sleep(config['stats_interval'])
+
+            for worker_id, process in enumerate(workers):
+                if process.is_alive():
+                    continue
+                now = time.monotonic()
+                recent = [t for t in recent_restarts[worker_id] if now - t < config['restart_window']]
+                if len(recent) >= config['max_restarts']:
+                    print(f"✗ Worker {worker_id} (pid {process.pid}) exited with code {process.exitcode} "
+                          f"after {len(recent)} restarts in {config['restart_window']:.0f}s, giving up")
+                    crash_looping = worker_id
+                    break
+                print(f"✗ Worker {worker_id} (pid {process.pid}) exited with code "
+                      f"{process.exitcode}, restarting")
+                recent_restarts[worker_id] = recent + [now]
+                restarts += 1
+                start_worker(worker_id)
+
+            processed, failed = totals()
+            now = time.monotonic()
+            rate = (processed - last_processed) / (now - last_report)
+            print(f"[supervisor] {num_workers} workers | processed {processed} | failed {failed} | "
+                  f"{rate:.1f} msg/s | restarts {restarts}")
+            last_processed, last_report = processed, now
+
+    except KeyboardInterrupt:
+        print("\n\nStopping workers...")
     finally:
-        consumer.close()
-        processor.client.close()
-        print(f"\n✓ Processed {messages_processed} transactions")
-        print(f"✗ Failed {messages_failed} transactions")
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        for process in workers:
+            process.join(timeout=30)
+        signal.signal(signal.SIGTERM, previous_handler)
+        processed, failed = totals()
+        print(f"\n✓ Processed {processed} transactions")
+        print(f"✗ Failed {failed} transactions")
+    if crash_looping is not None:
+        sys.exit(1)
+
+
+def main():
+    """Main entry point"""
+    config = load_config()
+
+    print("=" * 60)
+    print("Transaction Processor Starting")
+    print("=" * 60)
+    print(f"Kafka Servers: {config['kafka_bootstrap_servers']}")
+    print(f"Topic: {config['kafka_topic']}")
+    print(f"Group ID: {config['kafka_group_id']}")
+    print(f"Batch: {config['batch_size']} rows / {config['batch_max_linger_ms']}ms")
+    print(f"Workers: {config['workers']}")
+    print(f"Parser: {config['parser']}")
+    print(f"raw_xml storage: {config['raw_xml_storage']}")
+    print(f"ClickHouse: {config['clickhouse_host']}:{config['clickhouse_port']}")
+    print("=" * 60)
+
+    if config['workers'] > 1:
+        supervise(config)
+    else:
+        run_consumer(config)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,316 @@
+import random
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from kafka.errors import CommitFailedError
+from kafka.structs import OffsetAndMetadata, TopicPartition
+
+from processor import (PARTY_COLUMNS, RAW_MESSAGE_COLUMNS, TRANSACTION_COLUMNS, BatchRebalanceListener,
+                       PartyAggregator, TransactionProcessor, batch_dedup_token, consume_messages)
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_DIR / "transaction_generator"))
+sys.path.insert(0, str(REPO_DIR / "bench"))
+
+from fakes import InMemoryConsumer, InMemoryTopic  # noqa: E402
+from generator import TransactionGenerator  # noqa: E402
+
+
+class RecordingClient:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.inserts = []
+        self.settings = []
+
+    def insert(self, table, data, column_names=None, column_oriented=False, settings=None, **kwargs):
+        if self.fail:
+            raise RuntimeError("ClickHouse unavailable")
+        self.inserts.append((table, dict(zip(column_names, data)) if column_oriented else data))
+        self.settings.append(settings)
+
+    def close(self):
+        pass
+
+
+def make_tx(e2e_id, debtor, creditor, amount, seen):
+    return {
+        'transaction_id': e2e_id, 'message_id': 'MSG-1', 'end_to_end_id': e2e_id,
+        'payment_info_id': 'PmtInf-1', 'created_datetime': seen, 'processing_datetime': seen,
+        'amount': amount, 'currency': 'EUR',
+        'debtor_name': f'Party {debtor}', 'debtor_iban': debtor, 'debtor_country': debtor[:2],
+        'creditor_name': f'Party {creditor}', 'creditor_iban': creditor, 'creditor_country': creditor[:2],
+        'payment_method': 'TRF', 'control_sum': amount, 'num_transactions': 1,
+        'raw_xml': '<Document/>', 'processed_status': 'SUCCESS',
+        'kafka_topic': '', 'kafka_partition': 0, 'kafka_offset': 0,
+    }
+
+
+TXS = [
+    make_tx('E2E-1', 'DE01', 'GB01', 100.10, datetime(2025, 1, 1, 10, 0, 0)),
+    make_tx('E2E-2', 'DE01', 'FR01', 0.20, datetime(2025, 1, 1, 10, 0, 5)),
+    make_tx('E2E-3', 'GB01', 'DE01', 50.00, datetime(2025, 1, 1, 10, 0, 3)),
+]
+
+
+@pytest.fixture
+def client():
+    return RecordingClient()
+
+
+@pytest.fixture
+def processor(client):
+    return TransactionProcessor(None, None, None, None, batch_size=3, batch_max_linger_ms=60_000,
+                                client=client)
+
+
+def test_batch_is_flushed_with_one_insert_per_table(processor, client):
+    for offset, tx in enumerate(TXS):
+        assert not processor.batch_due()
+        processor.track_offset(('unprocessed', 0), offset)
+        processor.add_to_batch(tx)
+    assert processor.batch_due()
+
+    success, offsets = processor.flush()
+    assert success
+    assert offsets == {('unprocessed', 0): (0, 2)}
+    assert [table for table, _ in client.inserts] == ['transactions', 'dim_parties']
+
+    transactions = client.inserts[0][1]
+    assert list(transactions) == TRANSACTION_COLUMNS
+    assert transactions['transaction_id'] == ['E2E-1', 'E2E-2', 'E2E-3']
+
+    parties = client.inserts[1][1]
+    assert list(parties) == PARTY_COLUMNS
+    by_iban = {iban: {column: parties[column][i] for column in PARTY_COLUMNS}
+               for i, iban in enumerate(parties['iban'])}
+    assert set(by_iban) == {'DE01', 'GB01', 'FR01'}
+    assert by_iban['DE01']['total_transactions'] == 3
+    assert by_iban['DE01']['total_sent'] == Decimal('100.30')
+    assert by_iban['DE01']['total_received'] == Decimal('50.00')
+    assert by_iban['DE01']['last_seen'] == datetime(2025, 1, 1, 10, 0, 5)
+    assert by_iban['FR01']['total_transactions'] == 1
+
+    assert not processor.batch_due()
+    assert processor.batches == {}
+
+
+def test_failed_flush_returns_offsets_for_rewind():
+    processor = TransactionProcessor(None, None, None, None, batch_size=10,
+                                     client=RecordingClient(fail=True))
+    processor.track_offset(('unprocessed', 1), 7)
+    processor.add_to_batch(TXS[0])
+    processor.track_offset(('unprocessed', 1), 8)
+    processor.add_to_batch(TXS[1])
+
+    success, offsets = processor.flush()
+    assert not success
+    assert offsets == {('unprocessed', 1): (7, 8)}
+    assert processor.batches == {}
+    # The re-read batch has to end at the same offset again
+    assert processor.replay_cuts == {('unprocessed', 1): 8}
+
+
+def test_linger_deadline(client):
+    processor = TransactionProcessor(None, None, None, None, batch_size=100, batch_max_linger_ms=0,
+                                     client=client)
+    processor.add_to_batch(TXS[0])
+    assert processor.batch_due()
+
+
+def test_party_aggregator_columns_align():
+    parties = PartyAggregator()
+    for tx in TXS:
+        parties.add(tx)
+    columns = parties.columns()
+    assert len(columns) == len(PARTY_COLUMNS)
+    assert all(len(column) == 3 for column in columns)
+
+
+def test_kafka_source_recorded_on_rows(processor, client):
+    processor.add_to_batch(dict(TXS[0]), ('unprocessed', 2, 41))
+    processor.flush()
+
+    transactions = client.inserts[0][1]
+    assert transactions['kafka_topic'] == ['unprocessed']
+    assert transactions['kafka_partition'] == [2]
+    assert transactions['kafka_offset'] == [41]
+    assert transactions['raw_xml'] == ['<Document/>']
+
+
+def test_external_raw_xml_goes_to_raw_messages(client):
+    processor = TransactionProcessor(None, None, None, None, batch_size=10, raw_xml_storage='external',
+                                     client=client)
+    for tx in TXS:
+        processor.add_to_batch(dict(tx))
+    assert processor.flush()[0]
+
+    assert [table for table, _ in client.inserts] == ['transactions', 'raw_messages', 'dim_parties']
+    assert client.inserts[0][1]['raw_xml'] == ['', '', '']
+    raw_messages = client.inserts[1][1]
+    assert list(raw_messages) == RAW_MESSAGE_COLUMNS
+    assert raw_messages['transaction_id'] == ['E2E-1', 'E2E-2', 'E2E-3']
+    assert raw_messages['raw_xml'] == ['<Document/>'] * 3
+    assert processor.batches == {}
+
+
+def test_raw_xml_can_be_omitted(client):
+    processor = TransactionProcessor(None, None, None, None, batch_size=10, raw_xml_storage='none',
+                                     client=client)
+    processor.add_to_batch(dict(TXS[0]), ('unprocessed', 0, 5))
+    assert processor.flush()[0]
+
+    assert [table for table, _ in client.inserts] == ['transactions', 'dim_parties']
+    assert client.inserts[0][1]['raw_xml'] == ['']
+    assert client.inserts[0][1]['kafka_offset'] == [5]
+
+
+def test_unknown_raw_xml_storage_rejected(client):
+    with pytest.raises(ValueError):
+        TransactionProcessor(None, None, None, None, raw_xml_storage='s3', client=client)
+
+
+def test_partition_batches_have_their_own_dedup_token(client):
+    def flush_batch(processor):
+        for offset, tx in zip((12, 13), TXS):
+            processor.track_offset(('unprocessed', 3), offset)
+            processor.add_to_batch(dict(tx), ('unprocessed', 3, offset))
+        processor.track_offset(('unprocessed', 0), 4)
+        processor.add_to_batch(dict(TXS[2]), ('unprocessed', 0, 4))
+        assert processor.flush()[0]
+
+    processor = TransactionProcessor(None, None, None, None, batch_size=10, client=client)
+    flush_batch(processor)
+    # A replay of the same offsets, e.g. after a crash before the commit
+    flush_batch(TransactionProcessor(None, None, None, None, batch_size=10, client=client))
+
+    assert [table for table, _ in client.inserts] == ['transactions', 'dim_parties'] * 4
+    assert client.inserts[0][1]['transaction_id'] == ['E2E-1', 'E2E-2']
+    tokens = [settings['insert_deduplication_token'] for settings in client.settings]
+    assert tokens[:4] == ['unprocessed:3:12-13'] * 2 + ['unprocessed:0:4-4'] * 2
+    assert tokens[4:] == tokens[:4]
+    assert all(settings['deduplicate_blocks_in_dependent_materialized_views'] == 1
+               for settings in client.settings)
+
+
+def test_dedup_token_differs_per_offset_range():
+    assert batch_dedup_token({('unprocessed', 0): (0, 9)}) != batch_dedup_token({('unprocessed', 0): (10, 19)})
+
+
+def test_batch_without_offsets_inserts_without_settings(processor, client):
+    processor.add_to_batch(dict(TXS[0]))
+    processor.flush()
+    assert client.settings == [None, None]
+
+
+class Crash(BaseException):
+    """A process dying in the middle of a flush"""
+
+
+class DedupClient(RecordingClient):
+    """RecordingClient that drops an insert repeating a table's dedup token, as ClickHouse does"""
+
+    def __init__(self, crash_after=None):
+        super().__init__()
+        self.tokens = set()
+        self.crash_after = crash_after
+
+    def insert(self, table, data, column_names=None, column_oriented=False, settings=None, **kwargs):
+        token = (settings or {}).get('insert_deduplication_token')
+        if token is not None:
+            if (table, token) in self.tokens:
+                return
+            self.tokens.add((table, token))
+        super().insert(table, data, column_names, column_oriented, settings, **kwargs)
+        if self.crash_after is not None and len(self.inserts) >= self.crash_after:
+            raise Crash()
+
+    def column(self, table, name):
+        return [value for t, columns in self.inserts if t == table for value in columns[name]]
+
+
+MESSAGES = 40
+TRANSACTIONS = sum(1 + i % 3 for i in range(MESSAGES))
+
+
+def make_topic(messages=MESSAGES, partitions=2):
+    """Messages of 1, 2 and 3 credit transfers spread round-robin over the partitions"""
+    random.seed(20022)
+    generator = TransactionGenerator(str(REPO_DIR / "data" / "parties.txt"))
+    topic = InMemoryTopic('unprocessed', partitions=partitions)
+    for i in range(messages):
+        topic.append(generator.generate_transaction_xml(num_transactions=1 + i % 3).encode('utf-8'))
+    return topic
+
+
+def consume(topic, group, client, batch_size, max_poll_records, consumer_class=InMemoryConsumer):
+    processor = TransactionProcessor(None, None, None, None, batch_size=batch_size,
+                                     batch_max_linger_ms=60_000, client=client)
+    stop_event = threading.Event()
+    consumer = consumer_class(topic, value_deserializer=lambda m: m.decode('utf-8'),
+                              max_poll_records=max_poll_records, stop_event=stop_event, group=group)
+    consumer.subscribe([topic.name], listener=BatchRebalanceListener(consumer, processor))
+    return consume_messages(consumer, processor, poll_timeout_ms=0, stop_event=stop_event, verbose=False)
+
+
+def assert_loaded_once(client):
+    ids = Counter(client.column('transactions', 'transaction_id'))
+    assert len(ids) == TRANSACTIONS and set(ids.values()) == {1}
+    # Every transaction counted once for its debtor and once for its creditor
+    assert sum(client.column('dim_parties', 'total_transactions')) == 2 * TRANSACTIONS
+
+
+@pytest.mark.parametrize("crash_after", [1, 4, 7])
+def test_replay_with_different_poll_chunking_inserts_nothing_twice(crash_after):
+    topic = make_topic()
+    group = {}
+    client = DedupClient(crash_after=crash_after)
+    with pytest.raises(Crash):
+        consume(topic, group, client, batch_size=5, max_poll_records=7)
+    assert any(om.metadata for om in group.values())
+
+    client.crash_after = None
+    consume(topic, group, client, batch_size=3, max_poll_records=2)
+    assert_loaded_once(client)
+
+
+class CommitFailingConsumer(InMemoryConsumer):
+    """Rejects the commits that follow an insert, as after a rebalance"""
+
+    def commit(self, offsets=None):
+        if any(om.metadata is None for om in (offsets or {}).values()):
+            raise CommitFailedError("group rebalanced")
+        super().commit(offsets)
+
+
+def test_failed_offset_commit_is_survived_and_replayed_without_duplicates():
+    topic = make_topic()
+    group = {}
+    client = DedupClient()
+    consume(topic, group, client, batch_size=4, max_poll_records=5, consumer_class=CommitFailingConsumer)
+    consume(topic, group, client, batch_size=6, max_poll_records=3)
+    assert_loaded_once(client)
+
+
+def test_rebalance_listener_drops_revoked_batches_and_restores_cuts():
+    tp = TopicPartition('unprocessed', 0)
+    processor = TransactionProcessor(None, None, None, None, batch_size=10, client=RecordingClient())
+    processor.track_offset(tp, 3)
+    processor.add_to_batch(dict(TXS[0]), ('unprocessed', 0, 3))
+    group = {tp: OffsetAndMetadata(10, 'pending:10-14')}
+    listener = BatchRebalanceListener(InMemoryConsumer(make_topic(0, 1), group=group), processor)
+
+    listener.on_partitions_revoked([tp])
+    assert processor.batches == {}
+
+    listener.on_partitions_assigned([tp])
+    assert processor.replay_cuts == {tp: 14}
+
+    # A marker left behind for an older committed offset is ignored
+    group[tp] = OffsetAndMetadata(15, 'pending:10-14')
+    listener.on_partitions_assigned([tp])
+    assert processor.replay_cuts == {}
@@ -0,0 +1,245 @@
+import random
+import sys
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from processor import TRANSACTION_COLUMNS, TransactionProcessor
+from pain001_parser import ControlSumError, Pain001Extractor, parse_iso_datetime
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_DIR / "transaction_generator"))
+
+from generator import TransactionGenerator  # noqa: E402
+
+PARTIES_FILE = REPO_DIR / "data" / "parties.txt"
+
+
+def make_processor(monkeypatch, parser):
+    monkeypatch.setattr(TransactionProcessor, "_connect_clickhouse", lambda self, *args: None)
+    return TransactionProcessor("localhost", 8123, "user", "password", parser=parser)
+
+
+@pytest.fixture
+def fast(monkeypatch):
+    return make_processor(monkeypatch, "fast")
+
+
+@pytest.fixture
+def etree(monkeypatch):
+    return make_processor(monkeypatch, "etree")
+
+
+@pytest.fixture(scope="module")
+def generated_messages():
+    random.seed(20022)
+    generator = TransactionGenerator(str(PARTIES_FILE))
+    return [generator.generate_transaction_xml() for _ in range(200)]
+
+
+def bulk_message(payments, nb_of_txs=None, ctrl_sum=None):
+    """Build a pain.001 document; payments is a list of (debtor, [(e2e_id, amount, creditor)])"""
+    amounts = [Decimal(amount) for _, txs in payments for _, amount, _ in txs]
+    pmt_infs = []
+    for index, (debtor, txs) in enumerate(payments):
+        cdt_trfs = "".join(f"""
+      <CdtTrfTxInf>
+        <PmtId><EndToEndId>{e2e_id}</EndToEndId></PmtId>
+        <Amt><InstdAmt Ccy="EUR">{amount}</InstdAmt></Amt>
+        <Cdtr><Nm>{creditor[0]}</Nm></Cdtr>
+        <CdtrAcct><Id><IBAN>{creditor[1]}</IBAN></Id></CdtrAcct>
+      </CdtTrfTxInf>""" for e2e_id, amount, creditor in txs)
+        pmt_infs.append(f"""
+    <PmtInf>
+      <PmtInfId>PmtInf-{index}</PmtInfId>
+      <PmtMtd>TRF</PmtMtd>
+      <NbOfTxs>{len(txs)}</NbOfTxs>
+      <CtrlSum>{sum(Decimal(amount) for _, amount, _ in txs)}</CtrlSum>
+      <Dbtr><Nm>{debtor[0]}</Nm></Dbtr>
+      <DbtrAcct><Id><IBAN>{debtor[1]}</IBAN></Id></DbtrAcct>{cdt_trfs}
+    </PmtInf>""")
+
+    return f"""<?xml version="1.0" ?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.03">
+  <CstmrCdtTrfInitn>
+    <GrpHdr>
+      <MsgId>MSG-BULK</MsgId>
+      <CreDtTm>2025-10-28T09:59:50Z</CreDtTm>
+      <NbOfTxs>{nb_of_txs if nb_of_txs is not None else len(amounts)}</NbOfTxs>
+      <CtrlSum>{ctrl_sum if ctrl_sum is not None else sum(amounts)}</CtrlSum>
+      <InitgPty><Nm>ACME Corp</Nm></InitgPty>
+    </GrpHdr>{"".join(pmt_infs)}
+  </CstmrCdtTrfInitn>
+</Document>"""
+
+
+ACME = ("ACME Corp", "DE89370400440532013000")
+DOE = ("John Doe", "GB29NWBK60161331926819")
+ALPHA = ("Alpha Ltd", "FR1420041010050500013M02606")
+BETA = ("Beta LLC", "ES9121000418450200051332")
+
+BULK_PAYMENTS = [
+    (ACME, [("E2E-1", "100.50", DOE), ("E2E-2", "200.25", ALPHA)]),
+    (BETA, [("E2E-3", "50.00", ACME)]),
+]
+
+
+def _without_processing_time(rows):
+    return [{k: v for k, v in row.items() if k != "processing_datetime"} for row in rows]
+
+
+def test_fast_parser_matches_etree_parser(fast, etree, generated_messages):
+    for xml_string in generated_messages:
+        expected = etree.parse_transactions(xml_string)
+        actual = fast.parse_transactions(xml_string)
+
+        assert expected is not None and len(expected) == 1
+        assert list(actual[0].keys()) == list(expected[0].keys())
+        assert _without_processing_time(actual) == _without_processing_time(expected)
+        assert actual[0]["raw_xml"] == xml_string
+
+
+def test_bulk_message_yields_row_per_credit_transfer(fast, etree):
+    xml_string = bulk_message(BULK_PAYMENTS)
+
+    rows = fast.parse_transactions(xml_string)
+    assert _without_processing_time(rows) == _without_processing_time(etree.parse_transactions(xml_string))
+
+    assert [row["transaction_id"] for row in rows] == ["MSG-BULK/PmtInf-0/1", "MSG-BULK/PmtInf-0/2",
+                                                       "MSG-BULK/PmtInf-1/1"]
+    assert [row["end_to_end_id"] for row in rows] == ["E2E-1", "E2E-2", "E2E-3"]
+    assert [row["payment_info_id"] for row in rows] == ["PmtInf-0", "PmtInf-0", "PmtInf-1"]
+    assert [row["debtor_iban"] for row in rows] == [ACME[1], ACME[1], BETA[1]]
+    assert [row["creditor_name"] for row in rows] == [DOE[0], ALPHA[0], ACME[0]]
+    assert [row["amount"] for row in rows] == [100.50, 200.25, 50.00]
+    assert all(row["num_transactions"] == 3 for row in rows)
+    assert all(row["control_sum"] == 350.75 for row in rows)
+    assert all(row["raw_xml"].startswith("<CdtTrfTxInf>") and row["raw_xml"].endswith("</CdtTrfTxInf>")
+               and row["raw_xml"] in xml_string for row in rows)
+    assert "E2E-2" in rows[1]["raw_xml"] and "E2E-1" not in rows[1]["raw_xml"]
+
+
+@pytest.mark.parametrize("nb_of_txs, ctrl_sum", [(2, None), (None, "350.76")])
+def test_bulk_message_control_totals_rejected(fast, etree, nb_of_txs, ctrl_sum):
+    xml_string = bulk_message(BULK_PAYMENTS, nb_of_txs=nb_of_txs, ctrl_sum=ctrl_sum)
+    assert fast.parse_transactions(xml_string) is None
+    assert etree.parse_transactions(xml_string) is None
+
+
+def test_payment_info_control_sum_rejected(fast, etree):
+    xml_string = bulk_message(BULK_PAYMENTS).replace("<CtrlSum>50.00</CtrlSum>", "<CtrlSum>60.00</CtrlSum>")
+    assert fast.parse_transactions(xml_string) is None
+    assert etree.parse_transactions(xml_string) is None
+
+    with pytest.raises(ControlSumError):
+        list(Pain001Extractor().iter_transactions(xml_string))
+
+
+def test_streaming_extractor_small_chunks():
+    xml_string = bulk_message(BULK_PAYMENTS)
+    expected = list(Pain001Extractor().iter_transactions(xml_string))
+    assert list(Pain001Extractor(chunk_size=7).iter_transactions(xml_string)) == expected
+
+    prefixed = (xml_string.replace('xmlns="', 'xmlns:p="').replace("<", "<p:").replace("<p:/", "</p:")
+                .replace("<p:?xml", "<?xml"))
+    assert list(Pain001Extractor(chunk_size=7).iter_transactions(prefixed)) == \
+        [{**fields, "raw_xml": fields["raw_xml"].replace("<", "<p:").replace("<p:/", "</p:")} for fields in expected]
+
+
+def test_add_message_drops_rows_of_rejected_message(monkeypatch):
+    monkeypatch.setattr(TransactionProcessor, "_connect_clickhouse", lambda self, *args: None)
+    processor = TransactionProcessor("localhost", 8123, "user", "password", raw_xml_storage="external")
+    assert processor.add_message(bulk_message(BULK_PAYMENTS), ("unprocessed", 0, 7)) == 3
+
+    # The second PmtInf fails its CtrlSum after the first one's rows were buffered
+    invalid = bulk_message(BULK_PAYMENTS).replace("<CtrlSum>50.00</CtrlSum>", "<CtrlSum>60.00</CtrlSum>")
+    assert processor.add_message(invalid, ("unprocessed", 0, 8)) is None
+    batch = processor.batches[("unprocessed", 0)]
+    assert len(batch.transactions) == 3 and len(batch.raw_messages) == 3
+    assert batch.transactions.columns[TRANSACTION_COLUMNS.index("kafka_offset")] == [7, 7, 7]
+
+
+def test_large_bulk_message(fast):
+    txs = [(f"E2E-{i}", f"{i % 997}.{i % 100:02d}", DOE) for i in range(5000)]
+    rows = fast.parse_transactions(bulk_message([(ACME, txs)]))
+    assert len(rows) == 5000
+    assert rows[-1]["transaction_id"] == "MSG-BULK/PmtInf-0/5000"
+    assert rows[-1]["end_to_end_id"] == "E2E-4999"
+
+
+def test_transaction_id_unique_when_end_to_end_id_repeats(fast, etree):
+    txs = [("NOTPROVIDED", "10.00", DOE), ("NOTPROVIDED", "10.00", ALPHA)]
+    xml_string = bulk_message([(ACME, txs), (BETA, txs)])
+    xml_string = xml_string.replace("<PmtId><EndToEndId>", "<PmtId><InstrId>INSTR-9</InstrId><EndToEndId>", 1)
+
+    rows = fast.parse_transactions(xml_string)
+    assert _without_processing_time(rows) == _without_processing_time(etree.parse_transactions(xml_string))
+    assert [row["transaction_id"] for row in rows] == [
+        "MSG-BULK/PmtInf-0/INSTR-9", "MSG-BULK/PmtInf-0/2", "MSG-BULK/PmtInf-1/1", "MSG-BULK/PmtInf-1/2"]
+    assert {row["end_to_end_id"] for row in rows} == {"NOTPROVIDED"}
+
+
+def test_fast_parser_rejects_wrong_root(fast):
+    assert fast.parse_transactions("<Document><Other/></Document>") is None
+
+
+def test_parsers_reject_missing_fields(fast, etree, generated_messages):
+    xml_string = generated_messages[0].replace("EndToEndId", "OtherId")
+    assert fast.parse_transactions(xml_string) is None
+    assert etree.parse_transactions(xml_string) is None
+
+
+def test_fast_parser_rejects_invalid_xml(fast):
+    assert fast.parse_transactions("this is not xml") is None
+
+
+def test_parse_iso_datetime():
+    assert parse_iso_datetime("2025-10-28T09:59:50Z") == datetime(2025, 10, 28, 9, 59, 50)
+    with pytest.raises(ValueError):
+        parse_iso_datetime("2025-10-28 09:59:50")
+
+
+def test_unknown_parser_rejected(monkeypatch):
+    with pytest.raises(ValueError):
+        make_processor(monkeypatch, "sax")
+
+
+def test_generated_bulk_messages(fast, etree):
+    random.seed(2)
+    generator = TransactionGenerator(str(PARTIES_FILE))
+    for _ in range(20):
+        xml_string = generator.generate_transaction_xml(num_transactions=25)
+        rows = fast.parse_transactions(xml_string)
+        assert rows is not None and len(rows) == 25
+        assert _without_processing_time(rows) == _without_processing_time(etree.parse_transactions(xml_string))
+        assert len({row["debtor_iban"] for row in rows}) == 1
+
+
+def test_compact_and_pretty_generator_output_parse_the_same(fast):
+    random.seed(7)
+    compact = TransactionGenerator(str(PARTIES_FILE)).generate_transaction_xml(num_transactions=3)
+    random.seed(7)
+    pretty = TransactionGenerator(str(PARTIES_FILE), pretty=True).generate_transaction_xml(num_transactions=3)
+
+    assert "\n" not in compact and "\n  " in pretty
+    assert len(compact) < len(pretty)
+    # Ids come from uuid4 and differ between the two runs
+    fields = ("amount", "currency", "debtor_iban", "creditor_iban", "creditor_name", "control_sum")
+    compact_rows = [[row[f] for f in fields] for row in fast.parse_transactions(compact)]
+    pretty_rows = [[row[f] for f in fields] for row in fast.parse_transactions(pretty)]
+    assert compact_rows == pretty_rows
+
+
+def test_generator_escapes_party_names(tmp_path, fast):
+    parties_file = tmp_path / "parties.txt"
+    parties_file.write_text("Smith & Sons <Ltd>,DE89370400440532013000\n"
+                            "\"Quote\" Co,GB29NWBK60161331926819\n", encoding="utf-8")
+    generator = TransactionGenerator(str(parties_file))
+
+    names = set()
+    for _ in range(10):
+        row = fast.parse_transactions(generator.generate_transaction_xml())[0]
+        names.update((row["debtor_name"], row["creditor_name"]))
+    assert names == {"Smith & Sons <Ltd>", "\"Quote\" Co"}
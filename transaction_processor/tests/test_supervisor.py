@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from processor import supervise
+
+
+def flaky_worker(config, counters, worker_id):
+    """Worker 0 crashes right after counting; the others keep running"""
+    with counters.get_lock():
+        counters[0] += 3
+        counters[1] += 1 - worker_id
+    if worker_id == 0:
+        raise SystemExit(2)
+    time.sleep(60)
+
+
+def test_supervisor_restarts_workers_until_the_limit_and_sums_counters(capsys):
+    config = {'workers': 2, 'stats_interval': 0.2, 'max_restarts': 2, 'restart_window': 60}
+
+    with pytest.raises(SystemExit) as exit_info:
+        supervise(config, target=flaky_worker)
+
+    out = capsys.readouterr().out
+    assert exit_info.value.code == 1
+    # Worker 0 ran three times (started, then restarted twice), worker 1 once
+    assert out.count("Started worker 0") == 3 and out.count("Started worker 1") == 1
+    assert out.count("Worker 0") == 3 and "exited with code 2, restarting" in out
+    assert "after 2 restarts in 60s, giving up" in out
+    assert "Processed 12 transactions" in out
+    assert "Failed 3 transactions" in out